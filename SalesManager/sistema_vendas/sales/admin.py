@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import UsuarioCustomizado
+from .models import Tarefa, UsuarioCustomizado
 
 class UsuarioCustomizadoAdmin(UserAdmin):
     model = UsuarioCustomizado
@@ -29,4 +29,10 @@ class UsuarioCustomizadoAdmin(UserAdmin):
     ordering = ['username']
 
 # Registrar o modelo personalizado
-admin.site.register(UsuarioCustomizado, UsuarioCustomizadoAdmin)
\ No newline at end of file
+admin.site.register(UsuarioCustomizado, UsuarioCustomizadoAdmin)
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'status', 'tentativas', 'max_tentativas', 'executar_em', 'usuario']
+    list_filter = ['status', 'tipo']
+    readonly_fields = ['data_criacao', 'data_atualizacao', 'iniciada_em', 'concluida_em', 'worker']
@@ -0,0 +1,157 @@
+"""Séries temporais de vendas agregadas em uma única consulta por gráfico."""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+
+DIAS_SEMANA_PT = {
+    'Mon': 'Seg', 'Tue': 'Ter', 'Wed': 'Qua', 'Thu': 'Qui',
+    'Fri': 'Sex', 'Sat': 'Sáb', 'Sun': 'Dom'
+}
+
+GRANULARIDADES = ('dia', 'semana', 'mes')
+
+
+# =============================================================================
+# FUNÇÕES AUXILIARES
+# =============================================================================
+
+def nome_dia_semana(data):
+    """Abreviação do dia da semana em português (Seg, Ter, ...)"""
+    dia_en = data.strftime('%a')
+    return DIAS_SEMANA_PT.get(dia_en, dia_en)
+
+
+def _inicio_semana(data):
+    return data - timedelta(days=data.weekday())
+
+
+def _proximo_mes(data):
+    return (data.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _consulta_agrupada(queryset, data_inicio, data_fim, expressao):
+    """GROUP BY do período: linhas (chave, total, quantidade)"""
+    return queryset.filter(
+        data_venda__gte=data_inicio,
+        data_venda__lte=data_fim
+    ).order_by().annotate(
+        chave=expressao
+    ).values('chave').annotate(
+        total=Sum('valor'),
+        quantidade=Count('id')
+    ).values_list('chave', 'total', 'quantidade')
+
+
+def _totais_agrupados(queryset, data_inicio, data_fim, expressao):
+    """Executa o GROUP BY e devolve {chave: (total, quantidade)}"""
+    linhas = _consulta_agrupada(queryset, data_inicio, data_fim, expressao)
+    return {chave: (total, quantidade) for chave, total, quantidade in linhas}
+
+
+async def _atotais_agrupados(queryset, data_inicio, data_fim, expressao):
+    """Versão assíncrona de _totais_agrupados"""
+    linhas = _consulta_agrupada(queryset, data_inicio, data_fim, expressao)
+    return {chave: (total, quantidade) async for chave, total, quantidade in linhas}
+
+
+def _bucket(inicio, fim, valores):
+    total, quantidade = valores or (None, 0)
+    return {
+        'inicio': inicio,
+        'fim': fim,
+        'total': total or Decimal('0.00'),
+        'quantidade': quantidade or 0,
+    }
+
+
+def _expressao(granularidade):
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+    return {
+        'dia': F('data_venda'),
+        'semana': TruncWeek('data_venda'),
+        'mes': TruncMonth('data_venda'),
+    }[granularidade]
+
+
+def _montar_serie(totais, data_inicio, data_fim, granularidade):
+    """Preenche os períodos sem vendas a partir dos totais agrupados"""
+    if granularidade == 'dia':
+        return [
+            _bucket(dia, dia, totais.get(dia))
+            for dia in (data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1))
+        ]
+
+    if granularidade == 'semana':
+        chave_de, proximo = _inicio_semana, lambda d: _inicio_semana(d) + timedelta(days=7)
+    else:
+        chave_de, proximo = lambda d: d.replace(day=1), _proximo_mes
+
+    serie = []
+    atual = data_inicio
+    while atual <= data_fim:
+        fim_bucket = min(proximo(atual) - timedelta(days=1), data_fim)
+        serie.append(_bucket(atual, fim_bucket, totais.get(chave_de(atual))))
+        atual = fim_bucket + timedelta(days=1)
+    return serie
+
+
+def _agrupar_blocos(totais_dia, dias):
+    serie = []
+    for i in range(0, len(totais_dia), dias):
+        bloco = totais_dia[i:i + dias]
+        serie.append({
+            'inicio': bloco[0]['inicio'],
+            'fim': bloco[-1]['fim'],
+            'total': sum((b['total'] for b in bloco), Decimal('0.00')),
+            'quantidade': sum(b['quantidade'] for b in bloco),
+        })
+    return serie
+
+
+# =============================================================================
+# API PÚBLICA
+# =============================================================================
+
+def serie_por_periodo(queryset, data_inicio, data_fim, granularidade='dia'):
+    """
+    Agrupa as vendas do queryset por dia, semana (segunda a domingo) ou mês.
+
+    Faz uma única consulta com GROUP BY e preenche em Python os períodos sem
+    vendas. Semanas e meses são recortados pelo intervalo informado, então o
+    primeiro e o último bucket podem ser parciais.
+    """
+    expressao = _expressao(granularidade)
+    if data_inicio > data_fim:
+        return []
+
+    totais = _totais_agrupados(queryset, data_inicio, data_fim, expressao)
+    return _montar_serie(totais, data_inicio, data_fim, granularidade)
+
+
+def serie_em_blocos(queryset, data_inicio, data_fim, dias=7):
+    """
+    Agrupa as vendas em blocos consecutivos de `dias` dias a partir de data_inicio.
+
+    Os blocos não seguem o calendário, então a consulta agrupa por dia e os
+    totais são somados em Python. Continua sendo uma consulta só.
+    """
+    return _agrupar_blocos(serie_por_periodo(queryset, data_inicio, data_fim, 'dia'), dias)
+
+
+async def aserie_por_periodo(queryset, data_inicio, data_fim, granularidade='dia'):
+    """Versão assíncrona de serie_por_periodo (mesma consulta, ORM assíncrono)"""
+    expressao = _expressao(granularidade)
+    if data_inicio > data_fim:
+        return []
+
+    totais = await _atotais_agrupados(queryset, data_inicio, data_fim, expressao)
+    return _montar_serie(totais, data_inicio, data_fim, granularidade)
+
+
+async def aserie_em_blocos(queryset, data_inicio, data_fim, dias=7):
+    """Versão assíncrona de serie_em_blocos"""
+    return _agrupar_blocos(await aserie_por_periodo(queryset, data_inicio, data_fim, 'dia'), dias)
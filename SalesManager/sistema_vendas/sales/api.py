@@ -0,0 +1,100 @@
+"""
+API REST versionada (/api/v1/) para integrações.
+
+As vendas saem direto de values(), sem instanciar modelos nem passar por
+serializers de campo a campo, e a paginação é a mesma por cursor da lista de
+vendas: o custo de uma página não depende da profundidade nem do total.
+Aqui também fica o /metrics lido pelo Prometheus.
+"""
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from . import metricas
+from .filtros import campos_ordenacao, filtrar_vendas, parametros_lista
+from .paginacao import paginar_por_cursor
+
+
+TAMANHO_PAGINA_PADRAO = 50
+TAMANHO_PAGINA_MAXIMO = 500
+
+# Campos expostos, na ordem da resposta; fields= escolhe um subconjunto
+CAMPOS_VENDA_API = (
+    'id', 'cliente', 'quantidade', 'valor', 'data_venda',
+    'baixada', 'data_baixa', 'data_criacao', 'data_atualizacao',
+)
+
+# Decimal como texto (mesmo padrão dos serializers do DRF): não perde centavos em float
+CONVERSOES = {'valor': str}
+
+
+def _inteiro(valor, padrao, minimo, maximo):
+    try:
+        return min(max(int(valor), minimo), maximo)
+    except (TypeError, ValueError):
+        return padrao
+
+
+def campos_pedidos(valor):
+    """Campos de fields=a,b,c na ordem de CAMPOS_VENDA_API; (campos, desconhecidos)"""
+    if not valor:
+        return list(CAMPOS_VENDA_API), []
+    nomes = {nome.strip() for nome in valor.split(',') if nome.strip()}
+    desconhecidos = sorted(nomes - set(CAMPOS_VENDA_API))
+    return [campo for campo in CAMPOS_VENDA_API if campo in nomes], desconhecidos
+
+
+def _serializar(linha, campos):
+    return {
+        campo: CONVERSOES[campo](linha[campo]) if campo in CONVERSOES and linha[campo] is not None else linha[campo]
+        for campo in campos
+    }
+
+
+class VendasApiView(APIView):
+    """
+    GET /api/v1/vendas/: vendas do usuário autenticado.
+
+    Aceita os filtros da lista de vendas (busca, status, cliente, data_inicio,
+    data_fim, ordenar_por; status padrão 'ativas'), cursor, page_size (até
+    500) e fields para escolher os campos devolvidos.
+    """
+
+    def get(self, request):
+        parametros = parametros_lista(request.query_params)
+        campos, desconhecidos = campos_pedidos(request.query_params.get('fields', ''))
+        if desconhecidos or not campos:
+            return Response(
+                {'error': 'Campos inválidos em fields', 'campos_invalidos': desconhecidos,
+                 'campos_disponiveis': CAMPOS_VENDA_API},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ordenacao = campos_ordenacao(parametros['ordenar_por'])
+        tamanho = _inteiro(
+            request.query_params.get('page_size'), TAMANHO_PAGINA_PADRAO, 1, TAMANHO_PAGINA_MAXIMO
+        )
+
+        # A chave de ordenação entra no SELECT para montar os cursores, mesmo fora de fields
+        colunas = list(dict.fromkeys([*campos, *(campo.lstrip('-') for campo in ordenacao)]))
+        vendas = filtrar_vendas(request.user, parametros).values(*colunas)
+        pagina = paginar_por_cursor(vendas, ordenacao, request.query_params.get('cursor'), tamanho)
+
+        url = request.build_absolute_uri()
+        return Response({
+            'next': replace_query_param(url, 'cursor', pagina.cursor_proximo) if pagina.tem_proximo else None,
+            'previous': replace_query_param(url, 'cursor', pagina.cursor_anterior) if pagina.tem_anterior else None,
+            'results': [_serializar(linha, campos) for linha in pagina.itens],
+        })
+
+
+class MetricasView(APIView):
+    """GET /metrics: métricas de todos os processos no formato do Prometheus (só staff; Basic Auth para o coletor)"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'sales'
\ No newline at end of file
+    name = 'sales'
+
+    def ready(self):
+        from . import signals, tarefas  # noqa: F401
@@ -0,0 +1,141 @@
+"""
+Autocompletar nomes de clientes no cadastro de vendas.
+
+Cada processo guarda, por usuário, um índice de prefixos em memória: as
+chaves normalizadas (e cada sufixo a partir de uma palavra, para achar pelo
+sobrenome) numa lista ordenada, consultada com bisect. Os clientes já vêm
+numerados por relevância (compras com decaimento pela última compra), então
+os melhores de um prefixo são os menores números do intervalo.
+
+O índice é montado na primeira consulta e fica num LRU de até
+SALES_AUTOCOMPLETE_USUARIOS usuários. Um cliente novo (ou removido)
+incrementa a versão do usuário no cache compartilhado, o que faz todos os
+processos remontarem o índice; SALES_AUTOCOMPLETE_TTL limita quanto a
+ordem fica defasada das compras seguintes.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import cache_metricas, clientes
+from .models import Cliente
+
+
+PREFIXO = 'autocomplete'
+USUARIOS_PADRAO = 128
+TTL_PADRAO = 5 * 60
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 20
+
+# A cada MEIA_VIDA_DIAS sem comprar, as compras de um cliente valem metade
+MEIA_VIDA_DIAS = 180
+
+# Intervalos maiores que isto (prefixos de uma ou duas letras) têm o resultado memorizado
+INTERVALO_MEMORIZADO = 2000
+
+# Acima de qualquer caractere: prefixo + FIM encerra o intervalo do prefixo
+FIM = chr(0x10FFFF)
+
+_lock = threading.Lock()
+_indices = OrderedDict()
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def pontuacao(quantidade_compras, ultima_compra, hoje):
+    """Frequência com decaimento pela recência"""
+    if ultima_compra is None:
+        return 0.0
+    return quantidade_compras * 0.5 ** (max((hoje - ultima_compra).days, 0) / MEIA_VIDA_DIAS)
+
+
+class IndicePrefixos:
+    """Clientes de um usuário prontos para consulta por prefixo"""
+
+    def __init__(self, linhas, hoje):
+        # Posição na lista = ordem de relevância
+        self.clientes = sorted(
+            linhas,
+            key=lambda linha: (-pontuacao(linha[2], linha[3], hoje), -(linha[3] or hoje).toordinal(), linha[1]),
+        )
+        entradas = []
+        for posicao, (chave, *_) in enumerate(self.clientes):
+            palavras = chave.split(' ')
+            entradas.extend((' '.join(palavras[inicio:]), posicao) for inicio in range(len(palavras)))
+        entradas.sort()
+        self.chaves = [chave for chave, _ in entradas]
+        self.posicoes = [posicao for _, posicao in entradas]
+        self._memorizados = {}
+
+    def buscar(self, prefixo, limite=LIMITE_PADRAO):
+        """[(nome, compras, última compra)] dos clientes com um nome ou palavra começando por `prefixo`"""
+        melhores = self._memorizados.get(prefixo)
+        if melhores is None:
+            inicio = bisect_left(self.chaves, prefixo)
+            fim = bisect_left(self.chaves, prefixo + FIM, inicio)
+            melhores = heapq.nsmallest(LIMITE_MAXIMO, set(self.posicoes[inicio:fim]))
+            if fim - inicio > INTERVALO_MEMORIZADO:
+                self._memorizados[prefixo] = melhores
+        return [self.clientes[posicao][1:] for posicao in melhores[:limite]]
+
+
+# =============================================================================
+# ÍNDICE POR USUÁRIO (LRU NO PROCESSO, VERSÃO NO CACHE COMPARTILHADO)
+# =============================================================================
+# A versão segue a mesma regra das métricas (cache_metricas), com outro prefixo
+
+def _montar(usuario_id):
+    linhas = Cliente.objects.filter(usuario_id=usuario_id).values_list(
+        'chave', 'nome', 'quantidade_compras', 'ultima_compra'
+    )
+    return IndicePrefixos(list(linhas), timezone.localdate())
+
+
+def indice_usuario(usuario_id):
+    """Índice do usuário, montado de novo se a versão mudou ou o TTL venceu"""
+    versao = cache_metricas.versao_usuario(usuario_id, PREFIXO)
+    agora = time.monotonic()
+    with _lock:
+        item = _indices.get(usuario_id)
+        if item and item[0] == versao and agora - item[1] < _config('SALES_AUTOCOMPLETE_TTL', TTL_PADRAO):
+            _indices.move_to_end(usuario_id)
+            return item[2]
+
+    # Fora do lock: a consulta ao banco não bloqueia os outros usuários
+    indice = _montar(usuario_id)
+    with _lock:
+        _indices[usuario_id] = (versao, agora, indice)
+        _indices.move_to_end(usuario_id)
+        while len(_indices) > _config('SALES_AUTOCOMPLETE_USUARIOS', USUARIOS_PADRAO):
+            _indices.popitem(last=False)
+    return indice
+
+
+def sugerir(usuario_id, termo, limite=LIMITE_PADRAO):
+    """Nomes de clientes do usuário que começam com `termo`, os mais frequentes e recentes primeiro"""
+    prefixo = clientes.normalizar_nome(termo)
+    if not prefixo:
+        return []
+    return indice_usuario(usuario_id).buscar(prefixo, min(limite, LIMITE_MAXIMO))
+
+
+def invalidar_usuarios(usuario_ids):
+    """Clientes criados ou removidos: incrementa a versão agora e após o commit"""
+    cache_metricas.invalidar_usuarios(usuario_ids, PREFIXO)
+
+
+def invalidar_usuario(usuario_id):
+    invalidar_usuarios([usuario_id])
+
+
+def limpar():
+    """Descarta os índices deste processo"""
+    with _lock:
+        _indices.clear()
@@ -0,0 +1,31 @@
+"""
+Baixa e reativação de vendas com UPDATE condicional.
+
+Nada é lido, alterado em Python e salvo de volta: o próprio UPDATE filtra as
+vendas que ainda não estão no estado pedido, então cliques repetidos ou
+simultâneos não invertem a venda duas vezes. O resumo diário é ajustado na
+mesma transação por VendaQuerySet.update.
+"""
+from django.utils import timezone
+
+
+# Ação recebida na URL/POST -> valor de `baixada` desejado
+ACOES_BAIXA = {'baixar': True, 'reativar': False}
+
+
+def definir_baixa(usuario, vendas, baixada):
+    """
+    Baixa (ou reativa) em um único UPDATE as vendas do usuário no queryset.
+
+    Só as vendas que ainda não estão no estado pedido são alteradas. Devolve o
+    número de linhas afetadas.
+    """
+    alvo = vendas.filter(usuario=usuario, baixada=not baixada)
+    agora = timezone.now()
+
+    return alvo.update(
+        baixada=baixada,
+        data_baixa=agora.date() if baixada else None,
+        data_atualizacao=agora,
+    )
+
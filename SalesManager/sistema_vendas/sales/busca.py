@@ -0,0 +1,166 @@
+"""
+Busca de clientes por nome: prefixo, trecho e aproximada (erros de digitação).
+
+Procura na chave normalizada de Cliente (sem acentos e caixa) com índice de
+trigramas: FTS5 com tokenizer trigram no SQLite e pg_trgm no PostgreSQL
+(migração 0010). Em outros bancos, ou com termos de menos de 3 letras, cai
+para LIKE nos clientes do usuário, que são poucos perto das vendas.
+
+Os filtros de vendas usam só prefixo e trecho; a busca aproximada ordena as
+sugestões e o "Você quis dizer" da lista.
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .clientes import normalizar_nome
+from .models import Cliente
+
+
+TABELA_FTS = 'sales_cliente_busca'
+TAMANHO_TRIGRAMA = 3
+# Mesmo limiar padrão do pg_trgm
+LIMIAR_SIMILARIDADE = 0.3
+# Clientes avaliados por busca aproximada
+MAX_CANDIDATOS = 500
+
+# Ordem dos resultados: nome começa com o termo, uma palavra começa, contém, aproximado
+PREFIXO, PREFIXO_PALAVRA, TRECHO, APROXIMADO = range(4)
+
+
+def trigramas(texto):
+    """Trigramas de cada palavra com as bordas marcadas, como no pg_trgm"""
+    resultado = set()
+    for palavra in texto.split():
+        marcada = f'  {palavra} '
+        resultado.update(marcada[i:i + TAMANHO_TRIGRAMA] for i in range(len(marcada) - TAMANHO_TRIGRAMA + 1))
+    return resultado
+
+
+def similaridade(a, b):
+    """Trigramas em comum sobre trigramas no total (0 a 1), a similarity() do pg_trgm"""
+    ta, tb = trigramas(a), trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def _usa_fts(chave):
+    return connection.vendor == 'sqlite' and len(chave) >= TAMANHO_TRIGRAMA
+
+
+def _frase_fts(texto):
+    return '"' + texto.replace('"', '""') + '"'
+
+
+# =============================================================================
+# CONSULTAS
+# =============================================================================
+
+def _ids_trecho(usuario_id, chave):
+    """Subconsulta (não executada) dos ids de clientes do usuário cujo nome contém `chave`"""
+    if _usa_fts(chave):
+        return RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE chave MATCH %s AND usuario_id = %s',
+            [_frase_fts(chave), usuario_id],
+        )
+    # PostgreSQL: LIKE '%...%' usa o índice GIN de trigramas
+    return Cliente.objects.filter(usuario_id=usuario_id, chave__contains=chave).values('id')
+
+
+def _candidatos_aproximados(usuario_id, chave):
+    """Clientes que têm trigramas em comum com `chave` (ainda sem o corte por similaridade)"""
+    clientes = Cliente.objects.filter(usuario_id=usuario_id)
+    if connection.vendor == 'postgresql':
+        # O operador % do pg_trgm filtra pelo mesmo limiar, usando o índice GIN
+        return clientes.filter(id__in=RawSQL(
+            'SELECT id FROM sales_cliente WHERE usuario_id = %s AND chave %% %s '
+            'ORDER BY similarity(chave, %s) DESC LIMIT %s',
+            [usuario_id, chave, chave, MAX_CANDIDATOS],
+        ))
+    if _usa_fts(chave):
+        # Qualquer trigrama do termo; o rank do FTS (bm25) favorece quem tem mais deles
+        consulta = ' OR '.join(
+            _frase_fts(chave[i:i + TAMANHO_TRIGRAMA]) for i in range(len(chave) - TAMANHO_TRIGRAMA + 1)
+        )
+        return clientes.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE chave MATCH %s AND usuario_id = %s ORDER BY rank LIMIT %s',
+            [consulta, usuario_id, MAX_CANDIDATOS],
+        ))
+    return clientes.order_by('-quantidade_compras')[:MAX_CANDIDATOS]
+
+
+def _aproximados(usuario_id, chave, excluir=()):
+    """[(similaridade, cliente)] acima do limiar, sem os ids em `excluir`"""
+    resultado = []
+    for cliente in _candidatos_aproximados(usuario_id, chave):
+        if cliente.id in excluir:
+            continue
+        pontuacao = similaridade(chave, cliente.chave)
+        if pontuacao >= LIMIAR_SIMILARIDADE:
+            resultado.append((pontuacao, cliente))
+    return resultado
+
+
+def _tipo(chave_cliente, termo):
+    if chave_cliente.startswith(termo):
+        return PREFIXO
+    if any(palavra.startswith(termo) for palavra in chave_cliente.split()):
+        return PREFIXO_PALAVRA
+    return TRECHO
+
+
+# =============================================================================
+# API
+# =============================================================================
+
+def buscar_clientes(usuario_id, termo, limite=10):
+    """
+    Clientes do usuário que combinam com `termo`, os melhores primeiro.
+
+    Prefixo antes de trecho e trecho antes de aproximado; no mesmo grupo,
+    quem compra mais vem antes. Aproximados só completam a lista.
+    """
+    chave = normalizar_nome(termo)
+    if not chave:
+        return []
+
+    trecho = Cliente.objects.filter(id__in=_ids_trecho(usuario_id, chave)).order_by('-quantidade_compras')
+    ordenados = sorted(
+        trecho[:MAX_CANDIDATOS],
+        key=lambda cliente: (_tipo(cliente.chave, chave), -cliente.quantidade_compras, cliente.nome),
+    )[:limite]
+
+    if len(ordenados) < limite:
+        encontrados = {cliente.id for cliente in ordenados}
+        aproximados = sorted(
+            _aproximados(usuario_id, chave, excluir=encontrados),
+            key=lambda item: (-item[0], -item[1].quantidade_compras, item[1].nome),
+        )
+        ordenados += [cliente for _, cliente in aproximados[:limite - len(ordenados)]]
+    return ordenados
+
+
+def filtrar_por_cliente(vendas, usuario_id, termo):
+    """
+    Restringe as vendas aos clientes cujo nome contém `termo` (sem acento e caixa).
+
+    Nunca usa a busca aproximada: o filtro vale também para exportações e
+    baixa em massa, onde trocar o cliente por outro parecido mexeria nas
+    vendas erradas. Nomes parecidos vêm de sugestoes_cliente.
+    """
+    chave = normalizar_nome(termo)
+    if not chave:
+        return vendas
+    return vendas.filter(cliente_cadastro_id__in=_ids_trecho(usuario_id, chave))
+
+
+def sugestoes_cliente(usuario_id, termo, limite=3):
+    """Nomes parecidos com `termo` ("Você quis dizer"), só quando nenhum nome o contém"""
+    chave = normalizar_nome(termo)
+    if not chave or Cliente.objects.filter(id__in=_ids_trecho(usuario_id, chave)).exists():
+        return []
+    aproximados = sorted(
+        _aproximados(usuario_id, chave),
+        key=lambda item: (-item[0], -item[1].quantidade_compras, item[1].nome),
+    )
+    return [cliente.nome for _, cliente in aproximados[:limite]]
@@ -0,0 +1,367 @@
+"""
+Backend de cache em duas camadas: LRU no processo (L1) na frente de um cache
+compartilhado entre os processos (L2: arquivos, banco ou Redis).
+
+Leituras procuram no L1 e, se não acharem, no L2, guardando o valor no L1
+por até L1_TIMEOUT segundos. Escritas e remoções vão para o L2 e publicam
+uma invalidação: um contador de geração no L2 é incrementado e as chaves
+alteradas ficam registradas sob o número da geração. Cada processo confere
+a geração no máximo a cada INTERVALO_SINCRONIZACAO segundos e descarta do
+seu L1 as chaves das gerações que ainda não viu (tudo, se faltar alguma).
+Um processo vê as próprias escritas na hora; as dos outros, em até
+INTERVALO_SINCRONIZACAO segundos.
+
+Valores com timeout vão para o L2 junto com o instante em que expiram, e o
+L1 nunca os guarda além disso; sem timeout (timeout=None) vão como estão,
+o que mantém o incr atômico do L2 para contadores e versões.
+
+    CACHES = {'default': {
+        'BACKEND': 'sales.cache_camadas.CacheDuasCamadas',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'L2': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://...'},
+            'L1_MAX_ENTRADAS': 1000, 'L1_TIMEOUT': 30, 'INTERVALO_SINCRONIZACAO': 1.0,
+        },
+    }}
+
+KEY_PREFIX e VERSION vão na configuração do L2: o L1 usa as mesmas chaves.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+
+L1_MAX_ENTRADAS_PADRAO = 1000
+L1_TIMEOUT_PADRAO = 30
+INTERVALO_SINCRONIZACAO_PADRAO = 1.0
+
+CHAVE_GERACAO = 'camadas:geracao'
+# Gerações guardadas no L2; um processo atrasado além disso limpa o L1 inteiro
+GERACOES_GUARDADAS = 1000
+TIMEOUT_GERACOES = 10 * 60
+# Chave especial da invalidação: clear() em algum processo
+TODAS = '*'
+
+_AUSENTE = object()
+
+
+def _chave_invalidacao(geracao):
+    return f'camadas:invalidadas:{geracao}'
+
+
+class _Validade(NamedTuple):
+    """Valor guardado no L2 com o instante (epoch) em que expira"""
+    valor: Any
+    expira_em: float
+
+
+def _embrulhar(valor, timeout):
+    return valor if timeout is None else _Validade(valor, time.time() + timeout)
+
+
+def _desembrulhar(bruto):
+    """(valor, segundos até expirar no L2 ou None se não expira)"""
+    if isinstance(bruto, _Validade):
+        return bruto.valor, bruto.expira_em - time.time()
+    return bruto, None
+
+
+class _Camada1:
+    """LRU do processo, compartilhado pelas threads (as instâncias do backend são por thread)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.itens = OrderedDict()
+        self.geracao = None
+        # Escritas deste processo: também tornam suspeito um valor que estava sendo lido do L2
+        self.escritas = 0
+        self.sincronizado_em = 0.0
+        self.contadores = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0}
+        self.pid = os.getpid()
+
+    def ler(self, chave):
+        with self.lock:
+            item = self.itens.get(chave)
+            if item is not None and item[1] > time.monotonic():
+                self.itens.move_to_end(chave)
+                self.contadores['l1_hits'] += 1
+                return pickle.loads(item[0])
+            if item is not None:
+                del self.itens[chave]
+            self.contadores['l1_misses'] += 1
+            return _AUSENTE
+
+    def definir_geracao(self, geracao):
+        with self.lock:
+            self.geracao = geracao
+
+    def marca(self):
+        with self.lock:
+            return self.geracao, self.escritas
+
+    def guardar(self, chave, valor, timeout, max_entradas, marca):
+        if timeout <= 0:
+            return
+        dados = pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            # Uma invalidação chegou enquanto o valor era lido do L2: ele pode ser antigo
+            if marca != (self.geracao, self.escritas):
+                return
+            self.itens[chave] = (dados, time.monotonic() + timeout)
+            self.itens.move_to_end(chave)
+            while len(self.itens) > max_entradas:
+                self.itens.popitem(last=False)
+
+    def descartar(self, chaves):
+        with self.lock:
+            self.escritas += 1
+            for chave in chaves:
+                self.itens.pop(chave, None)
+
+    def limpar(self):
+        with self.lock:
+            self.escritas += 1
+            self.itens.clear()
+
+    def contar(self, nome, quantidade=1):
+        with self.lock:
+            self.contadores[nome] += quantidade
+
+
+_camadas = {}
+_lock = threading.Lock()
+
+
+def _camada1(nome):
+    with _lock:
+        camada = _camadas.get(nome)
+        # Processo filho (fork depois do import) começa com o L1 e os contadores vazios
+        if camada is None or camada.pid != os.getpid():
+            camada = _camadas[nome] = _Camada1()
+        return camada
+
+
+def estatisticas():
+    """Acertos e falhas por camada de cada cache deste processo: {nome: {'l1': {...}, 'l2': {...}}}"""
+    with _lock:
+        camadas = {nome: camada for nome, camada in _camadas.items() if camada.pid == os.getpid()}
+    resultado = {}
+    for nome, camada in camadas.items():
+        with camada.lock:
+            contadores = dict(camada.contadores)
+        resultado[nome] = {}
+        for nivel in ('l1', 'l2'):
+            hits, misses = contadores[f'{nivel}_hits'], contadores[f'{nivel}_misses']
+            resultado[nome][nivel] = {
+                'hits': hits, 'misses': misses, 'taxa_acerto': hits / (hits + misses) if hits + misses else 0.0,
+            }
+    return resultado
+
+
+class CacheDuasCamadas(BaseCache):
+    """L1 em memória com invalidação por geração publicada no L2 (ver o docstring do módulo)"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        opcoes = params.get('OPTIONS', {})
+        configuracao_l2 = dict(opcoes['L2'])
+        backend_l2 = import_string(configuracao_l2.pop('BACKEND'))
+        self.l2 = backend_l2(configuracao_l2.pop('LOCATION', ''), configuracao_l2)
+
+        self.nome = location or 'default'
+        self.l1_max_entradas = opcoes.get('L1_MAX_ENTRADAS', L1_MAX_ENTRADAS_PADRAO)
+        self.l1_timeout = opcoes.get('L1_TIMEOUT', L1_TIMEOUT_PADRAO)
+        self.intervalo_sincronizacao = opcoes.get('INTERVALO_SINCRONIZACAO', INTERVALO_SINCRONIZACAO_PADRAO)
+
+    @property
+    def l1(self):
+        return _camada1(self.nome)
+
+    def _chave(self, key, version):
+        chave = self.l2.make_key(key, version)
+        self.l2.validate_key(chave)
+        return chave
+
+    # =========================================================================
+    # INVALIDAÇÃO POR GERAÇÃO
+    # =========================================================================
+
+    def _publicar(self, chaves):
+        """Remove as chaves do L1 deste processo e registra a invalidação para os outros"""
+        chaves = list(chaves)
+        if TODAS in chaves:
+            self.l1.limpar()
+        else:
+            self.l1.descartar(chaves)
+
+        # incr do L2 de arquivos/banco não é atômico: se a geração já foi usada, tenta a seguinte
+        for _ in range(5):
+            try:
+                geracao = self.l2.incr(CHAVE_GERACAO)
+            except ValueError:
+                self.l2.add(CHAVE_GERACAO, 0, timeout=None)
+                continue
+            if self.l2.add(_chave_invalidacao(geracao), chaves, timeout=TIMEOUT_GERACOES):
+                return
+        # Sem conseguir registrar as chaves, uma geração com TODAS limpa o L1 de todos
+        geracao = self.l2.incr(CHAVE_GERACAO)
+        self.l2.set(_chave_invalidacao(geracao), [TODAS], timeout=TIMEOUT_GERACOES)
+
+    def _sincronizar(self):
+        """Aplica ao L1 as invalidações publicadas desde a última geração vista"""
+        camada = self.l1
+        agora = time.monotonic()
+        if camada.geracao is not None and agora - camada.sincronizado_em < self.intervalo_sincronizacao:
+            return camada.marca()
+        camada.sincronizado_em = agora
+
+        atual = self.l2.get(CHAVE_GERACAO) or 0
+        vista = camada.geracao
+        if vista is None or atual == vista:
+            # Na primeira leitura o L1 ainda está vazio: não há o que descartar
+            camada.definir_geracao(atual)
+            return camada.marca()
+
+        if atual < vista or atual - vista > GERACOES_GUARDADAS:
+            # O L2 foi limpo (ou reiniciado) ou o processo ficou para trás demais
+            camada.limpar()
+        else:
+            registros = self.l2.get_many([_chave_invalidacao(g) for g in range(vista + 1, atual + 1)])
+            chaves = {chave for registro in registros.values() for chave in registro}
+            if len(registros) < atual - vista or TODAS in chaves:
+                camada.limpar()
+            else:
+                camada.descartar(chaves)
+        camada.definir_geracao(atual)
+        return camada.marca()
+
+    # =========================================================================
+    # LEITURA
+    # =========================================================================
+
+    def _guardar_l1(self, chave, bruto, marca):
+        """Guarda no L1 o valor lido do L2, sem passar do prazo que ele ainda tem lá"""
+        valor, restante = _desembrulhar(bruto)
+        timeout = self.l1_timeout if restante is None else min(self.l1_timeout, restante)
+        self.l1.guardar(chave, valor, timeout, self.l1_max_entradas, marca)
+        return valor
+
+    def _ler_l2(self, key, chave, version, marca):
+        bruto = self.l2.get(key, _AUSENTE, version=version)
+        if bruto is _AUSENTE:
+            self.l1.contar('l2_misses')
+            return _AUSENTE
+        self.l1.contar('l2_hits')
+        return self._guardar_l1(chave, bruto, marca)
+
+    def get(self, key, default=None, version=None):
+        chave = self._chave(key, version)
+        marca = self._sincronizar()
+        valor = self.l1.ler(chave)
+        if valor is _AUSENTE:
+            valor = self._ler_l2(key, chave, version, marca)
+        return default if valor is _AUSENTE else valor
+
+    def get_many(self, keys, version=None):
+        marca = self._sincronizar()
+        resultado, faltam = {}, {}
+        for key in keys:
+            chave = self._chave(key, version)
+            valor = self.l1.ler(chave)
+            if valor is _AUSENTE:
+                faltam[key] = chave
+            else:
+                resultado[key] = valor
+        if faltam:
+            encontrados = self.l2.get_many(faltam, version=version)
+            self.l1.contar('l2_hits', len(encontrados))
+            self.l1.contar('l2_misses', len(faltam) - len(encontrados))
+            for key, bruto in encontrados.items():
+                resultado[key] = self._guardar_l1(faltam[key], bruto, marca)
+        return resultado
+
+    def has_key(self, key, version=None):
+        self._sincronizar()
+        chave = self._chave(key, version)
+        with self.l1.lock:
+            item = self.l1.itens.get(chave)
+        if item is not None and item[1] > time.monotonic():
+            return True
+        return self.l2.has_key(key, version=version)
+
+    # =========================================================================
+    # ESCRITA (SEMPRE NO L2, COM INVALIDAÇÃO PUBLICADA)
+    # =========================================================================
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout_l2(timeout)
+        self.l2.set(key, _embrulhar(value, timeout), timeout, version=version)
+        self._publicar([self._chave(key, version)])
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout_l2(timeout)
+        adicionado = self.l2.add(key, _embrulhar(value, timeout), timeout, version=version)
+        if adicionado:
+            self._publicar([self._chave(key, version)])
+        return adicionado
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout_l2(timeout)
+        dados = {key: _embrulhar(value, timeout) for key, value in data.items()}
+        falhas = self.l2.set_many(dados, timeout, version=version)
+        self._publicar([self._chave(key, version) for key in data])
+        return falhas
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # O prazo vai junto do valor: regravar atualiza os dois e publica a invalidação do L1
+        bruto = self.l2.get(key, _AUSENTE, version=version)
+        if bruto is _AUSENTE:
+            return False
+        self.set(key, _desembrulhar(bruto)[0], timeout, version=version)
+        return True
+
+    def delete(self, key, version=None):
+        removido = self.l2.delete(key, version=version)
+        self._publicar([self._chave(key, version)])
+        return removido
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l2.delete_many(keys, version=version)
+        self._publicar([self._chave(key, version) for key in keys])
+
+    def incr(self, key, delta=1, version=None):
+        bruto = self.l2.get(key, _AUSENTE, version=version)
+        if isinstance(bruto, _Validade):
+            # Valor com prazo não é um inteiro no L2: soma aqui, mantendo o prazo (não atômico)
+            valor = bruto.valor + delta
+            self.l2.set(key, bruto._replace(valor=valor), max(bruto.expira_em - time.time(), 1), version=version)
+        else:
+            valor = self.l2.incr(key, delta, version=version)
+        self._publicar([self._chave(key, version)])
+        return valor
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        # Também apaga a geração: os outros processos veem o contador voltar e limpam o L1
+        self.l2.clear()
+        self._publicar([TODAS])
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    def _timeout_l2(self, timeout):
+        # DEFAULT_TIMEOUT do L1 vira o TIMEOUT deste cache, não o do L2
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def estatisticas(self):
+        """Acertos e falhas de L1 e L2 deste cache no processo atual"""
+        return estatisticas().get(self.nome, {})
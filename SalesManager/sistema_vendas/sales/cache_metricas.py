@@ -0,0 +1,155 @@
+"""
+Cache das métricas por usuário, invalidado por versão.
+
+Cada usuário tem uma chave de versão no cache. As métricas são gravadas sob
+(usuário, versão, nome, parâmetros); qualquer escrita em Venda incrementa a
+versão e todas as entradas antigas deixam de ser lidas (expiram sozinhas).
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+PREFIXO = 'metricas'
+TIMEOUT_PADRAO = 60 * 60
+
+_lock = threading.Lock()
+_contadores = {'hits': 0, 'misses': 0, 'invalidacoes': 0}
+
+
+def _timeout():
+    return getattr(settings, 'METRICAS_CACHE_TIMEOUT', TIMEOUT_PADRAO)
+
+
+def _chave_versao(usuario_id, prefixo=PREFIXO):
+    return f'{prefixo}:versao:{usuario_id}'
+
+
+def _contar(nome):
+    with _lock:
+        _contadores[nome] += 1
+
+
+# =============================================================================
+# VERSÃO POR USUÁRIO
+# =============================================================================
+# `prefixo` separa versões de outros caches por usuário com a mesma regra
+# (o índice do autocomplete usa 'autocomplete').
+
+def versao_usuario(usuario_id, prefixo=PREFIXO):
+    """Versão atual das métricas do usuário (criada na primeira leitura)"""
+    chave = _chave_versao(usuario_id, prefixo)
+    versao = cache.get(chave)
+    if versao is None:
+        # Começa no relógio em ms para não reaproveitar versões antigas se a chave for despejada
+        cache.add(chave, int(time.time() * 1000), timeout=None)
+        versao = cache.get(chave)
+    return versao
+
+
+async def aversao_usuario(usuario_id, prefixo=PREFIXO):
+    """Versão assíncrona de versao_usuario"""
+    chave = _chave_versao(usuario_id, prefixo)
+    versao = await cache.aget(chave)
+    if versao is None:
+        await cache.aadd(chave, int(time.time() * 1000), timeout=None)
+        versao = await cache.aget(chave)
+    return versao
+
+
+def _incrementar(usuario_id, prefixo):
+    chave = _chave_versao(usuario_id, prefixo)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, int(time.time() * 1000), timeout=None)
+
+
+def invalidar_usuarios(usuario_ids, prefixo=PREFIXO):
+    """
+    Incrementa a versão dos usuários agora e de novo após o commit.
+
+    O segundo incremento descarta métricas que outra requisição tenha
+    calculado com dados antigos entre a escrita e o commit.
+    """
+    usuario_ids = {uid for uid in usuario_ids if uid is not None}
+    if not usuario_ids:
+        return
+
+    for usuario_id in usuario_ids:
+        _incrementar(usuario_id, prefixo)
+    if prefixo == PREFIXO:
+        _contar('invalidacoes')
+
+    def apos_commit():
+        for usuario_id in usuario_ids:
+            _incrementar(usuario_id, prefixo)
+
+    transaction.on_commit(apos_commit)
+
+
+def invalidar_usuario(usuario_id, prefixo=PREFIXO):
+    invalidar_usuarios([usuario_id], prefixo)
+
+
+# =============================================================================
+# LEITURA COM CÁLCULO SOB DEMANDA
+# =============================================================================
+
+def _montar_chave(usuario_id, versao, nome, parametros):
+    assinatura = hashlib.md5(
+        json.dumps(parametros or {}, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+    return f'{PREFIXO}:{usuario_id}:v{versao}:{nome}:{assinatura}'
+
+
+def chave_metrica(usuario_id, nome, parametros=None):
+    return _montar_chave(usuario_id, versao_usuario(usuario_id), nome, parametros)
+
+
+def obter_ou_calcular(usuario_id, nome, parametros, calcular):
+    """Devolve a métrica em cache ou executa `calcular()` e guarda o resultado"""
+    chave = chave_metrica(usuario_id, nome, parametros)
+    valor = cache.get(chave)
+    if valor is not None:
+        _contar('hits')
+        return valor
+
+    _contar('misses')
+    valor = calcular()
+    cache.set(chave, valor, _timeout())
+    return valor
+
+
+async def aobter_ou_calcular(usuario_id, nome, parametros, calcular):
+    """Versão assíncrona de obter_ou_calcular; `calcular()` devolve uma corrotina"""
+    chave = _montar_chave(usuario_id, await aversao_usuario(usuario_id), nome, parametros)
+    valor = await cache.aget(chave)
+    if valor is not None:
+        _contar('hits')
+        return valor
+
+    _contar('misses')
+    valor = await calcular()
+    await cache.aset(chave, valor, _timeout())
+    return valor
+
+
+def estatisticas():
+    """Contadores de hit/miss deste processo"""
+    with _lock:
+        dados = dict(_contadores)
+    consultas = dados['hits'] + dados['misses']
+    dados['taxa_acerto'] = dados['hits'] / consultas if consultas else 0.0
+    return dados
+
+
+def zerar_estatisticas():
+    with _lock:
+        for nome in _contadores:
+            _contadores[nome] = 0
@@ -0,0 +1,208 @@
+"""
+Gerador de carga HTTP para os benchmarks.
+
+Dispara requisições concorrentes (threads, uma conexão por requisição) contra
+um servidor já em execução, ou no próprio processo pelo Client de teste do
+Django, e mede vazão e percentis de latência por rota.
+"""
+import http.client
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por interpolação linear; 0.0 para lista vazia"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir(latencias, erros, duracao):
+    """Vazão e percentis (ms) de uma lista de latências em segundos"""
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'rps': len(latencias) / duracao if duracao else 0.0,
+        'p50_ms': 1000 * percentil(latencias, 50),
+        'p95_ms': 1000 * percentil(latencias, 95),
+        'p99_ms': 1000 * percentil(latencias, 99),
+    }
+
+
+def _requisitar(base, caminho, cabecalhos, timeout):
+    conexao = http.client.HTTPConnection(base.hostname, base.port or 80, timeout=timeout)
+    try:
+        conexao.request('GET', caminho, headers=cabecalhos)
+        resposta = conexao.getresponse()
+        resposta.read()
+        return resposta.status
+    finally:
+        conexao.close()
+
+
+def _executar(novo_requisitante, rotas, requisicoes, concorrencia, ao_encerrar=None):
+    """
+    Distribui `requisicoes` entre as `rotas` em rodízio, com `concorrencia` threads.
+
+    `novo_requisitante()` é chamado uma vez por thread e devolve a função
+    (caminho, cabeçalhos) -> status usada por ela; `ao_encerrar()` roda no
+    fim de cada thread.
+    """
+    proxima = iter(range(requisicoes))
+    lock = threading.Lock()
+    latencias = defaultdict(list)
+    erros = defaultdict(int)
+
+    def trabalhador():
+        requisitar = novo_requisitante()
+        try:
+            while True:
+                with lock:
+                    indice = next(proxima, None)
+                if indice is None:
+                    return
+                nome, caminho, extras = rotas[indice % len(rotas)]
+                inicio = time.perf_counter()
+                try:
+                    status = requisitar(caminho, extras)
+                except OSError:
+                    status = None
+                decorrido = time.perf_counter() - inicio
+                with lock:
+                    if status is not None and 200 <= status < 300:
+                        latencias[nome].append(decorrido)
+                    else:
+                        erros[nome] += 1
+        finally:
+            if ao_encerrar:
+                ao_encerrar()
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador, daemon=True) for _ in range(concorrencia)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    todas = [latencia for lista in latencias.values() for latencia in lista]
+    return {
+        'geral': resumir(todas, sum(erros.values()), duracao),
+        'rotas': {
+            nome: resumir(latencias[nome], erros[nome], duracao)
+            for nome in dict.fromkeys(nome for nome, _, _ in rotas)
+        },
+    }
+
+
+def executar_carga(base_url, rotas, requisicoes=200, concorrencia=10, cabecalhos=None, timeout=30):
+    """
+    Carga contra o servidor em `base_url`.
+
+    `rotas` é uma lista de (nome, caminho, cabeçalhos extras); um nome pode
+    se repetir para pesar mais no rodízio. Respostas fora de 2xx contam como
+    erro e não entram nas latências. Devolve o resumo geral e um resumo por rota.
+    """
+    base = urlsplit(base_url)
+    cabecalhos = cabecalhos or {}
+
+    def novo_requisitante():
+        return lambda caminho, extras: _requisitar(base, caminho, {**cabecalhos, **extras}, timeout)
+
+    return _executar(novo_requisitante, rotas, requisicoes, concorrencia)
+
+
+def executar_carga_local(rotas, requisicoes=200, concorrencia=10, cabecalhos=None):
+    """
+    Mesma carga de `executar_carga`, no próprio processo pelo Client de teste.
+
+    Passa por todos os middlewares e pelo banco configurado, sem rede nem
+    servidor; o corpo das respostas em streaming é consumido por inteiro.
+    """
+    from django.db import connections
+    from django.test import Client
+
+    cabecalhos = cabecalhos or {}
+
+    def novo_requisitante():
+        client = Client(raise_request_exception=False)
+
+        def requisitar(caminho, extras):
+            response = client.get(caminho, headers={**cabecalhos, **extras})
+            if response.streaming:
+                b''.join(response.streaming_content)
+            response.close()
+            return response.status_code
+        return requisitar
+
+    # Cada thread abre as próprias conexões com o banco
+    return _executar(novo_requisitante, rotas, requisicoes, concorrencia, ao_encerrar=connections.close_all)
+
+
+def _cabecalho_cookie(cookies):
+    return '; '.join(f'{nome}={valor}' for nome, valor in cookies.items())
+
+
+def entrar(base_url, caminho_login, usuario, senha, timeout=30):
+    """
+    Faz login pelo formulário (com o token CSRF) e devolve o cabeçalho Cookie
+    da sessão. ValueError se o servidor não aceitar as credenciais.
+    """
+    base = urlsplit(base_url)
+    conexao = http.client.HTTPConnection(base.hostname, base.port or 80, timeout=timeout)
+    try:
+        conexao.request('GET', caminho_login)
+        resposta = conexao.getresponse()
+        resposta.read()
+        cookies = SimpleCookie()
+        for valor in resposta.headers.get_all('Set-Cookie') or []:
+            cookies.load(valor)
+        csrf = cookies['csrftoken'].value if 'csrftoken' in cookies else ''
+
+        corpo = urlencode({'username': usuario, 'password': senha, 'csrfmiddlewaretoken': csrf})
+        conexao.request('POST', caminho_login, body=corpo, headers={
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Cookie': _cabecalho_cookie({nome: morsel.value for nome, morsel in cookies.items()}),
+            'Referer': f'{base_url.rstrip("/")}{caminho_login}',
+        })
+        resposta = conexao.getresponse()
+        resposta.read()
+        for valor in resposta.headers.get_all('Set-Cookie') or []:
+            cookies.load(valor)
+    finally:
+        conexao.close()
+
+    # Login aceito redireciona; o formulário com erro volta com 200
+    if resposta.status != 302:
+        raise ValueError(f'Login recusado para "{usuario}" (HTTP {resposta.status})')
+    return _cabecalho_cookie({nome: morsel.value for nome, morsel in cookies.items()})
+
+
+def entrar_local(caminho_login, usuario, senha):
+    """`entrar` pelo Client de teste, para a carga no próprio processo"""
+    from django.test import Client
+
+    client = Client()
+    response = client.post(caminho_login, {'username': usuario, 'password': senha})
+    if response.status_code != 302:
+        raise ValueError(f'Login recusado para "{usuario}" (HTTP {response.status_code})')
+    return _cabecalho_cookie({nome: morsel.value for nome, morsel in client.cookies.items()})
+
+
+def aguardar_servidor(base_url, caminho='/', tentativas=50, intervalo=0.2):
+    """Espera o servidor aceitar conexões; False se não subir a tempo"""
+    base = urlsplit(base_url)
+    for _ in range(tentativas):
+        try:
+            _requisitar(base, caminho, {}, timeout=2)
+            return True
+        except OSError:
+            time.sleep(intervalo)
+    return False
@@ -0,0 +1,200 @@
+"""
+Cadastro de clientes derivado de Venda.cliente e seus totais acumulados.
+
+Cada vendedor tem um Cliente por nome normalizado (sem acentos, caixa e
+espaços repetidos), criado na primeira venda. Os totais (gasto, compras,
+última compra) acompanham cada escrita em Venda: os sinais cuidam de
+save/delete e VendaQuerySet dos caminhos em lote, sempre na transação de
+quem grava a venda.
+"""
+import unicodedata
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import autocomplete
+from .models import Cliente, Venda
+
+
+# Campos de Venda que mudam o cliente ou os totais dele
+CAMPOS_VENDA_CLIENTE = {'cliente', 'valor', 'data_venda'}
+
+# Clientes recalculados por consulta
+LOTE_RECALCULO = 500
+
+# A normalização pode alongar o nome ('ß' vira 'ss'): a chave é cortada no tamanho da coluna
+TAMANHO_CHAVE = Cliente._meta.get_field('chave').max_length
+
+
+def normalizar_nome(nome):
+    """Chave do cliente: sem acentos, em caixa única e com espaços simples"""
+    decomposto = unicodedata.normalize('NFKD', nome or '')
+    sem_acentos = ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+    return ' '.join(sem_acentos.casefold().split())[:TAMANHO_CHAVE].rstrip()
+
+
+# =============================================================================
+# ESCRITA INCREMENTAL
+# =============================================================================
+
+def registrar_venda(venda):
+    """Liga uma venda nova ao cliente (criando-o) e soma a venda aos totais; antes de venda.save()"""
+    chave = normalizar_nome(venda.cliente)
+    filtro = Cliente.objects.filter(usuario_id=venda.usuario_id, chave=chave)
+    cliente_id = filtro.values_list('id', flat=True).first()
+
+    if cliente_id is None:
+        try:
+            with transaction.atomic():
+                cliente = Cliente.objects.create(
+                    usuario_id=venda.usuario_id, chave=chave, nome=venda.cliente.strip(),
+                    total_gasto=venda.valor, quantidade_compras=1, ultima_compra=venda.data_venda,
+                )
+            autocomplete.invalidar_usuario(venda.usuario_id)
+            venda.cliente_cadastro_id = cliente.id
+            return
+        except IntegrityError:
+            # Outra requisição criou o cliente entre o SELECT e o INSERT
+            cliente_id = filtro.values_list('id', flat=True).get()
+
+    Cliente.objects.filter(id=cliente_id).update(
+        total_gasto=F('total_gasto') + venda.valor,
+        quantidade_compras=F('quantidade_compras') + 1,
+        ultima_compra=Greatest(Coalesce('ultima_compra', Value(venda.data_venda)), Value(venda.data_venda)),
+    )
+    venda.cliente_cadastro_id = cliente_id
+
+
+def vincular(usuario_id, vendas):
+    """
+    Liga vendas ainda não salvas do usuário aos clientes, criando os que faltam.
+
+    Duas ou três consultas para o lote inteiro. Os totais não são alterados:
+    depois de gravar as vendas, chame recalcular() com os ids devolvidos.
+    """
+    nomes = {}
+    for venda in vendas:
+        nomes.setdefault(normalizar_nome(venda.cliente), venda.cliente.strip())
+    if not nomes:
+        return set()
+
+    ids = dict(
+        Cliente.objects.filter(usuario_id=usuario_id, chave__in=nomes).values_list('chave', 'id')
+    )
+    faltam = [chave for chave in nomes if chave not in ids]
+    if faltam:
+        # ignore_conflicts: outra transação pode ter criado o mesmo cliente
+        Cliente.objects.bulk_create(
+            [Cliente(usuario_id=usuario_id, chave=chave, nome=nomes[chave]) for chave in faltam],
+            ignore_conflicts=True,
+        )
+        autocomplete.invalidar_usuario(usuario_id)
+        ids.update(Cliente.objects.filter(usuario_id=usuario_id, chave__in=faltam).values_list('chave', 'id'))
+
+    for venda in vendas:
+        venda.cliente_cadastro_id = ids[normalizar_nome(venda.cliente)]
+    return set(ids.values())
+
+
+# =============================================================================
+# RECÁLCULO (CAMINHOS EM LOTE E MANUTENÇÃO)
+# =============================================================================
+
+def _totais_clientes(vendas):
+    return vendas.order_by().values('cliente_cadastro_id').annotate(
+        total=Sum('valor'),
+        quantidade=Count('id'),
+        ultima=Max('data_venda'),
+    )
+
+
+def recalcular(cliente_ids):
+    """Recalcula a partir de Venda os totais dos clientes; os que ficaram sem vendas são removidos"""
+    cliente_ids = sorted(cliente_ids)
+    for inicio in range(0, len(cliente_ids), LOTE_RECALCULO):
+        lote = cliente_ids[inicio:inicio + LOTE_RECALCULO]
+        totais = {
+            linha['cliente_cadastro_id']: linha
+            for linha in _totais_clientes(Venda.objects.filter(cliente_cadastro_id__in=lote))
+        }
+        clientes = list(Cliente.objects.filter(id__in=totais))
+        for cliente in clientes:
+            linha = totais[cliente.id]
+            cliente.total_gasto = linha['total'] or Decimal('0.00')
+            cliente.quantidade_compras = linha['quantidade']
+            cliente.ultima_compra = linha['ultima']
+        Cliente.objects.bulk_update(clientes, ['total_gasto', 'quantidade_compras', 'ultima_compra'])
+        vazios = Cliente.objects.filter(id__in=set(lote) - set(totais))
+        if usuario_ids := set(vazios.values_list('usuario_id', flat=True)):
+            vazios.delete()
+            autocomplete.invalidar_usuarios(usuario_ids)
+
+
+def reconstruir(usuario_ids=None, batch_size=1000):
+    """
+    Liga de novo todas as vendas aos clientes e recalcula os totais.
+
+    Usado quando o nome de vendas muda em lote e pela manutenção
+    (resumo_vendas). Retorna o número de clientes.
+    """
+    vendas = Venda.objects.all()
+    clientes = Cliente.objects.all()
+    if usuario_ids is not None:
+        vendas = vendas.filter(usuario_id__in=usuario_ids)
+        clientes = clientes.filter(usuario_id__in=usuario_ids)
+
+    with transaction.atomic():
+        # Venda por cliente: (usuario, chave) -> [nome da primeira venda, ids das vendas]
+        grupos = {}
+        for venda_id, usuario_id, nome in vendas.order_by('id').values_list('id', 'usuario_id', 'cliente'):
+            grupo = grupos.setdefault((usuario_id, normalizar_nome(nome)), [nome.strip(), []])
+            grupo[1].append(venda_id)
+
+        existentes = {(c.usuario_id, c.chave): c.id for c in clientes.only('id', 'usuario_id', 'chave')}
+        novos = Cliente.objects.bulk_create([
+            Cliente(usuario_id=usuario_id, chave=chave, nome=nome)
+            for (usuario_id, chave), (nome, _) in grupos.items()
+            if (usuario_id, chave) not in existentes
+        ], batch_size=batch_size)
+        autocomplete.invalidar_usuarios(cliente.usuario_id for cliente in novos)
+        existentes = {(c.usuario_id, c.chave): c.id for c in clientes.only('id', 'usuario_id', 'chave')}
+
+        for chave, (_, venda_ids) in grupos.items():
+            for inicio in range(0, len(venda_ids), batch_size):
+                # _base_manager: religar não é alteração da venda (não muda a versão dos dados)
+                Venda._base_manager.filter(id__in=venda_ids[inicio:inicio + batch_size]).exclude(
+                    cliente_cadastro_id=existentes[chave]
+                ).update(cliente_cadastro_id=existentes[chave])
+        recalcular(existentes.values())
+    return clientes.count()
+
+
+def divergencias(usuario_ids=None):
+    """
+    Compara os totais dos clientes com a agregação direta de Venda.
+
+    Retorna uma lista de (cliente_id, esperado, encontrado), com valores
+    (gasto, compras, última compra). Vendas sem cliente aparecem com id None.
+    """
+    vendas = Venda.objects.all()
+    clientes = Cliente.objects.all()
+    if usuario_ids is not None:
+        vendas = vendas.filter(usuario_id__in=usuario_ids)
+        clientes = clientes.filter(usuario_id__in=usuario_ids)
+
+    esperado = {
+        linha['cliente_cadastro_id']: (linha['total'], linha['quantidade'], linha['ultima'])
+        for linha in _totais_clientes(vendas)
+    }
+    encontrado = {
+        cliente.id: (cliente.total_gasto, cliente.quantidade_compras, cliente.ultima_compra)
+        for cliente in clientes
+    }
+
+    return [
+        (chave, esperado.get(chave), encontrado.get(chave))
+        for chave in sorted(esperado.keys() | encontrado.keys(), key=str)
+        if esperado.get(chave) != encontrado.get(chave)
+    ]
@@ -1,6 +1,18 @@
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
+from django.contrib.auth.views import redirect_to_login
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Venda
 
 def admin_required(view_func):
     """Decorator que requer que o usuário seja superusuário"""
@@ -29,4 +41,86 @@ def admin_required_with_message(view_func):
             messages.error(request, '❌ Acesso negado. Apenas administradores podem acessar esta área.')
             return redirect('home')  # ou outra página
         return view_func(request, *args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+def login_required_async(view_func):
+    """login_required para views assíncronas (o do Django 4.2 só aceita views síncronas)"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        # request.user é preguiçoso e consulta sessão/usuário: resolve fora do event loop
+        autenticado = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not autenticado:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _validadores_vendas(request):
+    """
+    (ETag, Last-Modified) da resposta a partir do estado das vendas do usuário.
+
+    Uma consulta (VendaQuerySet.versao). Entram também o perfil do usuário, o
+    dia (períodos relativos a hoje), o cabeçalho de AJAX, o cookie CSRF
+    (token nos formulários da página) e a versão da aplicação. Sem validadores
+    (None) quando há mensagens pendentes: a página precisa exibi-las.
+    """
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None
+
+    usuario = request.user
+    ultima, total = Venda.objects.filter(usuario=usuario).versao()
+    partes = [
+        usuario.pk, usuario.data_atualizacao, ultima, total, timezone.localdate(),
+        request.headers.get('X-Requested-With', ''),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        getattr(settings, 'SALES_VERSAO_APLICACAO', ''),
+    ]
+    etag = f'"{hashlib.md5(repr(partes).encode()).hexdigest()}"'
+    modificado = max(data for data in (ultima, usuario.data_atualizacao) if data is not None)
+    return etag, int(modificado.timestamp())
+
+
+def _aplicar_validadores(response, etag, modificado):
+    if response.status_code in (200, 304):
+        if not response.has_header('ETag'):
+            response['ETag'] = etag
+        if not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(modificado)
+        if not response.has_header('Cache-Control'):
+            # O navegador guarda, mas confirma com o servidor a cada uso
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie', 'X-Requested-With'])
+    return response
+
+
+def condicional_vendas(view_func):
+    """
+    GET condicional para páginas e APIs derivadas das vendas do usuário.
+
+    Se o navegador já tem a versão atual (If-None-Match / If-Modified-Since),
+    responde 304 sem executar a view, portanto sem calcular nenhum agregado.
+    Vai depois do login_required (ou login_required_async).
+    """
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapper_async(request, *args, **kwargs):
+            validadores = await sync_to_async(_validadores_vendas)(request)
+            if validadores is None:
+                return await view_func(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=validadores[0], last_modified=validadores[1])
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+            return _aplicar_validadores(response, *validadores)
+        return wrapper_async
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        validadores = _validadores_vendas(request)
+        if validadores is None:
+            return view_func(request, *args, **kwargs)
+        response = get_conditional_response(request, etag=validadores[0], last_modified=validadores[1])
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+        return _aplicar_validadores(response, *validadores)
+    return wrapper
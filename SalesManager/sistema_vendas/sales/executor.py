@@ -0,0 +1,156 @@
+"""
+Executor compartilhado para consultas concorrentes dentro das views.
+
+Um único pool por processo, com número fixo de threads (e portanto de conexões
+com o banco). Cada tarefa fecha conexões velhas ou quebradas na entrada e na
+saída, com a mesma semântica que o Django aplica ao início e fim de cada
+requisição.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+WORKERS_PADRAO = 4
+FILA_PADRAO = 32
+
+
+class ExecutorBanco:
+    """Pool limitado de threads para trabalho de banco disparado pelas views"""
+
+    def __init__(self, max_workers=WORKERS_PADRAO, max_fila=FILA_PADRAO, sequencial=None):
+        self.max_workers = max_workers
+        self.max_fila = max_fila
+        self._sequencial = sequencial
+        self._pool = None
+        self._vagas = threading.BoundedSemaphore(max_workers + max_fila)
+        self._lock = threading.Lock()
+        self._stats = {
+            'enviadas': 0,
+            'executadas_inline': 0,
+            'concluidas': 0,
+            'falhas': 0,
+            'em_fila': 0,
+            'em_execucao': 0,
+            'espera_total': 0.0,
+            'latencia_total': 0.0,
+            'latencia_max': 0.0,
+        }
+
+    # -------------------------------------------------------------------------
+    # Decisão de execução
+    # -------------------------------------------------------------------------
+
+    def sequencial(self):
+        """
+        Indica se as tarefas devem rodar na própria thread da requisição.
+
+        No SQLite as threads só disputariam o mesmo lock de escrita (e no banco
+        de testes em memória nem enxergam os dados); dentro de uma transação
+        outra conexão não veria as escritas ainda não commitadas.
+        """
+        if self._sequencial is not None:
+            return self._sequencial
+        return connection.vendor == 'sqlite' or connection.in_atomic_block
+
+    def _obter_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sales-db')
+            return self._pool
+
+    # -------------------------------------------------------------------------
+    # Execução
+    # -------------------------------------------------------------------------
+
+    def _registrar(self, **deltas):
+        with self._lock:
+            for nome, valor in deltas.items():
+                self._stats[nome] += valor
+            if 'latencia_total' in deltas:
+                self._stats['latencia_max'] = max(self._stats['latencia_max'], deltas['latencia_total'])
+
+    def _executar_inline(self, fn, args, kwargs):
+        futuro = Future()
+        inicio = time.perf_counter()
+        try:
+            futuro.set_result(fn(*args, **kwargs))
+            self._registrar(executadas_inline=1, concluidas=1, latencia_total=time.perf_counter() - inicio)
+        except Exception as erro:
+            futuro.set_exception(erro)
+            self._registrar(executadas_inline=1, falhas=1, latencia_total=time.perf_counter() - inicio)
+        return futuro
+
+    def _tarefa(self, fn, args, kwargs, enfileirada_em):
+        inicio = time.perf_counter()
+        self._registrar(em_fila=-1, em_execucao=1, espera_total=inicio - enfileirada_em)
+        close_old_connections()
+        try:
+            resultado = fn(*args, **kwargs)
+            self._registrar(concluidas=1)
+            return resultado
+        except Exception:
+            self._registrar(falhas=1)
+            raise
+        finally:
+            close_old_connections()
+            self._vagas.release()
+            self._registrar(em_execucao=-1, latencia_total=time.perf_counter() - inicio)
+
+    def submit(self, fn, *args, **kwargs):
+        """Agenda `fn`; com o pool cheio (ou em modo sequencial) executa na hora"""
+        self._registrar(enviadas=1)
+
+        if self.sequencial() or not self._vagas.acquire(blocking=False):
+            return self._executar_inline(fn, args, kwargs)
+
+        self._registrar(em_fila=1)
+        try:
+            # No contexto de quem enviou: a tarefa conta nas métricas da requisição (middleware)
+            contexto = contextvars.copy_context()
+            return self._obter_pool().submit(contexto.run, self._tarefa, fn, args, kwargs, time.perf_counter())
+        except RuntimeError:
+            # Pool encerrado (desligamento do processo)
+            self._vagas.release()
+            self._registrar(em_fila=-1)
+            return self._executar_inline(fn, args, kwargs)
+
+    def estatisticas(self):
+        """Profundidade da fila, tarefas em execução e latências médias (em ms)"""
+        with self._lock:
+            dados = dict(self._stats)
+        finalizadas = dados['concluidas'] + dados['falhas']
+        enfileiradas = dados['enviadas'] - dados['executadas_inline']
+        dados['latencia_media_ms'] = 1000 * dados['latencia_total'] / finalizadas if finalizadas else 0.0
+        dados['espera_media_ms'] = 1000 * dados['espera_total'] / enfileiradas if enfileiradas else 0.0
+        dados['latencia_max_ms'] = 1000 * dados.pop('latencia_max')
+        dados['max_workers'] = self.max_workers
+        dados['max_fila'] = self.max_fila
+        return dados
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor_banco():
+    """Executor único do processo, configurado por SALES_DB_EXECUTOR_WORKERS/_FILA"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ExecutorBanco(
+                    max_workers=getattr(settings, 'SALES_DB_EXECUTOR_WORKERS', WORKERS_PADRAO),
+                    max_fila=getattr(settings, 'SALES_DB_EXECUTOR_FILA', FILA_PADRAO),
+                )
+    return _executor
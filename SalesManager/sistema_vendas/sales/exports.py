@@ -0,0 +1,111 @@
+"""Exportações CSV em streaming, com memória constante independente do volume."""
+import csv
+import itertools
+import logging
+import zlib
+
+from django.http import StreamingHttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+# Linhas buscadas por ida ao banco e linhas agrupadas por bloco enviado ao cliente
+CHUNK_SIZE = 2000
+LINHAS_POR_BLOCO = 500
+
+CAMPOS_VENDA = ('data_venda', 'cliente', 'quantidade', 'valor', 'baixada', 'data_baixa')
+CABECALHO_VENDA = ['Data Venda', 'Cliente', 'Quantidade', 'Valor', 'Status', 'Data Baixa']
+# Última linha de um arquivo cujo streaming falhou (o status 200 já foi enviado)
+LINHA_ERRO = ['ERRO', 'Exportação interrompida, gere o arquivo novamente']
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de gravá-la"""
+
+    def write(self, valor):
+        return valor
+
+
+def formatar_linha_venda(data_venda, cliente, quantidade, valor, baixada, data_baixa):
+    """Linha de venda no formato das exportações (valores de CAMPOS_VENDA, nessa ordem)"""
+    return [
+        data_venda.strftime('%d/%m/%Y') if data_venda else '',
+        cliente,
+        quantidade,
+        str(valor).replace('.', ','),
+        'Baixada' if baixada else 'Ativa',
+        data_baixa.strftime('%d/%m/%Y') if data_baixa else ''
+    ]
+
+
+def valores_venda(vendas):
+    """
+    Valores de CAMPOS_VENDA das vendas, com o primeiro bloco já buscado.
+
+    Chamada na view, antes de montar a resposta: um erro na consulta ainda
+    vira a resposta de erro da view, e não um CSV cortado com status 200.
+    """
+    iterador = vendas.values_list(*CAMPOS_VENDA).iterator(chunk_size=CHUNK_SIZE)
+    primeira = next(iterador, None)
+    if primeira is None:
+        return iter(())
+    return itertools.chain([primeira], iterador)
+
+
+def linhas_venda(vendas):
+    """Itera as vendas do queryset já formatadas, sem instanciar modelos"""
+    for campos in vendas.values_list(*CAMPOS_VENDA).iterator(chunk_size=CHUNK_SIZE):
+        yield formatar_linha_venda(*campos)
+
+
+def _linhas_protegidas(linhas, nome_arquivo):
+    """Repassa as linhas; um erro no meio do streaming é registrado e fecha o arquivo com LINHA_ERRO"""
+    try:
+        yield from linhas
+    except Exception:
+        logger.error(f'Erro durante o streaming de {nome_arquivo}', exc_info=True)
+        yield []
+        yield LINHA_ERRO
+
+
+def gerar_csv(linhas, delimiter=';'):
+    """Converte um iterável de linhas em blocos de texto CSV"""
+    writer = csv.writer(_Eco(), delimiter=delimiter)
+    bloco = []
+    for linha in linhas:
+        bloco.append(writer.writerow(linha))
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def comprimir_gzip(blocos, encoding='utf-8'):
+    """Comprime os blocos de texto em um único stream gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for bloco in blocos:
+        dados = compressor.compress(bloco.encode(encoding))
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def resposta_csv(linhas, nome_arquivo, compactar=False):
+    """StreamingHttpResponse com o CSV das linhas, opcionalmente como .csv.gz"""
+    blocos = gerar_csv(_linhas_protegidas(linhas, nome_arquivo))
+
+    if compactar:
+        response = StreamingHttpResponse(comprimir_gzip(blocos), content_type='application/gzip')
+        nome_arquivo = f'{nome_arquivo}.gz'
+    else:
+        response = StreamingHttpResponse(blocos, content_type='text/csv')
+
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
+
+
+def quer_compactado(request):
+    """Lê o parâmetro ?compactar=1 das URLs de exportação"""
+    return request.GET.get('compactar', '').lower() in ('1', 'true', 'sim', 'gz', 'gzip')
@@ -0,0 +1,158 @@
+"""
+Fila de tarefas em banco, sem serviços externos.
+
+As views enfileiram uma Tarefa e respondem na hora; o comando `runworker`
+reserva as pendentes com um UPDATE condicional (dois workers nunca pegam a
+mesma), executa o handler registrado para o tipo e, em caso de erro,
+reagenda com backoff exponencial até esgotar as tentativas.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarefa
+
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 30          # segundos antes da 2ª tentativa
+BACKOFF_MAXIMO = 60 * 60   # teto do intervalo entre tentativas
+CANDIDATAS_POR_RESERVA = 10
+
+_handlers = {}
+
+
+# =============================================================================
+# REGISTRO E ENFILEIRAMENTO
+# =============================================================================
+
+def tarefa(tipo):
+    """Decorator que registra a função como handler do `tipo`; recebe os parâmetros como kwargs"""
+    def registrar(funcao):
+        _handlers[tipo] = funcao
+        return funcao
+    return registrar
+
+
+def enfileirar(tipo, parametros=None, usuario=None, executar_em=None, max_tentativas=5):
+    """
+    Cria a tarefa pendente. Dentro de uma transação ela só fica visível ao
+    worker após o commit, junto com os dados que a originaram.
+    """
+    if tipo not in _handlers:
+        raise ValueError(f"Tipo de tarefa não registrado: {tipo}")
+    return Tarefa.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        usuario=usuario,
+        executar_em=executar_em or timezone.now(),
+        max_tentativas=max_tentativas,
+    )
+
+
+def identificador_worker():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def backoff(tentativas):
+    """Espera antes da próxima tentativa: exponencial, com teto e até 10% de variação"""
+    espera = min(BACKOFF_BASE * 2 ** max(tentativas - 1, 0), BACKOFF_MAXIMO)
+    return timedelta(seconds=espera * random.uniform(1.0, 1.1))
+
+
+# =============================================================================
+# EXECUÇÃO
+# =============================================================================
+
+def reservar(worker=None):
+    """Marca a próxima tarefa pendente como em execução por este worker (ou None)"""
+    worker = worker or identificador_worker()
+    agora = timezone.now()
+    candidatas = list(
+        Tarefa.objects.filter(status=Tarefa.PENDENTE, executar_em__lte=agora)
+        .order_by('executar_em', 'id')
+        .values_list('id', flat=True)[:CANDIDATAS_POR_RESERVA]
+    )
+    for tarefa_id in candidatas:
+        # Só um worker consegue mudar o status de pendente para executando
+        reservada = Tarefa.objects.filter(id=tarefa_id, status=Tarefa.PENDENTE).update(
+            status=Tarefa.EXECUTANDO,
+            tentativas=F('tentativas') + 1,
+            iniciada_em=agora,
+            worker=worker,
+            data_atualizacao=agora,
+        )
+        if reservada:
+            return Tarefa.objects.get(id=tarefa_id)
+    return None
+
+
+def executar(tarefa):
+    """Roda o handler e registra conclusão, novo agendamento ou falha definitiva"""
+    handler = _handlers.get(tarefa.tipo)
+    try:
+        if handler is None:
+            raise LookupError(f"Tipo de tarefa não registrado: {tarefa.tipo}")
+        with transaction.atomic():
+            resultado = handler(**tarefa.parametros)
+    except Exception:
+        tarefa.erro = traceback.format_exc()
+        if tarefa.tentativas < tarefa.max_tentativas and handler is not None:
+            tarefa.status = Tarefa.PENDENTE
+            tarefa.executar_em = timezone.now() + backoff(tarefa.tentativas)
+            logger.warning(f'Tarefa {tarefa} falhou (tentativa {tarefa.tentativas}); nova tentativa em {tarefa.executar_em}')
+        else:
+            tarefa.status = Tarefa.FALHOU
+            tarefa.concluida_em = timezone.now()
+            logger.error(f'Tarefa {tarefa} falhou definitivamente após {tarefa.tentativas} tentativa(s)')
+    else:
+        tarefa.status = Tarefa.CONCLUIDA
+        tarefa.resultado = resultado
+        tarefa.erro = ''
+        tarefa.concluida_em = timezone.now()
+
+    tarefa.save(update_fields=['status', 'resultado', 'erro', 'executar_em', 'concluida_em', 'data_atualizacao'])
+    return tarefa
+
+
+def processar_pendentes(worker=None, limite=None):
+    """Executa tarefas até a fila esvaziar (ou `limite`). Devolve quantas foram executadas."""
+    executadas = 0
+    while limite is None or executadas < limite:
+        tarefa_reservada = reservar(worker)
+        if tarefa_reservada is None:
+            break
+        executar(tarefa_reservada)
+        executadas += 1
+    return executadas
+
+
+def recuperar_travadas(timeout=timedelta(minutes=10)):
+    """Devolve à fila tarefas presas em execução (worker morto no meio)"""
+    limite = timezone.now() - timeout
+    return Tarefa.objects.filter(status=Tarefa.EXECUTANDO, iniciada_em__lt=limite).update(
+        status=Tarefa.PENDENTE, executar_em=timezone.now(), data_atualizacao=timezone.now()
+    )
+
+
+def status_tarefa(tarefa):
+    """Representação da tarefa para a API de status"""
+    return {
+        'id': tarefa.id,
+        'tipo': tarefa.tipo,
+        'status': tarefa.status,
+        'tentativas': tarefa.tentativas,
+        'max_tentativas': tarefa.max_tentativas,
+        'executar_em': tarefa.executar_em.isoformat(),
+        'concluida_em': tarefa.concluida_em.isoformat() if tarefa.concluida_em else None,
+        'resultado': tarefa.resultado,
+        # Só a última linha do traceback: o resto fica no admin/log
+        'erro': tarefa.erro.strip().splitlines()[-1] if tarefa.erro.strip() else None,
+    }
@@ -0,0 +1,76 @@
+"""Filtros da lista de vendas, compartilhados entre a página, a exportação e as APIs."""
+from datetime import datetime
+
+from .busca import filtrar_por_cliente
+from .models import Venda
+
+
+# Ordenações aceitas na lista. Toda ordenação termina em '-id' para que a
+# paginação por cursor tenha uma chave única e estável.
+ORDENACAO_MAP = {
+    'data_venda': ['data_venda', '-id'],
+    '-data_venda': ['-data_venda', '-id'],
+    'cliente': ['cliente', '-data_venda', '-id'],
+    '-cliente': ['-cliente', '-data_venda', '-id'],
+    'valor': ['valor', '-data_venda', '-id'],
+    '-valor': ['-valor', '-data_venda', '-id'],
+}
+ORDENACAO_PADRAO = '-data_venda'
+
+# Status da lista -> status equivalente do resumo diário
+STATUS_RESUMO = {'ativas': 'pendentes', 'baixadas': 'concluidas', 'todas': 'todos'}
+
+
+def data_filtro(valor):
+    """Converte 'AAAA-MM-DD' vindo da URL em date, ou None se vazio/inválido"""
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parametros_lista(dados):
+    """Extrai os filtros da lista de um QueryDict (GET ou POST)"""
+    return {
+        'busca': dados.get('busca', ''),
+        'status': dados.get('status', 'ativas'),
+        'cliente': dados.get('cliente', ''),
+        'data_inicio': dados.get('data_inicio', ''),
+        'data_fim': dados.get('data_fim', ''),
+        'ordenar_por': dados.get('ordenar_por', ORDENACAO_PADRAO),
+    }
+
+
+def filtrar_vendas(usuario, parametros):
+    """Vendas do usuário com os filtros da lista aplicados (sem ordenação)"""
+    vendas = Venda.objects.filter(usuario=usuario)
+
+    if parametros['busca']:
+        vendas = filtrar_por_cliente(vendas, usuario.id, parametros['busca'])
+
+    if parametros['status'] == 'baixadas':
+        vendas = vendas.filter(baixada=True)
+    elif parametros['status'] == 'ativas':
+        vendas = vendas.filter(baixada=False)
+
+    if parametros['cliente']:
+        vendas = filtrar_por_cliente(vendas, usuario.id, parametros['cliente'])
+
+    data_inicio = data_filtro(parametros['data_inicio'])
+    if data_inicio:
+        vendas = vendas.filter(data_venda__gte=data_inicio)
+
+    data_fim = data_filtro(parametros['data_fim'])
+    if data_fim:
+        vendas = vendas.filter(data_venda__lte=data_fim)
+
+    return vendas
+
+
+def campos_ordenacao(ordenar_por):
+    return ORDENACAO_MAP.get(ordenar_por, ORDENACAO_MAP[ORDENACAO_PADRAO])
+
+
+def filtro_textual(parametros):
+    """Indica se há filtro por nome de cliente (o resumo diário não cobre esse caso)"""
+    return bool(parametros['busca'] or parametros['cliente'])
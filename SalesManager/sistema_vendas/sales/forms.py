@@ -170,7 +170,10 @@ class VendaForm(forms.ModelForm):
             'cliente': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Digite o nome do cliente',
-                'autofocus': True
+                'autofocus': True,
+                # Sugestões de /api/clientes/autocomplete/ (cadastro_venda.html)
+                'list': 'clientes-sugestoes',
+                'autocomplete': 'off'
             }),
             'quantidade': forms.NumberInput(attrs={
                 'class': 'form-control',
@@ -0,0 +1,219 @@
+"""
+Importação de vendas a partir do CSV no mesmo formato da exportação.
+
+O arquivo é lido e validado linha a linha (regras do VendaForm), e as vendas
+válidas são gravadas com bulk_create em lotes, numa única transação. O
+resultado traz o número da linha e as mensagens de cada linha rejeitada.
+"""
+import csv
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import resumo
+from .exports import CABECALHO_VENDA, CAMPOS_VENDA
+from .forms import VendaForm
+from .models import Venda
+
+
+BATCH_SIZE_PADRAO = 1000
+
+# Cabeçalho da exportação -> campo de Venda
+COLUNAS = {nome.lower(): campo for nome, campo in zip(CABECALHO_VENDA, CAMPOS_VENDA)}
+COLUNAS_OBRIGATORIAS = ('data_venda', 'cliente', 'quantidade', 'valor')
+
+STATUS_BAIXADA = {'baixada': True, 'ativa': False, '': False}
+
+
+class ErroImportacao(Exception):
+    """Arquivo que não pode ser importado (cabeçalho ausente ou incompleto)"""
+
+
+class ResultadoImportacao:
+    """Contagem das linhas processadas e erros por linha"""
+
+    def __init__(self):
+        self.total_linhas = 0
+        self.importadas = 0
+        self.erros = []
+
+    @property
+    def validas(self):
+        return self.total_linhas - len(self.erros)
+
+    def como_dict(self, limite_erros=None):
+        erros = self.erros if limite_erros is None else self.erros[:limite_erros]
+        return {
+            'total_linhas': self.total_linhas,
+            'validas': self.validas,
+            'importadas': self.importadas,
+            'total_erros': len(self.erros),
+            'erros': erros,
+        }
+
+
+# =============================================================================
+# LEITURA E VALIDAÇÃO
+# =============================================================================
+
+def _data(valor):
+    """dd/mm/aaaa (formato da exportação) ou aaaa-mm-dd; ValueError se inválida"""
+    partes = valor.split('/')
+    if len(partes) == 3:
+        dia, mes, ano = partes
+        return date(int(ano), int(mes), int(dia))
+    return date.fromisoformat(valor)
+
+
+def _mapear_colunas(cabecalho):
+    indices = {}
+    for indice, nome in enumerate(cabecalho):
+        campo = COLUNAS.get(nome.strip().lower())
+        if campo:
+            indices[campo] = indice
+
+    faltando = [campo for campo in COLUNAS_OBRIGATORIAS if campo not in indices]
+    if faltando:
+        nomes = [nome for nome, campo in zip(CABECALHO_VENDA, CAMPOS_VENDA) if campo in faltando]
+        raise ErroImportacao(f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(nomes)}")
+    return indices
+
+
+class ValidadorVenda:
+    """
+    Aplica as regras do VendaForm a cada linha sem instanciar um formulário por linha.
+
+    Usa os campos de um único VendaForm, seus métodos clean_<campo> e os
+    validadores dos campos do modelo (o que o _post_clean do ModelForm faria).
+    Montar um formulário por linha custava mais que todo o resto da importação.
+    """
+
+    def __init__(self):
+        self.form = VendaForm()
+        self.campos = [
+            (nome, campo, getattr(self.form, f'clean_{nome}', None), Venda._meta.get_field(nome))
+            for nome, campo in self.form.fields.items()
+        ]
+
+    def validar(self, dados):
+        """Devolve (dados limpos, {campo: [mensagens]})"""
+        form = self.form
+        form.cleaned_data = {}
+        erros = {}
+        for nome, campo, metodo_clean, campo_modelo in self.campos:
+            try:
+                valor = campo.clean(dados.get(nome))
+                form.cleaned_data[nome] = valor
+                if metodo_clean:
+                    valor = form.cleaned_data[nome] = metodo_clean()
+                campo_modelo.run_validators(valor)
+            except ValidationError as erro:
+                form.cleaned_data.pop(nome, None)
+                erros[nome] = list(erro.messages)
+        return dict(form.cleaned_data), erros
+
+
+def _validar_linha(linha, indices, validador):
+    """Devolve (Venda não salva, None) ou (None, {campo: [mensagens]})"""
+    valores = {campo: (linha[indice].strip() if indice < len(linha) else '') for campo, indice in indices.items()}
+    valor = valores['valor']
+
+    dados = {
+        'cliente': valores['cliente'],
+        'quantidade': valores['quantidade'],
+        # Exportação usa vírgula decimal
+        'valor': valor.replace('.', '').replace(',', '.') if ',' in valor else valor,
+        'data_venda': valores['data_venda'],
+    }
+    erros_data = {}
+
+    if dados['data_venda']:
+        try:
+            dados['data_venda'] = _data(dados['data_venda'])
+        except ValueError:
+            erros_data['data_venda'] = ['Data inválida (use dd/mm/aaaa).']
+
+    limpos, erros = validador.validar(dados)
+    erros.update(erros_data)
+
+    status = valores.get('baixada', '').lower()
+    if status not in STATUS_BAIXADA:
+        erros['baixada'] = ['Status inválido (use Ativa ou Baixada).']
+
+    data_baixa = None
+    if valores.get('data_baixa'):
+        try:
+            data_baixa = _data(valores['data_baixa'])
+        except ValueError:
+            erros['data_baixa'] = ['Data inválida (use dd/mm/aaaa).']
+
+    if erros:
+        return None, erros
+
+    return Venda(**limpos, baixada=STATUS_BAIXADA[status], data_baixa=data_baixa), None
+
+
+def validar_csv(arquivo, delimiter=';'):
+    """
+    Itera (número da linha, venda, erros) de um arquivo CSV em modo texto.
+
+    O cabeçalho deve ter ao menos as colunas obrigatórias da exportação, em
+    qualquer ordem. Linhas em branco são ignoradas.
+    """
+    leitor = csv.reader(arquivo, delimiter=delimiter)
+    cabecalho = next(leitor, None)
+    if not cabecalho:
+        raise ErroImportacao('Arquivo vazio.')
+    indices = _mapear_colunas(cabecalho)
+    validador = ValidadorVenda()
+
+    for linha in leitor:
+        if not any(campo.strip() for campo in linha):
+            continue
+        venda, erros = _validar_linha(linha, indices, validador)
+        yield leitor.line_num, venda, erros
+
+
+# =============================================================================
+# IMPORTAÇÃO
+# =============================================================================
+
+def importar_vendas(usuario, arquivo, batch_size=BATCH_SIZE_PADRAO, apenas_validar=False):
+    """
+    Valida o CSV e grava as vendas válidas do usuário em lotes de `batch_size`.
+
+    Tudo roda em uma transação: se o banco falhar no meio, nada é importado.
+    Com `apenas_validar`, só o relatório de erros é produzido.
+    """
+    resultado = ResultadoImportacao()
+    datas = set()
+    lote = []
+
+    def gravar_lote():
+        Venda.objects.bulk_create(lote, batch_size=batch_size, atualizar_resumo=False)
+        resultado.importadas += len(lote)
+        lote.clear()
+
+    with transaction.atomic():
+        for numero_linha, venda, erros in validar_csv(arquivo):
+            resultado.total_linhas += 1
+            if erros:
+                resultado.erros.append({'linha': numero_linha, 'erros': erros})
+                continue
+            if apenas_validar:
+                continue
+
+            venda.usuario = usuario
+            lote.append(venda)
+            datas.add(venda.data_venda)
+            if len(lote) >= batch_size:
+                gravar_lote()
+
+        if lote:
+            gravar_lote()
+
+        # Uma consulta agrupada para os dias afetados, no fim, em vez de uma por bloco
+        resumo.recalcular_dias(usuario.id, datas)
+
+    return resultado
@@ -0,0 +1,210 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from sales.carga import aguardar_servidor, executar_carga
+from sales.models import UsuarioCustomizado, Venda
+
+
+USUARIO_BENCHMARK = 'benchmark'
+CLIENTES = [f'Cliente {i:02d}' for i in range(50)]
+
+# Sem collectstatic não há manifest do whitenoise
+STORAGE_SEM_MANIFEST = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+
+class _ServidorWSGI(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _HandlerSilencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara requisições por segundo e latência p99 do dashboard/relatório sob uvicorn (views '
+        'assíncronas) e sob WSGI (views síncronas), com os mesmos dados. Popula o banco configurado: '
+        'use DATABASE_URL para apontar para um banco descartável. O servidor ASGI precisa do '
+        'uvicorn (pip install -r requirements-dev.txt).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servidores', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--requisicoes', type=int, default=400)
+        parser.add_argument('--concorrencia', type=int, default=20)
+        parser.add_argument('--aquecimento', type=int, default=20)
+        parser.add_argument('--vendas', type=int, default=5000, help='Vendas do usuário de benchmark')
+        parser.add_argument('--porta', type=int, default=8765)
+        parser.add_argument(
+            '--com-cache',
+            action='store_true',
+            help='Mantém o cache de métricas (por padrão ele é desligado para medir as consultas)'
+        )
+        # Uso interno: processos dos servidores comparados
+        parser.add_argument('--servir-wsgi', type=int, help=argparse.SUPPRESS)
+        parser.add_argument('--servir-asgi', type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['servir_wsgi']:
+            self.servir_wsgi(options['servir_wsgi'])
+            return
+        if options['servir_asgi']:
+            self.servir_asgi(options['servir_asgi'])
+            return
+
+        if 'asgi' in options['servidores']:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('uvicorn não está instalado (pip install -r requirements-dev.txt).')
+
+        usuario = self.popular(options['vendas'])
+        cookie = self.criar_sessao(usuario)
+        rotas = [
+            ('dashboard', reverse('sales:dashboard'), {}),
+            ('relatorio', f"{reverse('sales:relatorio_vendas')}?periodo=ano", {}),
+            ('relatorio_ajax', f"{reverse('sales:relatorio_vendas')}?periodo=45_dias",
+             {'X-Requested-With': 'XMLHttpRequest'}),
+            ('cliente_compras', f"{reverse('sales:cliente_compras_api')}?cliente=Cliente%2001", {}),
+        ]
+
+        resultados = {}
+        for servidor in options['servidores']:
+            resultados[servidor] = self.medir(servidor, rotas, cookie, options)
+
+        self.imprimir(resultados)
+
+    # -------------------------------------------------------------------------
+    # Preparação
+    # -------------------------------------------------------------------------
+
+    def popular(self, quantidade):
+        usuario, criado = UsuarioCustomizado.objects.get_or_create(
+            username=USUARIO_BENCHMARK, defaults={'email': 'benchmark@exemplo.com'}
+        )
+        if criado:
+            # Só entra pela sessão criada abaixo
+            usuario.set_unusable_password()
+            usuario.save(update_fields=['password'])
+
+        faltam = quantidade - Venda.objects.filter(usuario=usuario).count()
+        if faltam > 0:
+            aleatorio = random.Random(42)
+            hoje = timezone.now().date()
+            Venda.objects.bulk_create([
+                Venda(
+                    cliente=aleatorio.choice(CLIENTES),
+                    quantidade=aleatorio.randint(1, 10),
+                    valor=Decimal(aleatorio.randint(500, 50000)) / 100,
+                    data_venda=hoje - timedelta(days=aleatorio.randint(0, 400)),
+                    baixada=aleatorio.random() < 0.5,
+                    usuario=usuario,
+                )
+                for _ in range(faltam)
+            ], batch_size=1000)
+            self.stdout.write(f'{faltam} venda(s) criadas para o usuário "{USUARIO_BENCHMARK}".')
+        return usuario
+
+    def criar_sessao(self, usuario):
+        sessao = import_module(settings.SESSION_ENGINE).SessionStore()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao.create()
+        return f'{settings.SESSION_COOKIE_NAME}={sessao.session_key}'
+
+    # -------------------------------------------------------------------------
+    # Servidores
+    # -------------------------------------------------------------------------
+
+    def servir_wsgi(self, porta):
+        """Servidor WSGI com uma thread por requisição (biblioteca padrão)"""
+        with override_settings(STATICFILES_STORAGE=STORAGE_SEM_MANIFEST):
+            servidor = make_server('127.0.0.1', porta, get_wsgi_application(), _ServidorWSGI, _HandlerSilencioso)
+            servidor.serve_forever()
+
+    def servir_asgi(self, porta):
+        """uvicorn com as views assíncronas"""
+        import uvicorn
+
+        with override_settings(STATICFILES_STORAGE=STORAGE_SEM_MANIFEST):
+            uvicorn.run(
+                get_asgi_application(), host='127.0.0.1', port=porta,
+                log_level='warning', access_log=False,
+            )
+
+    def iniciar(self, servidor, porta, com_cache):
+        ambiente = {
+            **os.environ,
+            'SALES_ASYNC_VIEWS': 'True' if servidor == 'asgi' else 'False',
+        }
+        if not com_cache:
+            ambiente['METRICAS_CACHE_TIMEOUT'] = '0'
+
+        comando = [sys.executable, 'manage.py', 'benchmark_asgi', f'--servir-{servidor}', str(porta)]
+
+        return subprocess.Popen(comando, cwd=settings.BASE_DIR, env=ambiente)
+
+    def medir(self, servidor, rotas, cookie, options):
+        porta = options['porta']
+        base_url = f'http://127.0.0.1:{porta}'
+        processo = self.iniciar(servidor, porta, options['com_cache'])
+        try:
+            if not aguardar_servidor(base_url):
+                raise CommandError(f'O servidor {servidor} não respondeu na porta {porta}.')
+
+            cabecalhos = {'Cookie': cookie}
+            if options['aquecimento']:
+                executar_carga(base_url, rotas, options['aquecimento'], options['concorrencia'], cabecalhos)
+
+            self.stdout.write(f'Medindo {servidor}...')
+            return executar_carga(
+                base_url, rotas, options['requisicoes'], options['concorrencia'], cabecalhos
+            )
+        finally:
+            processo.terminate()
+            processo.wait(timeout=10)
+
+    # -------------------------------------------------------------------------
+    # Saída
+    # -------------------------------------------------------------------------
+
+    def imprimir(self, resultados):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'servidor':<9}{'rota':<18}{'req':>6}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+        )
+        for servidor, resultado in resultados.items():
+            linhas = [*resultado['rotas'].items(), ('TOTAL', resultado['geral'])]
+            for rota, dados in linhas:
+                self.stdout.write(
+                    f"{servidor:<9}{rota:<18}{dados['requisicoes']:>6}{dados['erros']:>7}"
+                    f"{dados['rps']:>9.1f}{dados['p50_ms']:>9.1f}{dados['p99_ms']:>9.1f}"
+                )
+
+        if {'wsgi', 'asgi'} <= set(resultados):
+            wsgi, asgi = resultados['wsgi']['geral'], resultados['asgi']['geral']
+            if wsgi['rps'] and wsgi['p99_ms']:
+                self.stdout.write('')
+                self.stdout.write(self.style.SUCCESS(
+                    f"ASGI/WSGI: {asgi['rps'] / wsgi['rps']:.2f}x req/s, "
+                    f"{asgi['p99_ms'] / wsgi['p99_ms']:.2f}x p99"
+                ))
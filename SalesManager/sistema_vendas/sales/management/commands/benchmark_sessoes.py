@@ -0,0 +1,90 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sales.models import UsuarioCustomizado
+
+
+USUARIO_BENCHMARK = 'benchmark'
+
+# Configuração anterior: sessão no banco gravada a cada requisição
+ANTES = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'SESSION_SAVE_EVERY_REQUEST': True,
+    'MIDDLEWARE': [m for m in settings.MIDDLEWARE if m != 'sales.middleware.RenovacaoSessaoMiddleware'],
+}
+
+
+def _escrita_sessao(sql):
+    return 'django_session' in sql and sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+
+
+def _leitura_sessao(sql):
+    return 'django_session' in sql and sql.lstrip().upper().startswith('SELECT')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede escritas e leituras em django_session por requisição, com a configuração anterior '
+        '(banco + SESSION_SAVE_EVERY_REQUEST) e com a atual (cached_db + renovação por intervalo). '
+        'Usa o banco configurado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=200)
+
+    def handle(self, *args, **options):
+        usuario, criado = UsuarioCustomizado.objects.get_or_create(
+            username=USUARIO_BENCHMARK, defaults={'email': 'benchmark@exemplo.com'}
+        )
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save(update_fields=['password'])
+
+        rotas = [
+            reverse('sales:check_venda_session'),
+            reverse('sales:cliente_compras_api') + '?cliente=Cliente%2001',
+            reverse('sales:dashboard'),
+        ]
+        comum = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            # Sem collectstatic não há manifest do whitenoise
+            'STATICFILES_STORAGE': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        }
+
+        resultados = {}
+        for nome, configuracao in (('antes', ANTES), ('depois', {})):
+            with override_settings(**comum, **configuracao):
+                resultados[nome] = self.medir(usuario, rotas, options['requisicoes'])
+
+        self.stdout.write(f"{'config':<8}{'req':>6}{'escritas':>10}{'escr/req':>10}{'leituras':>10}{'ms/req':>9}")
+        for nome, dados in resultados.items():
+            self.stdout.write(
+                f"{nome:<8}{dados['requisicoes']:>6}{dados['escritas']:>10}"
+                f"{dados['escritas'] / dados['requisicoes']:>10.3f}{dados['leituras']:>10}{dados['ms_req']:>9.1f}"
+            )
+
+    def medir(self, usuario, rotas, requisicoes):
+        client = Client()
+        client.force_login(usuario)
+        client.get(rotas[0])  # aquecimento: carrega a sessão no cache (cached_db)
+
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as contexto:
+            for indice in range(requisicoes):
+                client.get(rotas[indice % len(rotas)])
+        duracao = time.perf_counter() - inicio
+
+        consultas = [q['sql'] for q in contexto.captured_queries]
+        client.logout()
+        return {
+            'requisicoes': requisicoes,
+            'escritas': sum(1 for sql in consultas if _escrita_sessao(sql)),
+            'leituras': sum(1 for sql in consultas if _leitura_sessao(sql)),
+            'ms_req': 1000 * duracao / requisicoes,
+        }
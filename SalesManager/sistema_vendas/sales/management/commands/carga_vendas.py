@@ -0,0 +1,103 @@
+import random
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+from sales.carga import entrar, entrar_local, executar_carga, executar_carga_local
+from sales.sinteticos import PREFIXO_USUARIO, SENHA_PADRAO, nome_usuario, nomes_clientes
+
+
+# (nome, URL, parâmetros, peso): proporção aproximada do uso real das páginas
+MIX = (
+    ('dashboard', 'sales:dashboard', {}, 30),
+    ('lista_vendas', 'sales:lista_vendas', {'status': 'todas'}, 20),
+    ('lista_busca', 'sales:lista_vendas', {'busca': 'Silva'}, 5),
+    ('relatorio', 'sales:relatorio_vendas', {'periodo': 'ano'}, 10),
+    ('relatorio_grafico', 'sales:relatorio_grafico_api', {'periodo': '45_dias'}, 10),
+    ('cliente_compras', 'sales:cliente_compras_api', {'cliente': nomes_clientes(1)[0]}, 10),
+    ('api_vendas', 'sales:api_vendas', {'page_size': 100}, 10),
+    ('exportar_csv', 'sales:exportar_vendas_csv', {}, 5),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Entra com os usuários criados por seed_vendas e reproduz um mix de requisições às páginas de '
+        'vendas, no próprio processo ou contra um servidor (--url). Mostra vazão e latência p50/p95/p99 '
+        'por rota.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='', help='Servidor em execução (ex.: http://127.0.0.1:8000)')
+        parser.add_argument('--usuarios', type=int, default=5, help='Usuários sintéticos usados na carga')
+        parser.add_argument('--prefixo', default=PREFIXO_USUARIO)
+        parser.add_argument('--senha', default=SENHA_PADRAO)
+        parser.add_argument('--requisicoes', type=int, default=500)
+        parser.add_argument('--concorrencia', type=int, default=8)
+        parser.add_argument('--aquecimento', type=int, default=50)
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['requisicoes'] < 1 or options['concorrencia'] < 1:
+            raise CommandError('--usuarios, --requisicoes e --concorrencia devem ser positivos.')
+
+        if options['url']:
+            resultado = self.executar(options, lambda usuario: entrar(
+                options['url'], reverse('sales:login'), usuario, options['senha']
+            ), lambda rotas, quantidade: executar_carga(
+                options['url'], rotas, quantidade, options['concorrencia']
+            ))
+        else:
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                # Sem collectstatic não há manifest do whitenoise
+                STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+            ):
+                resultado = self.executar(options, lambda usuario: entrar_local(
+                    reverse('sales:login'), usuario, options['senha']
+                ), lambda rotas, quantidade: executar_carga_local(
+                    rotas, quantidade, options['concorrencia']
+                ))
+
+        self.imprimir(resultado, options['url'] or 'no processo')
+
+    def executar(self, options, fazer_login, carga):
+        cookies = []
+        for indice in range(options['usuarios']):
+            usuario = nome_usuario(indice, options['prefixo'])
+            try:
+                cookies.append(fazer_login(usuario))
+            except ValueError as erro:
+                raise CommandError(f'{erro}. Os usuários existem? Rode seed_vendas antes.')
+
+        rotas = self.montar_rotas(cookies, options['semente'])
+        if options['aquecimento']:
+            carga(rotas, options['aquecimento'])
+        self.stdout.write(f"Medindo {options['requisicoes']} requisição(ões)...")
+        return carga(rotas, options['requisicoes'])
+
+    def montar_rotas(self, cookies, semente):
+        """Cada usuário entra no rodízio com o mix inteiro, embaralhado com a semente"""
+        rotas = [
+            (nome, f'{reverse(url)}?{urlencode(parametros)}' if parametros else reverse(url), {'Cookie': cookie})
+            for cookie in cookies
+            for nome, url, parametros, peso in MIX
+            for _ in range(peso)
+        ]
+        random.Random(semente).shuffle(rotas)
+        return rotas
+
+    def imprimir(self, resultado, alvo):
+        self.stdout.write('')
+        self.stdout.write(f'Alvo: {alvo}')
+        self.stdout.write(
+            f"{'rota':<20}{'req':>6}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        )
+        for rota, dados in [*resultado['rotas'].items(), ('TOTAL', resultado['geral'])]:
+            self.stdout.write(
+                f"{rota:<20}{dados['requisicoes']:>6}{dados['erros']:>7}{dados['rps']:>9.1f}"
+                f"{dados['p50_ms']:>9.1f}{dados['p95_ms']:>9.1f}{dados['p99_ms']:>9.1f}"
+            )
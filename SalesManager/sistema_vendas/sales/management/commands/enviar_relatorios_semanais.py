@@ -0,0 +1,123 @@
+import smtplib
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales.models import UsuarioCustomizado
+from sales.resumo import metricas_por_usuario
+from sales.tarefas import montar_mensagem_relatorio
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia o relatório semanal a todos os usuários ativos com e-mail. As métricas saem de uma '
+        'única consulta agrupada e as mensagens vão em lotes por uma só conexão SMTP.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-fim',
+            help='Último dia do período (AAAA-MM-DD); padrão: ontem'
+        )
+        parser.add_argument('--dias', type=int, default=7, help='Tamanho do período em dias')
+        parser.add_argument('--lote', type=int, default=100, help='Mensagens por chamada a send_messages')
+        parser.add_argument(
+            '--somente-com-vendas',
+            action='store_true',
+            help='Não envia para quem não vendeu no período'
+        )
+        parser.add_argument('--backend', help='Backend de e-mail (padrão: EMAIL_BACKEND)')
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Monta as mensagens e mede o tempo, sem enviar'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['dias'] < 1:
+            raise CommandError('--lote e --dias devem ser maiores que zero.')
+
+        data_fim = self.data_fim(options['data_fim'])
+        data_inicio = data_fim - timedelta(days=options['dias'] - 1)
+
+        inicio = time.perf_counter()
+        mensagens = self.montar_mensagens(data_inicio, data_fim, options['somente_com_vendas'])
+        tempo_montagem = time.perf_counter() - inicio
+
+        if options['simular']:
+            self.stdout.write(
+                f'{len(mensagens)} mensagem(ns) montada(s) em {tempo_montagem:.2f}s (simulação, nada enviado).'
+            )
+            return
+
+        inicio = time.perf_counter()
+        enviadas, falhas = self.enviar(mensagens, options['lote'], options['backend'])
+        tempo_envio = time.perf_counter() - inicio
+
+        taxa = enviadas / tempo_envio if tempo_envio else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{enviadas} relatório(s) enviado(s), {falhas} falha(s). '
+            f'Montagem: {tempo_montagem:.2f}s; envio: {tempo_envio:.2f}s ({taxa:.1f} mensagens/s).'
+        ))
+
+    def data_fim(self, valor):
+        if not valor:
+            return timezone.localdate() - timedelta(days=1)
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Data inválida: {valor}')
+
+    def montar_mensagens(self, data_inicio, data_fim, somente_com_vendas):
+        """Uma consulta para os usuários e uma consulta agrupada para todas as métricas"""
+        usuarios = UsuarioCustomizado.objects.filter(is_active=True).exclude(email='').values_list(
+            'id', 'email'
+        )
+        metricas = metricas_por_usuario(data_inicio, data_fim)
+        remetente = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@salesmanager.com')
+        vazias = {'total_vendas': 0, 'valor_total': 0, 'pendentes': 0, 'valor_pendente': 0}
+
+        mensagens = []
+        for usuario_id, email in usuarios.iterator():
+            dados = metricas.get(usuario_id)
+            if dados is None:
+                if somente_com_vendas:
+                    continue
+                dados = vazias
+            assunto, corpo = montar_mensagem_relatorio(
+                dados['total_vendas'], dados['valor_total'],
+                periodo='Semanal',
+                status='Todos',
+                data_inicio=data_inicio.strftime('%d/%m/%Y'),
+                data_fim=data_fim.strftime('%d/%m/%Y'),
+                extras=[
+                    f"Vendas pendentes: {dados['pendentes']}",
+                    f"Valor pendente: R$ {dados['valor_pendente']:.2f}",
+                ],
+            )
+            mensagens.append(EmailMessage(assunto, corpo, remetente, [email]))
+        return mensagens
+
+    def enviar(self, mensagens, tamanho_lote, backend):
+        """Envia em lotes reaproveitando a mesma conexão; um lote com erro não interrompe os demais"""
+        enviadas = falhas = 0
+        conexao = get_connection(backend, fail_silently=False)
+        conexao.open()
+        try:
+            for i in range(0, len(mensagens), tamanho_lote):
+                lote = mensagens[i:i + tamanho_lote]
+                try:
+                    enviadas += conexao.send_messages(lote) or 0
+                except (smtplib.SMTPException, OSError) as erro:
+                    falhas += len(lote)
+                    self.stderr.write(f'Falha no lote {i // tamanho_lote + 1}: {erro}')
+                    # A conexão pode ter caído: reabre para os próximos lotes
+                    conexao.close()
+                    conexao.open()
+        finally:
+            conexao.close()
+        return enviadas, falhas
@@ -0,0 +1,67 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.importacao import BATCH_SIZE_PADRAO, ErroImportacao, importar_vendas
+from sales.models import UsuarioCustomizado
+
+
+class Command(BaseCommand):
+    help = 'Importa vendas de um CSV (separado por ";", mesmas colunas da exportação) para um usuário'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV')
+        parser.add_argument('--usuario', required=True, help='Username ou id do dono das vendas')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE_PADRAO)
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument(
+            '--validar',
+            action='store_true',
+            help='Apenas valida o arquivo e mostra os erros, sem gravar nada'
+        )
+        parser.add_argument('--relatorio', help='Grava todos os erros por linha neste CSV')
+
+    def handle(self, *args, **options):
+        usuario = self.obter_usuario(options['usuario'])
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['arquivo'], newline='', encoding=options['encoding']) as arquivo:
+                resultado = importar_vendas(
+                    usuario, arquivo, batch_size=options['batch_size'], apenas_validar=options['validar']
+                )
+        except (OSError, UnicodeDecodeError, ErroImportacao) as erro:
+            raise CommandError(str(erro))
+        duracao = time.perf_counter() - inicio
+
+        for erro in resultado.erros[:20]:
+            self.stdout.write(f"  linha {erro['linha']}: {self.formatar_erros(erro['erros'])}")
+        if len(resultado.erros) > 20:
+            self.stdout.write(f'  ... e mais {len(resultado.erros) - 20} linha(s) com erro')
+
+        if options['relatorio'] and resultado.erros:
+            with open(options['relatorio'], 'w', newline='', encoding='utf-8') as saida:
+                writer = csv.writer(saida, delimiter=';')
+                writer.writerow(['Linha', 'Erros'])
+                for erro in resultado.erros:
+                    writer.writerow([erro['linha'], self.formatar_erros(erro['erros'])])
+
+        taxa = resultado.total_linhas / duracao if duracao else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.importadas} venda(s) importada(s), {len(resultado.erros)} linha(s) com erro, '
+            f'{resultado.total_linhas} lida(s) em {duracao:.1f}s ({taxa:.0f} linhas/s).'
+        ))
+
+    def obter_usuario(self, identificador):
+        filtro = {'pk': identificador} if identificador.isdigit() else {'username': identificador}
+        try:
+            return UsuarioCustomizado.objects.get(**filtro)
+        except UsuarioCustomizado.DoesNotExist:
+            raise CommandError(f'Usuário não encontrado: {identificador}')
+
+    @staticmethod
+    def formatar_erros(erros):
+        return '; '.join(f"{campo}: {' '.join(mensagens)}" for campo, mensagens in erros.items())
@@ -0,0 +1,37 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove as sessões expiradas em lotes pequenos (o clearsessions apaga tudo em um único DELETE, '
+        'que no SQLite segura o lock de escrita durante toda a limpeza)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Sessões removidas por DELETE')
+        parser.add_argument('--pausa', type=float, default=0.05, help='Segundos entre lotes, para outras escritas passarem')
+        parser.add_argument('--max-lotes', type=int, help='Para depois deste número de lotes')
+
+    def handle(self, *args, **options):
+        agora = timezone.now()
+        total = lotes = 0
+
+        while options['max_lotes'] is None or lotes < options['max_lotes']:
+            chaves = list(
+                Session.objects.filter(expire_date__lt=agora)
+                .values_list('session_key', flat=True)[:options['lote']]
+            )
+            if not chaves:
+                break
+
+            removidas, _ = Session.objects.filter(session_key__in=chaves).delete()
+            total += removidas
+            lotes += 1
+            if options['pausa'] and len(chaves) == options['lote']:
+                time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} sessão(ões) expirada(s) removida(s) em {lotes} lote(s).'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import clientes, resumo
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói o resumo diário de vendas (VendaResumoDiario) e os totais dos clientes, '
+        'ou verifica divergências com Venda'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Apenas compara o resumo com Venda e falha se houver divergência'
+        )
+        parser.add_argument(
+            '--usuario',
+            type=int,
+            action='append',
+            dest='usuarios',
+            help='Restringe a operação ao usuário informado (pode repetir)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        usuarios = options['usuarios']
+
+        if options['verificar']:
+            diferencas = resumo.divergencias(usuarios)
+            diferencas_clientes = clientes.divergencias(usuarios)
+            for chave, esperado, encontrado in (diferencas + diferencas_clientes)[:50]:
+                self.stdout.write(f'  {chave}: esperado={esperado} encontrado={encontrado}')
+            if diferencas or diferencas_clientes:
+                raise CommandError(
+                    f'{len(diferencas)} bucket(s) e {len(diferencas_clientes)} cliente(s) divergente(s). '
+                    'Rode sem --verificar para reconstruir.'
+                )
+            self.stdout.write(self.style.SUCCESS('Resumo e clientes consistentes com as vendas.'))
+            return
+
+        linhas = resumo.reconstruir(usuarios, batch_size=options['batch_size'])
+        total_clientes = clientes.reconstruir(usuarios, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumo reconstruído: {linhas} linha(s); {total_clientes} cliente(s).'
+        ))
@@ -0,0 +1,66 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from sales import fila
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas da fila em banco (e-mails de relatório etc.) até ser interrompido'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Processa o que estiver pendente e sai (útil em cron e testes)'
+        )
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera com a fila vazia')
+        parser.add_argument('--max-tarefas', type=int, help='Sai depois de executar este número de tarefas')
+        parser.add_argument(
+            '--timeout-travadas',
+            type=int,
+            default=600,
+            help='Segundos após os quais uma tarefa em execução é considerada abandonada'
+        )
+
+    def handle(self, *args, **options):
+        self.parar = False
+        anteriores = {sinal: signal.signal(sinal, self.sinal_parada) for sinal in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            self.loop(options)
+        finally:
+            for sinal, handler in anteriores.items():
+                signal.signal(sinal, handler)
+
+    def loop(self, options):
+        worker = fila.identificador_worker()
+        timeout = timedelta(seconds=options['timeout_travadas'])
+        limite = options['max_tarefas']
+        executadas = 0
+        self.stdout.write(f'Worker {worker} iniciado.')
+
+        while not self.parar and (limite is None or executadas < limite):
+            close_old_connections()
+            recuperadas = fila.recuperar_travadas(timeout)
+            if recuperadas:
+                self.stdout.write(f'{recuperadas} tarefa(s) abandonada(s) devolvida(s) à fila.')
+
+            tarefa = fila.reservar(worker)
+            if tarefa is None:
+                if options['uma_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            fila.executar(tarefa)
+            executadas += 1
+            self.stdout.write(f'{tarefa}: tentativa {tarefa.tentativas}')
+
+        self.stdout.write(self.style.SUCCESS(f'Worker encerrado: {executadas} tarefa(s) executada(s).'))
+
+    def sinal_parada(self, signum, frame):
+        # Termina a tarefa atual antes de sair
+        self.parar = True
@@ -0,0 +1,77 @@
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from sales import resumo
+from sales.models import UsuarioCustomizado, Venda
+from sales.sinteticos import PREFIXO_USUARIO, SENHA_PADRAO, GeradorVendas, nome_usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Cria N usuários sintéticos com M vendas cada (clientes concentrados, datas sazonais, '
+        'baixadas e pendentes), via bulk_create. Completa o que faltar se rodar de novo. '
+        'Popula o banco configurado: use DATABASE_URL para apontar para um banco descartável.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10)
+        parser.add_argument('--vendas', type=int, default=1000, help='Vendas por usuário')
+        parser.add_argument('--clientes', type=int, default=200, help='Clientes distintos por usuário')
+        parser.add_argument('--dias', type=int, default=730, help='Vendas espalhadas pelos últimos N dias')
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--prefixo', default=PREFIXO_USUARIO)
+        parser.add_argument('--senha', default=SENHA_PADRAO, help='Senha de todos os usuários criados')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['vendas'] < 0 or options['clientes'] < 1 or options['dias'] < 1:
+            raise CommandError('--usuarios, --clientes e --dias devem ser positivos e --vendas não negativo.')
+
+        usuarios = self.criar_usuarios(options['usuarios'], options['prefixo'], options['senha'])
+        existentes = dict(
+            Venda.objects.filter(usuario__in=usuarios).values('usuario').annotate(total=Count('id'))
+            .values_list('usuario', 'total')
+        )
+
+        gerador = GeradorVendas(
+            timezone.localdate(), semente=options['semente'], clientes=options['clientes'], dias=options['dias']
+        )
+        criadas, alterados = 0, []
+        for usuario in usuarios:
+            faltam = options['vendas'] - existentes.get(usuario.id, 0)
+            if faltam <= 0:
+                continue
+            vendas = gerador.vendas(usuario, faltam)
+            # Em blocos: memória constante mesmo com milhões de vendas
+            with transaction.atomic():
+                while lote := list(islice(vendas, options['batch_size'])):
+                    Venda.objects.bulk_create(lote, batch_size=options['batch_size'], atualizar_resumo=False)
+                    criadas += len(lote)
+            alterados.append(usuario.id)
+            self.stdout.write(f'{usuario.username}: {faltam} venda(s) criadas.')
+
+        if alterados:
+            # Recalcular os dias a cada bloco releria as vendas já criadas: uma reconstrução no fim
+            resumo.reconstruir(alterados)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(usuarios)} usuário(s), {criadas} venda(s) criadas. Senha: "{options["senha"]}".'
+        ))
+
+    def criar_usuarios(self, quantidade, prefixo, senha):
+        nomes = [nome_usuario(indice, prefixo) for indice in range(quantidade)]
+        existentes = set(UsuarioCustomizado.objects.filter(username__in=nomes).values_list('username', flat=True))
+        # Hash calculado uma vez: o PBKDF2 por usuário dominaria o tempo do comando
+        hash_senha = make_password(senha)
+        UsuarioCustomizado.objects.bulk_create([
+            UsuarioCustomizado(
+                username=nome, email=f'{nome}@exemplo.com', first_name='Usuário',
+                last_name=f'Sintético {indice}', password=hash_senha,
+            )
+            for indice, nome in enumerate(nomes) if nome not in existentes
+        ])
+        return list(UsuarioCustomizado.objects.filter(username__in=nomes).order_by('username'))
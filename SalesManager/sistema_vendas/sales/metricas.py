@@ -0,0 +1,302 @@
+"""
+Métricas por requisição no formato texto do Prometheus.
+
+Cada processo acumula em memória, por nome de URL, latência (histograma),
+consultas e tempo de banco e bytes da resposta, e grava seus totais em
+<SALES_METRICAS_DIR>/<pid>-<início>.json no máximo a cada
+SALES_METRICAS_INTERVALO segundos; o início no nome impede que um PID
+reaproveitado sobrescreva os totais de outro processo. O endpoint /metrics
+soma os arquivos de todos os processos. Os de processos já encerrados são
+somados uma vez em encerrados.json e apagados (contadores não podem
+diminuir); para isso a pasta deve ser local à máquina, como é o padrão.
+O arquivo leva também os acertos e falhas por camada do cache em duas
+camadas (sales/cache_camadas.py).
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from . import cache_camadas
+
+
+# Limites (segundos) do histograma de latência
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INTERVALO_PADRAO = 5
+# Totais somados dos processos que já terminaram
+ENCERRADOS = 'encerrados.json'
+
+# Posições em cada série: requisições, soma da latência, consultas, tempo de banco, bytes, buckets...
+_REQUISICOES, _LATENCIA, _CONSULTAS, _TEMPO_BANCO, _BYTES = range(5)
+_INICIO_BUCKETS = 5
+
+
+class Registro:
+    """Totais deste processo, por (view, método, status)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._pid = os.getpid()
+        self.arquivo = _nome_arquivo(self._pid)
+        self._gravado_em = 0.0
+
+    def _verificar_fork(self):
+        # Processo filho (fork depois do import) começa do zero e grava no próprio arquivo
+        if os.getpid() != self._pid:
+            self._series = {}
+            self._pid = os.getpid()
+            self.arquivo = _nome_arquivo(self._pid)
+            self._gravado_em = 0.0
+
+    def registrar(self, view, metodo, status, latencia, consultas, tempo_banco, tamanho):
+        with self._lock:
+            self._verificar_fork()
+            chave = (view, metodo, status)
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0, 0.0, 0, 0.0, 0] + [0] * len(BUCKETS)
+            serie[_REQUISICOES] += 1
+            serie[_LATENCIA] += latencia
+            serie[_CONSULTAS] += consultas
+            serie[_TEMPO_BANCO] += tempo_banco
+            serie[_BYTES] += tamanho
+            for indice, limite in enumerate(BUCKETS):
+                if latencia <= limite:
+                    # Não cumulativo aqui; a soma acumulada é feita na exportação
+                    serie[_INICIO_BUCKETS + indice] += 1
+                    break
+
+    def copia(self):
+        with self._lock:
+            self._verificar_fork()
+            return {chave: list(serie) for chave, serie in self._series.items()}
+
+    def gravar_se_necessario(self, agora=None):
+        """Grava o arquivo do processo se o último tem mais de SALES_METRICAS_INTERVALO segundos"""
+        agora = agora or time.monotonic()
+        if agora - self._gravado_em < _config('SALES_METRICAS_INTERVALO', INTERVALO_PADRAO):
+            return False
+        self._gravado_em = agora
+        # copia() antes de ler self.arquivo: depois de um fork ela troca o nome do arquivo
+        series = self.copia()
+        gravar_arquivo(self.arquivo, series, contadores_cache())
+        return True
+
+    def limpar(self):
+        with self._lock:
+            self._series = {}
+            self._gravado_em = 0.0
+
+
+def _nome_arquivo(pid):
+    return f'{pid}-{int(time.time() * 1000)}.json'
+
+
+registro = Registro()
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def diretorio():
+    return _config('SALES_METRICAS_DIR', None) or os.path.join(tempfile.gettempdir(), 'salesmanager_metricas')
+
+
+# =============================================================================
+# ARQUIVOS POR PROCESSO
+# =============================================================================
+
+def contadores_cache():
+    """{(cache, camada): [acertos, falhas]} deste processo"""
+    return {
+        (nome, camada): [dados['hits'], dados['misses']]
+        for nome, camadas in cache_camadas.estatisticas().items()
+        for camada, dados in camadas.items()
+    }
+
+
+def gravar_arquivo(nome, series, caches=None):
+    """Grava (substituindo) <pasta>/<nome> com as séries e os contadores de cache"""
+    pasta = diretorio()
+    os.makedirs(pasta, exist_ok=True)
+    _gravar(os.path.join(pasta, nome), series, caches)
+
+
+def _gravar(caminho, series, caches):
+    pasta = os.path.dirname(caminho)
+    conteudo = json.dumps({
+        'series': [[*chave, serie] for chave, serie in series.items()],
+        'caches': [[*chave, contadores] for chave, contadores in (caches or {}).items()],
+    })
+    descritor, temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    with os.fdopen(descritor, 'w') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _ler(caminho):
+    """(séries, caches) de um arquivo, ou None se sumiu ou está ilegível"""
+    try:
+        with open(caminho) as arquivo:
+            dados = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    if isinstance(dados, list):
+        # Formato anterior ao cache em camadas: só as séries
+        dados = {'series': dados}
+    return (
+        {(view, metodo, status): serie for view, metodo, status, serie in dados['series']},
+        {(cache, camada): contadores for cache, camada, contadores in dados.get('caches', [])},
+    )
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Sem permissão para sinalizar: existe, é de outro usuário
+        return True
+    return True
+
+
+def _recolher_encerrados(pasta):
+    """Soma os arquivos de processos encerrados em encerrados.json e apaga os arquivos"""
+    if fcntl is None:
+        # Fora do POSIX não há como testar o PID sem risco (os.kill encerra o processo no Windows)
+        return
+    with open(os.path.join(pasta, '.recolher.lock'), 'w') as trava:
+        # Dois scrapes ao mesmo tempo não podem somar o mesmo arquivo duas vezes
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        encerrados = []
+        for nome in os.listdir(pasta):
+            if not nome.endswith('.json') or nome in (ENCERRADOS, registro.arquivo):
+                continue
+            pid = nome.split('-', 1)[0].removesuffix('.json')
+            if pid.isdigit() and not _processo_vivo(int(pid)):
+                encerrados.append(nome)
+        if not encerrados:
+            return
+
+        caminho = os.path.join(pasta, ENCERRADOS)
+        series, caches = _ler(caminho) or ({}, {})
+        for nome in encerrados:
+            dados = _ler(os.path.join(pasta, nome))
+            if dados:
+                _somar(series, dados[0])
+                _somar(caches, dados[1])
+        _gravar(caminho, series, caches)
+        for nome in encerrados:
+            try:
+                os.remove(os.path.join(pasta, nome))
+            except FileNotFoundError:
+                pass
+
+
+def _somar(destino, series):
+    for chave, serie in series.items():
+        atual = destino.get(chave)
+        if atual is None:
+            destino[chave] = list(serie)
+        else:
+            for indice, valor in enumerate(serie):
+                atual[indice] += valor
+
+
+def agregar():
+    """Totais de todos os processos: arquivos dos outros + memória deste; (séries, caches)"""
+    total, caches = {}, {}
+    pasta = diretorio()
+    if os.path.isdir(pasta):
+        _recolher_encerrados(pasta)
+        for nome in os.listdir(pasta):
+            if not nome.endswith('.json') or nome == registro.arquivo:
+                continue
+            dados = _ler(os.path.join(pasta, nome))
+            if dados:
+                _somar(total, dados[0])
+                _somar(caches, dados[1])
+    _somar(total, registro.copia())
+    _somar(caches, contadores_cache())
+    return total, caches
+
+
+# =============================================================================
+# FORMATO TEXTO DO PROMETHEUS
+# =============================================================================
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(**rotulos):
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items()) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar(series=None, caches=None):
+    """Texto no formato de exposição 0.0.4 do Prometheus"""
+    if series is None:
+        series, caches = agregar()
+    linhas = []
+
+    def cabecalho(nome, tipo, ajuda):
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+
+    cabecalho('sales_http_requests_total', 'counter', 'Requisições por view, método e status')
+    for (view, metodo, status), serie in sorted(series.items()):
+        linhas.append(
+            f'sales_http_requests_total{_rotulos(view=view, method=metodo, status=status)} {serie[_REQUISICOES]}'
+        )
+
+    # Histograma por view e método (status fora para não multiplicar as séries)
+    por_view = {}
+    for (view, metodo, _), serie in series.items():
+        _somar(por_view, {(view, metodo): serie})
+
+    nome = 'sales_http_request_duration_seconds'
+    cabecalho(nome, 'histogram', 'Latência das requisições por view')
+    for (view, metodo), serie in sorted(por_view.items()):
+        acumulado = 0
+        for indice, limite in enumerate(BUCKETS):
+            acumulado += serie[_INICIO_BUCKETS + indice]
+            linhas.append(f'{nome}_bucket{_rotulos(view=view, method=metodo, le=limite)} {acumulado}')
+        linhas.append(f'{nome}_bucket{_rotulos(view=view, method=metodo, le="+Inf")} {serie[_REQUISICOES]}')
+        linhas.append(f'{nome}_sum{_rotulos(view=view, method=metodo)} {_numero(serie[_LATENCIA])}')
+        linhas.append(f'{nome}_count{_rotulos(view=view, method=metodo)} {serie[_REQUISICOES]}')
+
+    for nome, posicao, ajuda in (
+        ('sales_db_queries_total', _CONSULTAS, 'Consultas ao banco feitas pelas requisições'),
+        ('sales_db_query_seconds_total', _TEMPO_BANCO, 'Tempo gasto em consultas ao banco'),
+        ('sales_http_response_bytes_total', _BYTES, 'Bytes enviados no corpo das respostas'),
+    ):
+        cabecalho(nome, 'counter', ajuda)
+        for (view, metodo), serie in sorted(por_view.items()):
+            linhas.append(f'{nome}{_rotulos(view=view, method=metodo)} {_numero(serie[posicao])}')
+
+    caches = caches or {}
+    cabecalho('sales_cache_requests_total', 'counter', 'Leituras do cache por camada (l1, l2) e resultado')
+    for (cache, camada), (acertos, falhas) in sorted(caches.items()):
+        linhas.append(f'sales_cache_requests_total{_rotulos(cache=cache, tier=camada, result="hit")} {acertos}')
+        linhas.append(f'sales_cache_requests_total{_rotulos(cache=cache, tier=camada, result="miss")} {falhas}')
+    cabecalho('sales_cache_hit_ratio', 'gauge', 'Fração das leituras atendidas por camada desde o início dos processos')
+    for (cache, camada), (acertos, falhas) in sorted(caches.items()):
+        taxa = acertos / (acertos + falhas) if acertos + falhas else 0.0
+        linhas.append(f'sales_cache_hit_ratio{_rotulos(cache=cache, tier=camada)} {_numero(taxa)}')
+
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,155 @@
+"""Middlewares do app de vendas."""
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.middleware.gzip import GZipMiddleware
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metricas
+
+
+# Só texto: PDF, .csv.gz e imagens já são comprimidos e gastariam CPU à toa
+TIPOS_COMPRIMIDOS = ('text/', 'application/json', 'application/javascript')
+
+
+class CompressaoMiddleware(GZipMiddleware):
+    """GZip das respostas HTML/JSON/CSV; os demais tipos passam sem alteração"""
+
+    def process_response(self, request, response):
+        tipo = response.get('Content-Type', '')
+        if not tipo.startswith(TIPOS_COMPRIMIDOS):
+            return response
+        return super().process_response(request, response)
+
+
+# Chave na sessão com o momento (epoch) da última renovação da validade
+CHAVE_RENOVACAO = '_renovada_em'
+INTERVALO_RENOVACAO_PADRAO = 60 * 60
+
+
+class RenovacaoSessaoMiddleware(MiddlewareMixin):
+    """
+    Renova a validade da sessão no máximo uma vez por SESSION_RENOVACAO_INTERVALO.
+
+    Substitui SESSION_SAVE_EVERY_REQUEST, que gravava a sessão a cada
+    requisição. Marcar a sessão como alterada faz o SessionMiddleware salvá-la
+    e reenviar o cookie com a validade completa. Fica depois do
+    SessionMiddleware na lista, para rodar antes dele na resposta.
+    """
+
+    def process_response(self, request, response):
+        sessao = getattr(request, 'session', None)
+        if sessao is None or response.status_code >= 500:
+            return response
+
+        renovada_em = sessao.get(CHAVE_RENOVACAO, 0)
+        # Sessão vazia (visitante, logout, cookie expirado) não é criada só para guardar a marca
+        if sessao.is_empty():
+            return response
+
+        agora = int(time.time())
+        intervalo = getattr(settings, 'SESSION_RENOVACAO_INTERVALO', INTERVALO_RENOVACAO_PADRAO)
+        if sessao.modified or agora - renovada_em >= intervalo:
+            # Se a sessão já vai ser gravada, a marca vai junto sem escrita extra
+            sessao[CHAVE_RENOVACAO] = agora
+        return response
+
+
+class _Medidor:
+    """Cronômetro da requisição e totais de consultas e tempo de banco"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        # Consultas do ExecutorBanco podem chegar de várias threads ao mesmo tempo
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._lock:
+                self.consultas += 1
+                self.tempo_banco += duracao
+
+    def registrar(self, request, response):
+        latencia = time.perf_counter() - self.inicio
+        rota = getattr(request, 'resolver_match', None)
+        metricas.registro.registrar(
+            rota.view_name if rota else 'sem_rota',
+            request.method,
+            response.status_code,
+            latencia,
+            self.consultas,
+            self.tempo_banco,
+            # Streaming (exportações CSV) não tem tamanho conhecido aqui
+            0 if response.streaming else len(response.content),
+        )
+        metricas.registro.gravar_se_necessario()
+
+
+# Medidor da requisição em curso. Segue a requisição para as threads do sync_to_async e do
+# ExecutorBanco, onde as consultas realmente rodam (a conexão é por thread)
+_medidor_atual = ContextVar('medidor_atual', default=None)
+
+
+def _medir(execute, sql, params, many, context):
+    medidor = _medidor_atual.get()
+    if medidor is None:
+        return execute(sql, params, many, context)
+    return medidor(execute, sql, params, many, context)
+
+
+def _instalar_medidor(sender, connection, **kwargs):
+    """execute_wrapper permanente em toda conexão; mede só quando há requisição em curso"""
+    if _medir not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir)
+
+
+connection_created.connect(_instalar_medidor)
+
+
+class MetricasMiddleware:
+    """
+    Latência, consultas, tempo de banco e bytes por nome de URL (sales/metricas.py).
+
+    Fica antes da compressão na lista: o tamanho registrado é o enviado.
+    Funciona nos dois modos, para não forçar as views ASGI a passar por thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medidor = _Medidor()
+        token = _medidor_atual.set(medidor)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medidor_atual.reset(token)
+        medidor.registrar(request, response)
+        return response
+
+    async def __acall__(self, request):
+        medidor = _Medidor()
+        token = _medidor_atual.set(medidor)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medidor_atual.reset(token)
+        medidor.registrar(request, response)
+        return response
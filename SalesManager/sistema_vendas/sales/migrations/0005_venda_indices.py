@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_venda_baixada_venda_data_baixa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['usuario', 'data_venda', 'data_criacao'], name='venda_usuario_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['usuario', 'baixada', 'data_venda'], name='venda_usuario_baixada_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:42
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def popular_resumo(apps, schema_editor):
+    Venda = apps.get_model('sales', 'Venda')
+    VendaResumoDiario = apps.get_model('sales', 'VendaResumoDiario')
+
+    linhas = Venda.objects.order_by().values('usuario_id', 'data_venda', 'baixada').annotate(
+        total_vendas=models.Count('id'),
+        total_valor=models.Sum('valor'),
+        total_itens=models.Sum('quantidade'),
+    )
+    VendaResumoDiario.objects.bulk_create([
+        VendaResumoDiario(
+            usuario_id=linha['usuario_id'],
+            data=linha['data_venda'],
+            baixada=linha['baixada'],
+            quantidade_vendas=linha['total_vendas'],
+            valor_total=linha['total_valor'] or Decimal('0.00'),
+            quantidade_itens=linha['total_itens'] or 0,
+        )
+        for linha in linhas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_venda_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('baixada', models.BooleanField(default=False)),
+                ('quantidade_vendas', models.PositiveIntegerField(default=0, verbose_name='Quantidade de vendas')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Valor total (R$)')),
+                ('quantidade_itens', models.PositiveIntegerField(default=0, verbose_name='Quantidade de itens')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumo diário de vendas',
+                'verbose_name_plural': 'Resumos diários de vendas',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='vendaresumodiario',
+            constraint=models.UniqueConstraint(fields=('usuario', 'data', 'baixada'), name='resumo_usuario_data_baixada_uniq'),
+        ),
+        migrations.RunPython(popular_resumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['usuario', 'data_atualizacao'], name='venda_usuario_atualizacao_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:36
+
+import unicodedata
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _normalizar_nome(nome):
+    # Cópia de clientes.normalizar_nome no momento da migração
+    decomposto = unicodedata.normalize('NFKD', nome or '')
+    sem_acentos = ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+    return ' '.join(sem_acentos.casefold().split())[:100].rstrip()
+
+
+def popular_clientes(apps, schema_editor):
+    Venda = apps.get_model('sales', 'Venda')
+    Cliente = apps.get_model('sales', 'Cliente')
+
+    # (usuario, chave) -> [nome da primeira venda, total, compras, última compra, ids das vendas]
+    grupos = {}
+    vendas = Venda.objects.order_by('id').values_list('id', 'usuario_id', 'cliente', 'valor', 'data_venda')
+    for venda_id, usuario_id, nome, valor, data_venda in vendas.iterator(chunk_size=2000):
+        grupo = grupos.setdefault(
+            (usuario_id, _normalizar_nome(nome)), [nome.strip(), Decimal('0.00'), 0, data_venda, []]
+        )
+        grupo[1] += valor
+        grupo[2] += 1
+        grupo[3] = max(grupo[3], data_venda)
+        grupo[4].append(venda_id)
+
+    Cliente.objects.bulk_create([
+        Cliente(
+            usuario_id=usuario_id, chave=chave, nome=nome,
+            total_gasto=total, quantidade_compras=compras, ultima_compra=ultima,
+        )
+        for (usuario_id, chave), (nome, total, compras, ultima, _) in grupos.items()
+    ], batch_size=1000)
+
+    ids = {(c.usuario_id, c.chave): c.id for c in Cliente.objects.only('id', 'usuario_id', 'chave')}
+    for chave, grupo in grupos.items():
+        venda_ids = grupo[4]
+        for inicio in range(0, len(venda_ids), 1000):
+            Venda.objects.filter(id__in=venda_ids[inicio:inicio + 1000]).update(cliente_cadastro_id=ids[chave])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_venda_usuario_atualizacao_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('chave', models.CharField(max_length=100, verbose_name='Nome normalizado')),
+                ('total_gasto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total gasto (R$)')),
+                ('quantidade_compras', models.PositiveIntegerField(default=0, verbose_name='Quantidade de compras')),
+                ('ultima_compra', models.DateField(blank=True, null=True, verbose_name='Última compra')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clientes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cliente',
+                'verbose_name_plural': 'Clientes',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(fields=('usuario', 'chave'), name='cliente_usuario_chave_uniq'),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='cliente_cadastro',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vendas', to='sales.cliente'),
+        ),
+        migrations.RunPython(popular_clientes, migrations.RunPython.noop),
+        # Criado depois do preenchimento: a atualização das vendas não mantém o índice a cada linha
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['cliente_cadastro', 'data_venda'], name='venda_cliente_data_idx'),
+        ),
+    ]
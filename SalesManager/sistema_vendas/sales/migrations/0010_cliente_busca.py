@@ -0,0 +1,58 @@
+from django.db import migrations
+
+
+# Índice de trigramas da busca de clientes (sales/busca.py), sobre a chave normalizada
+SQLITE_CRIAR = [
+    # Tabela FTS5 de conteúdo externo: guarda só o índice, o texto fica em sales_cliente
+    "CREATE VIRTUAL TABLE sales_cliente_busca USING fts5("
+    "chave, usuario_id UNINDEXED, content='sales_cliente', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER sales_cliente_busca_ai AFTER INSERT ON sales_cliente BEGIN "
+    "INSERT INTO sales_cliente_busca(rowid, chave, usuario_id) VALUES (new.id, new.chave, new.usuario_id); END",
+    "CREATE TRIGGER sales_cliente_busca_ad AFTER DELETE ON sales_cliente BEGIN "
+    "INSERT INTO sales_cliente_busca(sales_cliente_busca, rowid, chave, usuario_id) "
+    "VALUES ('delete', old.id, old.chave, old.usuario_id); END",
+    "CREATE TRIGGER sales_cliente_busca_au AFTER UPDATE OF chave, usuario_id ON sales_cliente BEGIN "
+    "INSERT INTO sales_cliente_busca(sales_cliente_busca, rowid, chave, usuario_id) "
+    "VALUES ('delete', old.id, old.chave, old.usuario_id); "
+    "INSERT INTO sales_cliente_busca(rowid, chave, usuario_id) VALUES (new.id, new.chave, new.usuario_id); END",
+    "INSERT INTO sales_cliente_busca(sales_cliente_busca) VALUES ('rebuild')",
+]
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS sales_cliente_busca_au',
+    'DROP TRIGGER IF EXISTS sales_cliente_busca_ad',
+    'DROP TRIGGER IF EXISTS sales_cliente_busca_ai',
+    'DROP TABLE IF EXISTS sales_cliente_busca',
+]
+
+POSTGRES_CRIAR = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS cliente_chave_trgm_idx ON sales_cliente USING gin (chave gin_trgm_ops)',
+]
+POSTGRES_REMOVER = [
+    'DROP INDEX IF EXISTS cliente_chave_trgm_idx',
+]
+
+
+def _executar(schema_editor, comandos):
+    comandos = {'sqlite': comandos[0], 'postgresql': comandos[1]}.get(schema_editor.connection.vendor, [])
+    for sql in comandos:
+        schema_editor.execute(sql)
+
+
+def criar_indice_busca(apps, schema_editor):
+    _executar(schema_editor, (SQLITE_CRIAR, POSTGRES_CRIAR))
+
+
+def remover_indice_busca(apps, schema_editor):
+    _executar(schema_editor, (SQLITE_REMOVER, POSTGRES_REMOVER))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_cliente'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
@@ -1,11 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Max
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.hashers import make_password
 from django.core.validators import MinValueValidator
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 
+from .cache_metricas import invalidar_usuarios
+
 
 class UsuarioCustomizado(AbstractUser):
     telefone = models.CharField(
@@ -73,8 +77,134 @@ class UsuarioCustomizado(AbstractUser):
         return self.telefone
 
 
+class VendaQuerySet(models.QuerySet):
+    """
+    Operações em lote não disparam sinais; aqui elas invalidam o cache de
+    métricas, atualizam a versão e mantêm o resumo diário e os totais dos
+    clientes.
+    """
+
+    def update(self, **kwargs):
+        from . import clientes, resumo
+
+        # auto_now não vale para UPDATE em lote; sem isso a versão dos dados não mudaria
+        kwargs.setdefault('data_atualizacao', timezone.now())
+        if kwargs.keys() & resumo.CAMPOS_VENDA_RESUMO:
+            linhas, usuario_ids = self._update_com_resumo(kwargs)
+        else:
+            usuario_ids = set(self.order_by().values_list('usuario_id', flat=True).distinct())
+            linhas = super().update(**kwargs)
+        if linhas:
+            invalidar_usuarios(usuario_ids)
+            if kwargs.keys() & clientes.CAMPOS_VENDA_CLIENTE:
+                clientes.reconstruir(usuario_ids)
+        return linhas
+
+    def _update_com_resumo(self, kwargs):
+        """UPDATE que muda buckets do resumo: recalcula os dias de antes e de depois na mesma transação"""
+        from . import resumo
+
+        with transaction.atomic():
+            dias = set(self.order_by().values_list('usuario_id', 'data_venda').distinct())
+            # Se a data ou o dono mudam, os dias de depois vêm pelos ids
+            ids = []
+            if kwargs.keys() & {'data_venda', 'usuario', 'usuario_id'}:
+                ids = list(self.order_by().values_list('id', flat=True))
+            linhas = super().update(**kwargs)
+            if ids:
+                dias |= set(Venda.objects.filter(id__in=ids).order_by().values_list('usuario_id', 'data_venda'))
+            if linhas:
+                resumo.recalcular_dias_usuarios(dias)
+        return linhas, {usuario_id for usuario_id, _ in dias}
+
+    def bulk_create(self, objs, *args, atualizar_resumo=True, **kwargs):
+        """
+        Como QuerySet.bulk_create, ligando as vendas aos clientes e somando-as ao resumo.
+
+        Com atualizar_resumo=False o resumo fica com quem chama (importação e
+        carga em blocos recalculam uma vez no fim).
+        """
+        from . import clientes, resumo
+
+        objs = list(objs)
+        # A venda já é inserida ligada ao cliente; os totais são recalculados depois
+        cliente_ids = set()
+        por_usuario = {}
+        for venda in objs:
+            por_usuario.setdefault(venda.usuario_id, []).append(venda)
+        for usuario_id, vendas in por_usuario.items():
+            cliente_ids |= clientes.vincular(usuario_id, vendas)
+
+        with transaction.atomic():
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if atualizar_resumo:
+                resumo.recalcular_dias_usuarios({(venda.usuario_id, venda.data_venda) for venda in objs})
+        clientes.recalcular(cliente_ids)
+        invalidar_usuarios(set(por_usuario))
+        return objs
+
+    def versao(self):
+        """
+        (última alteração, quantidade) das vendas do queryset.
+
+        Muda com qualquer inclusão, edição ou exclusão, inclusive em lote, e é
+        a mesma em todos os processos (ao contrário da versão em cache).
+        """
+        dados = self.order_by().aggregate(ultima=Max('data_atualizacao'), total=Count('id'))
+        return dados['ultima'], dados['total']
+
+
+class Cliente(models.Model):
+    """
+    Cliente de um vendedor, identificado pelo nome normalizado (sales/clientes.py).
+
+    Total gasto, número de compras e última compra são mantidos junto com
+    cada escrita em Venda, como o resumo diário.
+    """
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="clientes"
+    )
+    nome = models.CharField(max_length=100, verbose_name="Nome")
+    # Sem acentos, caixa e espaços repetidos: "JOÃO  silva" e "joao silva" são o mesmo cliente
+    chave = models.CharField(max_length=100, verbose_name="Nome normalizado")
+    total_gasto = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Total gasto (R$)"
+    )
+    quantidade_compras = models.PositiveIntegerField(default=0, verbose_name="Quantidade de compras")
+    ultima_compra = models.DateField(null=True, blank=True, verbose_name="Última compra")
+
+    class Meta:
+        # No SQLite, AlterField/AddField em Cliente recriam a tabela e levam junto os gatilhos
+        # sales_cliente_busca_* do índice de busca (migração 0010): a migração da alteração
+        # precisa recriá-los (SQLITE_CRIAR da 0010), senão a busca deixa de ver clientes novos.
+        verbose_name = "Cliente"
+        verbose_name_plural = "Clientes"
+        ordering = ['nome']
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'chave'], name='cliente_usuario_chave_uniq'),
+        ]
+
+    def __str__(self):
+        return self.nome
+
+
 class Venda(models.Model):
     cliente = models.CharField(max_length=100, verbose_name="Nome do Cliente")
+    # Preenchido a partir de `cliente` em toda escrita (sinais e VendaQuerySet)
+    cliente_cadastro = models.ForeignKey(
+        Cliente,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+        related_name="vendas"
+    )
     quantidade = models.PositiveIntegerField(
         validators=[MinValueValidator(1)],
         verbose_name="Quantidade"
@@ -96,13 +226,102 @@ class Venda(models.Model):
     baixada = models.BooleanField(default=False)
     data_baixa = models.DateField(null=True, blank=True)
 
+    objects = VendaQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Venda"
         verbose_name_plural = "Vendas"
         ordering = ['-data_venda', '-data_criacao']
+        indexes = [
+            # Listagens e gráficos: vendas do usuário por período, já na ordem padrão
+            models.Index(fields=['usuario', 'data_venda', 'data_criacao'], name='venda_usuario_data_idx'),
+            # Mesmo acesso filtrando por status (ativas/baixadas)
+            models.Index(fields=['usuario', 'baixada', 'data_venda'], name='venda_usuario_baixada_idx'),
+            # Versão dos dados do usuário (ETag/cache de PDF): MAX e COUNT só pelo índice
+            models.Index(fields=['usuario', 'data_atualizacao'], name='venda_usuario_atualizacao_idx'),
+            # Últimas compras de um cliente (também serve à FK)
+            models.Index(fields=['cliente_cadastro', 'data_venda'], name='venda_cliente_data_idx'),
+        ]
 
     def __str__(self):
         return f"Venda para {self.cliente} - R$ {self.valor}"
 
     def valor_total(self):
         return self.quantidade * self.valor
+
+
+class VendaResumoDiario(models.Model):
+    """Totais diários de vendas por usuário e status, mantidos junto com cada escrita em Venda"""
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="resumos_diarios"
+    )
+    data = models.DateField(verbose_name="Data")
+    baixada = models.BooleanField(default=False)
+    quantidade_vendas = models.PositiveIntegerField(default=0, verbose_name="Quantidade de vendas")
+    valor_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Valor total (R$)"
+    )
+    quantidade_itens = models.PositiveIntegerField(default=0, verbose_name="Quantidade de itens")
+
+    class Meta:
+        verbose_name = "Resumo diário de vendas"
+        verbose_name_plural = "Resumos diários de vendas"
+        ordering = ['-data']
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'data', 'baixada'], name='resumo_usuario_data_baixada_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.data} - {self.quantidade_vendas} venda(s)"
+
+
+class Tarefa(models.Model):
+    """Trabalho assíncrono da fila em banco (sales/fila.py), executado pelo runworker"""
+    PENDENTE = 'pendente'
+    EXECUTANDO = 'executando'
+    CONCLUIDA = 'concluida'
+    FALHOU = 'falhou'
+    STATUS_CHOICES = [
+        (PENDENTE, 'Pendente'),
+        (EXECUTANDO, 'Executando'),
+        (CONCLUIDA, 'Concluída'),
+        (FALHOU, 'Falhou'),
+    ]
+
+    tipo = models.CharField(max_length=100, verbose_name="Tipo")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parâmetros")
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="tarefas"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    tentativas = models.PositiveIntegerField(default=0)
+    max_tentativas = models.PositiveIntegerField(default=5)
+    executar_em = models.DateTimeField(default=timezone.now, verbose_name="Executar em")
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True, verbose_name="Worker")
+    resultado = models.JSONField(null=True, blank=True)
+    erro = models.TextField(blank=True)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        ordering = ['-data_criacao']
+        indexes = [
+            # Busca do worker: próximas pendentes em ordem de execução
+            models.Index(fields=['status', 'executar_em'], name='tarefa_status_executar_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.status})"
@@ -0,0 +1,126 @@
+"""
+Paginação por cursor (keyset).
+
+Em vez de OFFSET, cada página filtra a partir da chave de ordenação da última
+(ou primeira) linha da página anterior. O custo de uma página não depende de
+quão fundo o usuário navegou nem do total de linhas.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def _codificar(valores, direcao):
+    dados = json.dumps({'v': valores, 'd': direcao}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor):
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        conteudo = json.loads(dados)
+        return conteudo['v'], conteudo['d']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None, None
+
+
+def _campos(ordenacao):
+    """['-data_venda', '-id'] -> [('data_venda', True), ('id', True)]"""
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in ordenacao]
+
+
+def _inverter(ordenacao):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in ordenacao]
+
+
+def _condicao_apos(campos, valores):
+    """
+    Q das linhas que vêm depois de `valores` na ordenação:
+    (a > x) OR (a = x AND b > y) OR ... respeitando a direção de cada campo.
+    """
+    condicao = Q()
+    iguais = {}
+    for (campo, descendente), valor in zip(campos, valores):
+        lookup = 'lt' if descendente else 'gt'
+        condicao |= Q(**iguais, **{f'{campo}__{lookup}': valor})
+        iguais[campo] = valor
+    return condicao
+
+
+class PaginaCursor:
+    """Uma página de resultados com os cursores para as páginas vizinhas"""
+
+    def __init__(self, itens, cursor_proximo, cursor_anterior):
+        self.itens = itens
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tem_proximo(self):
+        return self.cursor_proximo is not None
+
+    @property
+    def tem_anterior(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+
+def _valores_linha(item, campos):
+    if isinstance(item, dict):
+        return [item[campo] for campo, _ in campos]
+    return [getattr(item, campo) for campo, _ in campos]
+
+
+def paginar_por_cursor(queryset, ordenacao, cursor=None, tamanho=50):
+    """
+    Retorna a PaginaCursor do queryset na `ordenacao` informada.
+
+    A ordenação deve terminar em um campo único (normalmente 'id' ou '-id').
+    Cursores inválidos ou de outra ordenação voltam para a primeira página.
+    """
+    campos = _campos(ordenacao)
+    modelo = queryset.model
+    valores, direcao = _decodificar(cursor) if cursor else (None, None)
+
+    if valores is not None and len(valores) == len(campos):
+        try:
+            valores = [modelo._meta.get_field(campo).to_python(valor) for (campo, _), valor in zip(campos, valores)]
+        except ValidationError:
+            valores, direcao = None, None
+    else:
+        valores, direcao = None, None
+
+    if direcao == 'anterior':
+        campos_invertidos = _campos(_inverter(ordenacao))
+        linhas = list(
+            queryset.filter(_condicao_apos(campos_invertidos, valores)).order_by(*_inverter(ordenacao))[:tamanho + 1]
+        )
+        tem_mais_antes = len(linhas) > tamanho
+        itens = linhas[:tamanho][::-1]
+        tem_mais_depois = True
+        if not itens:
+            # Nada antes do cursor (linhas removidas entre as requisições): volta ao início
+            return paginar_por_cursor(queryset, ordenacao, None, tamanho)
+    else:
+        if valores is not None:
+            queryset = queryset.filter(_condicao_apos(campos, valores))
+        linhas = list(queryset.order_by(*ordenacao)[:tamanho + 1])
+        tem_mais_depois = len(linhas) > tamanho
+        itens = linhas[:tamanho]
+        tem_mais_antes = valores is not None
+
+    cursor_proximo = cursor_anterior = None
+    if itens and tem_mais_depois:
+        cursor_proximo = _codificar(_valores_linha(itens[-1], campos), 'proximo')
+    if itens and tem_mais_antes:
+        cursor_anterior = _codificar(_valores_linha(itens[0], campos), 'anterior')
+
+    return PaginaCursor(itens, cursor_proximo, cursor_anterior)
@@ -0,0 +1,195 @@
+"""
+Exportação do relatório de vendas em PDF.
+
+O HTML é montado na requisição (as consultas ficam no processo web) e o
+WeasyPrint roda em um pool de processos, fora das threads que atendem
+requisições. O PDF é gravado em disco com nome derivado de (usuário, filtros,
+versão dos dados, SALES_VERSAO_APLICACAO): baixar de novo o mesmo relatório é só ler o arquivo.
+
+O disco é limitado: cada gravação apaga os PDFs de versões anteriores do
+usuário e mantém só os SALES_PDF_CACHE_MAX_ARQUIVOS usados mais
+recentemente; de hora em hora uma varredura apaga os PDFs sem acesso há mais
+de SALES_PDF_CACHE_MAX_IDADE segundos (usuários que não voltaram).
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+WORKERS_PADRAO = 2
+TIMEOUT_PADRAO = 60
+MAX_ARQUIVOS_PADRAO = 20
+MAX_IDADE_PADRAO = 24 * 60 * 60
+INTERVALO_VARREDURA = 60 * 60
+# Arquivo na raiz do cache cujo mtime marca a última varredura
+MARCA_VARREDURA = '.varredura'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def diretorio_cache():
+    return _config('SALES_PDF_CACHE_DIR', None) or os.path.join(tempfile.gettempdir(), 'salesmanager_pdf')
+
+
+# =============================================================================
+# POOL DE RENDERIZAÇÃO
+# =============================================================================
+
+def _renderizar(html):
+    """Executado no processo do pool: só HTML entra e só bytes saem"""
+    from weasyprint import HTML
+    return HTML(string=html).write_pdf()
+
+
+def _obter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o processo filho não herda conexões nem threads do servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=_config('SALES_PDF_WORKERS', WORKERS_PADRAO),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def encerrar_pool(wait=True):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def renderizar(html):
+    """Converte o HTML em PDF no pool de processos; espera até SALES_PDF_TIMEOUT segundos"""
+    try:
+        futuro = _obter_pool().submit(_renderizar, html)
+        return futuro.result(timeout=_config('SALES_PDF_TIMEOUT', TIMEOUT_PADRAO))
+    except BrokenProcessPool:
+        # Um processo morreu (falta de memória, por exemplo): o próximo pedido cria outro pool
+        encerrar_pool(wait=False)
+        raise
+
+
+# =============================================================================
+# CACHE EM DISCO
+# =============================================================================
+
+def _assinatura(valor):
+    return hashlib.sha256(json.dumps(valor, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+
+def caminho_cache(usuario_id, filtros, versao):
+    """Arquivo do PDF: <dir>/<usuário>/<versão>-<filtros>.pdf"""
+    # A versão da aplicação entra junto: um deploy que muda o template não reaproveita PDFs antigos
+    versao = [versao, _config('SALES_VERSAO_APLICACAO', '')]
+    return os.path.join(
+        diretorio_cache(), str(usuario_id), f'{_assinatura(versao)}-{_assinatura(filtros)}.pdf'
+    )
+
+
+def _gravar(caminho, conteudo):
+    """Grava em arquivo temporário e renomeia: quem lê nunca vê um PDF pela metade"""
+    diretorio = os.path.dirname(caminho)
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+    _limpar_usuario(diretorio, os.path.basename(caminho).split('-')[0])
+    _varrer(diretorio_cache())
+
+
+def _apagar(caminho):
+    try:
+        os.unlink(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _limpar_usuario(diretorio, prefixo_atual):
+    """Apaga os PDFs de versões anteriores e, acima do limite, os usados há mais tempo"""
+    atuais = []
+    for entrada in os.scandir(diretorio):
+        if not entrada.name.endswith('.pdf'):
+            continue
+        if entrada.name.startswith(prefixo_atual):
+            atuais.append(entrada)
+        else:
+            # Versão anterior dos dados (ou dia anterior): não será mais lido
+            _apagar(entrada.path)
+
+    excedentes = len(atuais) - _config('SALES_PDF_CACHE_MAX_ARQUIVOS', MAX_ARQUIVOS_PADRAO)
+    if excedentes > 0:
+        # mtime = último acesso (obter_pdf o atualiza a cada leitura)
+        for entrada in sorted(atuais, key=lambda entrada: entrada.stat().st_mtime)[:excedentes]:
+            _apagar(entrada.path)
+
+
+def _varrer(raiz):
+    """No máximo a cada INTERVALO_VARREDURA: apaga PDFs sem acesso há mais de SALES_PDF_CACHE_MAX_IDADE"""
+    marca = os.path.join(raiz, MARCA_VARREDURA)
+    agora = time.time()
+    try:
+        if agora - os.stat(marca).st_mtime < INTERVALO_VARREDURA:
+            return
+    except FileNotFoundError:
+        pass
+    with open(marca, 'a'):
+        os.utime(marca)
+
+    limite = agora - _config('SALES_PDF_CACHE_MAX_IDADE', MAX_IDADE_PADRAO)
+    for pasta in os.scandir(raiz):
+        if not pasta.is_dir():
+            continue
+        for entrada in os.scandir(pasta.path):
+            if entrada.name.endswith(('.pdf', '.tmp')) and entrada.stat().st_mtime < limite:
+                _apagar(entrada.path)
+        try:
+            os.rmdir(pasta.path)
+        except OSError:
+            # Ainda tem PDFs (ou outro processo acabou de gravar um)
+            pass
+
+
+def obter_pdf(usuario_id, filtros, versao, montar_html):
+    """
+    Caminho do PDF do relatório, renderizando só se ainda não estiver em disco.
+
+    `versao` identifica o estado dos dados do usuário (VendaQuerySet.versao) e
+    `montar_html()` só é chamado quando o PDF precisa ser gerado.
+    """
+    caminho = caminho_cache(usuario_id, filtros, versao)
+    try:
+        # Marca o acesso: a limpeza por quantidade e por idade olha o mtime
+        os.utime(caminho)
+        return caminho
+    except FileNotFoundError:
+        pass
+
+    conteudo = renderizar(montar_html())
+    _gravar(caminho, conteudo)
+    logger.info(f'PDF do relatório gerado para o usuário {usuario_id}: {len(conteudo)} bytes')
+    return caminho
@@ -0,0 +1,247 @@
+"""
+Manutenção incremental da tabela VendaResumoDiario.
+
+Os sinais de Venda cuidam de save/delete e VendaQuerySet dos caminhos em
+lote (update/bulk_create), como nos totais dos clientes. Todas as funções de
+escrita rodam na mesma transação que grava a Venda, para que o resumo nunca
+fique à frente ou atrás dos dados.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Venda, VendaResumoDiario
+
+
+# Campos de Venda que mudam o bucket da venda ou os totais dele
+CAMPOS_VENDA_RESUMO = {'valor', 'quantidade', 'data_venda', 'baixada', 'usuario', 'usuario_id'}
+
+# =============================================================================
+# ESCRITA INCREMENTAL
+# =============================================================================
+
+def _ajustar(usuario_id, data, baixada, vendas, valor, itens):
+    """Soma os deltas ao bucket (usuario, data, baixada), criando ou removendo a linha"""
+    filtro = VendaResumoDiario.objects.filter(usuario_id=usuario_id, data=data, baixada=baixada)
+
+    atualizados = filtro.update(
+        quantidade_vendas=F('quantidade_vendas') + vendas,
+        valor_total=F('valor_total') + valor,
+        quantidade_itens=F('quantidade_itens') + itens,
+    )
+
+    if not atualizados and vendas > 0:
+        try:
+            with transaction.atomic():
+                VendaResumoDiario.objects.create(
+                    usuario_id=usuario_id, data=data, baixada=baixada,
+                    quantidade_vendas=vendas, valor_total=valor, quantidade_itens=itens
+                )
+        except IntegrityError:
+            # Outra requisição criou o bucket entre o UPDATE e o INSERT
+            filtro.update(
+                quantidade_vendas=F('quantidade_vendas') + vendas,
+                valor_total=F('valor_total') + valor,
+                quantidade_itens=F('quantidade_itens') + itens,
+            )
+    elif vendas < 0:
+        filtro.filter(quantidade_vendas__lte=0).delete()
+
+
+def registrar_venda(venda):
+    """Inclui uma venda recém-criada no resumo (sinal post_save)"""
+    _ajustar(venda.usuario_id, venda.data_venda, venda.baixada, 1, venda.valor, venda.quantidade)
+
+
+def remover_venda(venda):
+    """Retira do resumo uma venda excluída (sinal post_delete)"""
+    _ajustar(venda.usuario_id, venda.data_venda, venda.baixada, -1, -venda.valor, -venda.quantidade)
+
+
+def valores_resumo(venda):
+    """Bucket e totais da venda no resumo: (usuario, data, baixada, valor, itens)"""
+    return venda.usuario_id, venda.data_venda, venda.baixada, venda.valor, venda.quantidade
+
+
+def atualizar_venda(anteriores, venda):
+    """Move uma venda editada do bucket anterior (valores_resumo antes do save) para o atual"""
+    atuais = valores_resumo(venda)
+    if anteriores == atuais:
+        return
+    usuario_id, data, baixada, valor, itens = anteriores
+    _ajustar(usuario_id, data, baixada, -1, -valor, -itens)
+    usuario_id, data, baixada, valor, itens = atuais
+    _ajustar(usuario_id, data, baixada, 1, valor, itens)
+
+
+# =============================================================================
+# RECÁLCULO (CAMINHOS EM LOTE E MANUTENÇÃO)
+# =============================================================================
+
+def _totais_venda(vendas):
+    return vendas.order_by().values('usuario_id', 'data_venda', 'baixada').annotate(
+        total_vendas=Count('id'),
+        total_valor=Sum('valor'),
+        total_itens=Sum('quantidade'),
+    )
+
+
+def _linhas_resumo(vendas):
+    return [
+        VendaResumoDiario(
+            usuario_id=linha['usuario_id'],
+            data=linha['data_venda'],
+            baixada=linha['baixada'],
+            quantidade_vendas=linha['total_vendas'],
+            valor_total=linha['total_valor'] or Decimal('0.00'),
+            quantidade_itens=linha['total_itens'] or 0,
+        )
+        for linha in _totais_venda(vendas)
+    ]
+
+
+def recalcular_dias(usuario_id, datas):
+    """
+    Recalcula do zero os buckets de um usuário nas datas informadas.
+
+    Usado pelos caminhos em lote (VendaQuerySet.update/bulk_create), onde
+    aplicar um delta por venda custaria uma consulta por linha.
+    """
+    datas = set(datas)
+    if not datas:
+        return
+    VendaResumoDiario.objects.filter(usuario_id=usuario_id, data__in=datas).delete()
+    VendaResumoDiario.objects.bulk_create(
+        _linhas_resumo(Venda.objects.filter(usuario_id=usuario_id, data_venda__in=datas))
+    )
+
+
+def recalcular_dias_usuarios(dias):
+    """recalcular_dias para um conjunto de (usuario_id, data)"""
+    por_usuario = {}
+    for usuario_id, data in dias:
+        por_usuario.setdefault(usuario_id, set()).add(data)
+    for usuario_id, datas in por_usuario.items():
+        recalcular_dias(usuario_id, datas)
+
+
+def reconstruir(usuario_ids=None, batch_size=1000):
+    """Apaga e recria o resumo a partir de Venda. Retorna o número de linhas geradas."""
+    resumos = VendaResumoDiario.objects.all()
+    vendas = Venda.objects.all()
+    if usuario_ids is not None:
+        resumos = resumos.filter(usuario_id__in=usuario_ids)
+        vendas = vendas.filter(usuario_id__in=usuario_ids)
+
+    with transaction.atomic():
+        resumos.delete()
+        linhas = VendaResumoDiario.objects.bulk_create(_linhas_resumo(vendas), batch_size=batch_size)
+    return len(linhas)
+
+
+def divergencias(usuario_ids=None):
+    """
+    Compara o resumo com a agregação direta de Venda.
+
+    Retorna uma lista de (chave, esperado, encontrado), onde chave é
+    (usuario_id, data, baixada) e os valores são (vendas, valor, itens).
+    """
+    resumos = VendaResumoDiario.objects.all()
+    vendas = Venda.objects.all()
+    if usuario_ids is not None:
+        resumos = resumos.filter(usuario_id__in=usuario_ids)
+        vendas = vendas.filter(usuario_id__in=usuario_ids)
+
+    esperado = {
+        (l['usuario_id'], l['data_venda'], l['baixada']): (l['total_vendas'], l['total_valor'], l['total_itens'])
+        for l in _totais_venda(vendas)
+    }
+    encontrado = {
+        (r.usuario_id, r.data, r.baixada): (r.quantidade_vendas, r.valor_total, r.quantidade_itens)
+        for r in resumos.filter(quantidade_vendas__gt=0)
+    }
+
+    return [
+        (chave, esperado.get(chave), encontrado.get(chave))
+        for chave in sorted(esperado.keys() | encontrado.keys(), key=str)
+        if esperado.get(chave) != encontrado.get(chave)
+    ]
+
+
+# =============================================================================
+# LEITURA
+# =============================================================================
+
+def filtrar_status(resumos, status):
+    """Aplica o filtro de status usado no relatório ('concluidas'/'pendentes'/'todos')"""
+    if status == 'concluidas':
+        return resumos.filter(baixada=True)
+    if status == 'pendentes':
+        return resumos.filter(baixada=False)
+    return resumos
+
+
+def _resumos_periodo(usuario, data_inicio, data_fim, status):
+    resumos = filtrar_status(VendaResumoDiario.objects.filter(usuario=usuario), status)
+    if data_inicio:
+        resumos = resumos.filter(data__gte=data_inicio)
+    if data_fim:
+        resumos = resumos.filter(data__lte=data_fim)
+    return resumos.filter(quantidade_vendas__gt=0)
+
+
+def _agregados_metricas():
+    return {
+        'total_vendas': Sum('quantidade_vendas'),
+        'valor': Sum('valor_total'),
+        'dias_ativos': Count('data', distinct=True),
+    }
+
+
+def _formatar_metricas(metricas):
+    return {
+        'total_vendas': metricas['total_vendas'] or 0,
+        'valor_total': metricas['valor'] or Decimal('0.00'),
+        'dias_ativos': metricas['dias_ativos'] or 0,
+    }
+
+
+def metricas_periodo(usuario, data_inicio=None, data_fim=None, status='todos'):
+    """Total de vendas, valor total e dias com venda no período, lendo só o resumo"""
+    resumos = _resumos_periodo(usuario, data_inicio, data_fim, status)
+    return _formatar_metricas(resumos.aggregate(**_agregados_metricas()))
+
+
+async def ametricas_periodo(usuario, data_inicio=None, data_fim=None, status='todos'):
+    """Versão assíncrona de metricas_periodo"""
+    resumos = _resumos_periodo(usuario, data_inicio, data_fim, status)
+    return _formatar_metricas(await resumos.aaggregate(**_agregados_metricas()))
+
+
+def metricas_por_usuario(data_inicio, data_fim, usuario_ids=None):
+    """
+    Métricas do período para vários usuários em uma única consulta agrupada.
+
+    Devolve {usuario_id: {total_vendas, valor_total, dias_ativos, pendentes,
+    valor_pendente}}; usuários sem vendas no período não aparecem.
+    """
+    resumos = VendaResumoDiario.objects.filter(
+        data__gte=data_inicio, data__lte=data_fim, quantidade_vendas__gt=0
+    )
+    if usuario_ids is not None:
+        resumos = resumos.filter(usuario_id__in=usuario_ids)
+
+    linhas = resumos.order_by().values('usuario_id').annotate(
+        pendentes=Sum('quantidade_vendas', filter=Q(baixada=False)),
+        valor_pendente=Sum('valor_total', filter=Q(baixada=False)),
+        **_agregados_metricas(),
+    )
+    return {
+        linha['usuario_id']: {
+            **_formatar_metricas(linha),
+            'pendentes': linha['pendentes'] or 0,
+            'valor_pendente': linha['valor_pendente'] or Decimal('0.00'),
+        }
+        for linha in linhas
+    }
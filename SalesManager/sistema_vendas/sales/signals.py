@@ -0,0 +1,73 @@
+import time
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import clientes, resumo
+from .cache_metricas import invalidar_usuario
+from .middleware import CHAVE_RENOVACAO
+from .models import Venda
+
+
+@receiver(post_save, sender=Venda)
+@receiver(post_delete, sender=Venda)
+def invalidar_metricas_venda(sender, instance, **kwargs):
+    """Qualquer escrita em uma venda torna obsoletas as métricas do dono"""
+    invalidar_usuario(instance.usuario_id)
+
+
+@receiver(pre_save, sender=Venda)
+def vincular_cliente_venda(sender, instance, raw=False, **kwargs):
+    """Venda nova entra nos totais do cliente; em uma edição, o cliente é religado pelo nome"""
+    if raw:
+        return
+    if instance._state.adding:
+        clientes.registrar_venda(instance)
+        return
+    # Totais do cliente anterior e do atual são recalculados depois de salvar
+    instance._clientes_recalcular = {instance.cliente_cadastro_id}
+    instance._resumo_anterior = Venda.objects.filter(pk=instance.pk).values_list(
+        'usuario_id', 'data_venda', 'baixada', 'valor', 'quantidade'
+    ).first()
+    clientes.vincular(instance.usuario_id, [instance])
+    instance._clientes_recalcular.add(instance.cliente_cadastro_id)
+
+
+@receiver(post_save, sender=Venda)
+def recalcular_cliente_venda_editada(sender, instance, created, raw=False, **kwargs):
+    cliente_ids = getattr(instance, '_clientes_recalcular', None)
+    if cliente_ids and not created and not raw:
+        del instance._clientes_recalcular
+        clientes.recalcular(cliente_ids - {None})
+
+
+@receiver(post_delete, sender=Venda)
+def recalcular_cliente_venda_excluida(sender, instance, **kwargs):
+    if instance.cliente_cadastro_id:
+        clientes.recalcular([instance.cliente_cadastro_id])
+
+
+@receiver(post_save, sender=Venda)
+def atualizar_resumo_venda(sender, instance, created, raw=False, **kwargs):
+    """Venda nova entra no resumo diário; uma edição a move do bucket anterior para o atual"""
+    if raw:
+        return
+    anteriores = instance.__dict__.pop('_resumo_anterior', None)
+    if created or anteriores is None:
+        resumo.registrar_venda(instance)
+    else:
+        resumo.atualizar_venda(anteriores, instance)
+
+
+@receiver(post_delete, sender=Venda)
+def remover_venda_resumo(sender, instance, **kwargs):
+    """Exclusões (shell, cascata, admin) também saem do resumo diário"""
+    resumo.remover_venda(instance)
+
+
+@receiver(user_logged_in)
+def marcar_renovacao_sessao(sender, request, user, **kwargs):
+    """A sessão nova já é gravada no login: a próxima renovação só vence depois do intervalo"""
+    if request is not None and hasattr(request, 'session'):
+        request.session[CHAVE_RENOVACAO] = int(time.time())
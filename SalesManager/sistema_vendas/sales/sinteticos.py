@@ -0,0 +1,106 @@
+"""
+Dados sintéticos com distribuições parecidas com as de produção.
+
+Poucos clientes concentram a maior parte das vendas (Zipf), o volume varia
+com o mês e o dia da semana e cresce ao longo do tempo, e vendas antigas
+estão quase todas baixadas enquanto as recentes ainda estão pendentes.
+Mesma semente, mesmos dados.
+"""
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from .models import Venda
+
+
+PREFIXO_USUARIO = 'sintetico'
+SENHA_PADRAO = 'senha-sintetica-123'
+
+PRIMEIROS_NOMES = [
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+    'Larissa', 'Marcos', 'Natália', 'Otávio', 'Patrícia', 'Rafael', 'Sofia', 'Thiago', 'Vanessa', 'Lucas',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+]
+
+# Peso relativo de cada mês (jan-dez) e de cada dia da semana (seg-dom)
+SAZONALIDADE_MES = (0.75, 0.7, 0.9, 0.95, 1.1, 1.0, 0.95, 1.0, 0.95, 1.05, 1.35, 1.6)
+SAZONALIDADE_SEMANA = (1.0, 1.0, 1.05, 1.1, 1.25, 0.8, 0.45)
+# Quanto o volume do dia mais recente supera o do mais antigo
+CRESCIMENTO = 0.5
+
+EXPOENTE_ZIPF = 1.1
+# Dias a partir dos quais quase todas as vendas já foram baixadas
+DIAS_PARA_BAIXA = 30
+
+
+def nome_usuario(indice, prefixo=PREFIXO_USUARIO):
+    return f'{prefixo}{indice:04d}'
+
+
+def nomes_clientes(quantidade):
+    """`quantidade` nomes distintos, do cliente mais frequente para o menos frequente"""
+    combinacoes = [f'{nome} {sobrenome}' for sobrenome in SOBRENOMES for nome in PRIMEIROS_NOMES]
+    random.Random(0).shuffle(combinacoes)
+    nomes = combinacoes[:quantidade]
+    # Acima de 400 clientes, repete as combinações com um segundo sobrenome
+    while len(nomes) < quantidade:
+        indice = len(nomes)
+        segundo = SOBRENOMES[indice // len(combinacoes) % len(SOBRENOMES)]
+        nomes.append(f'{combinacoes[indice % len(combinacoes)]} {segundo}')
+    return nomes
+
+
+def _acumulados(pesos):
+    total, acumulados = 0.0, []
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+class GeradorVendas:
+    """Gera objetos Venda (não salvos) para `bulk_create`"""
+
+    def __init__(self, hoje, semente=42, clientes=200, dias=730):
+        self.hoje = hoje
+        self.aleatorio = random.Random(semente)
+        self.clientes = nomes_clientes(clientes)
+        self.pesos_clientes = _acumulados(1 / (posicao ** EXPOENTE_ZIPF) for posicao in range(1, clientes + 1))
+
+        self.datas = [hoje - timedelta(days=idade) for idade in range(dias)]
+        self.pesos_datas = _acumulados(
+            SAZONALIDADE_MES[data.month - 1] * SAZONALIDADE_SEMANA[data.weekday()]
+            * (1 + CRESCIMENTO * (1 - idade / dias))
+            for idade, data in enumerate(self.datas)
+        )
+
+    def _valor(self, quantidade):
+        # Preço unitário log-normal: mediana de R$ 80, cauda longa de vendas grandes
+        unitario = math.exp(self.aleatorio.gauss(math.log(80), 0.8))
+        return max(Decimal('0.01'), Decimal(str(round(unitario * quantidade, 2))))
+
+    def venda(self, usuario):
+        aleatorio = self.aleatorio
+        cliente = aleatorio.choices(self.clientes, cum_weights=self.pesos_clientes)[0]
+        data_venda = aleatorio.choices(self.datas, cum_weights=self.pesos_datas)[0]
+        quantidade = min(10, 1 + int(aleatorio.expovariate(0.6)))
+
+        idade = (self.hoje - data_venda).days
+        chance_baixa = 0.3 + 0.6 * min(1.0, idade / DIAS_PARA_BAIXA)
+        baixada = aleatorio.random() < chance_baixa
+        data_baixa = None
+        if baixada:
+            data_baixa = min(self.hoje, data_venda + timedelta(days=int(aleatorio.expovariate(1 / 7))))
+
+        return Venda(
+            cliente=cliente, quantidade=quantidade, valor=self._valor(quantidade), data_venda=data_venda,
+            baixada=baixada, data_baixa=data_baixa, usuario=usuario,
+        )
+
+    def vendas(self, usuario, quantidade):
+        for _ in range(quantidade):
+            yield self.venda(usuario)
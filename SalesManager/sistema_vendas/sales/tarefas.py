@@ -0,0 +1,99 @@
+"""Handlers das tarefas da fila (sales/fila.py), registrados ao carregar o app."""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .fila import tarefa
+from .models import Venda
+
+
+PERIODOS_NOME = {
+    '7_dias': 'Últimos 7 dias',
+    '45_dias': 'Últimos 45 dias', 
+    'este_mes': 'Este mês',
+    'ano': 'Ano'
+}
+
+STATUS_NOME = {
+    'todos': 'Todos',
+    'concluidas': 'Concluídas',
+    'pendentes': 'Pendentes'
+}
+
+
+def montar_mensagem_relatorio(total_vendas, valor_total, periodo, status, data_inicio='', data_fim='', extras=()):
+    """Assunto e corpo do e-mail de relatório (envio avulso e envio semanal em massa)"""
+    assunto = f"Relatório de Vendas - {timezone.now().strftime('%d/%m/%Y')}"
+    linhas_extras = ''.join(f"\n• {linha}" for linha in extras)
+
+    mensagem = f"""
+RELATÓRIO DE VENDAS - SALESMANAGER
+
+Data do relatório: {timezone.now().strftime('%d/%m/%Y %H:%M')}
+Período: {periodo}
+Status: {status}
+Data início: {data_inicio or 'Não informado'}
+Data fim: {data_fim or 'Não informado'}
+
+RESUMO:
+• Total de vendas: {total_vendas}
+• Valor total: R$ {valor_total:.2f}{linhas_extras}
+
+Para visualizar o relatório completo com gráficos e todos os dados,
+acesse o sistema SalesManager.
+
+--
+Este é um e-mail automático. Não responda.
+SalesManager System
+            """
+    return assunto, mensagem
+
+
+def _data_ou_none(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+@tarefa('relatorio_email')
+def enviar_relatorio_email(usuario_id, email, periodo='7_dias', status='todos', data_inicio='', data_fim=''):
+    """Calcula o resumo do relatório e envia por e-mail; erros de SMTP geram nova tentativa"""
+    vendas = Venda.objects.filter(usuario_id=usuario_id)
+
+    if status == 'concluidas':
+        vendas = vendas.filter(baixada=True)
+    elif status == 'pendentes':
+        vendas = vendas.filter(baixada=False)
+
+    data_inicio_obj = _data_ou_none(data_inicio)
+    if data_inicio_obj:
+        vendas = vendas.filter(data_venda__gte=data_inicio_obj)
+
+    data_fim_obj = _data_ou_none(data_fim)
+    if data_fim_obj:
+        vendas = vendas.filter(data_venda__lte=data_fim_obj)
+
+    totais = vendas.aggregate(total_vendas=Count('id'), valor_total=Sum('valor'))
+    total_vendas = totais['total_vendas']
+    valor_total = totais['valor_total'] or 0
+
+    assunto, mensagem = montar_mensagem_relatorio(
+        total_vendas, valor_total,
+        periodo=PERIODOS_NOME.get(periodo, periodo),
+        status=STATUS_NOME.get(status, status),
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+    )
+
+    send_mail(
+        assunto,
+        mensagem,
+        getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@salesmanager.com'),
+        [email],
+        fail_silently=False,
+    )
+    return {'email': email, 'total_vendas': total_vendas}
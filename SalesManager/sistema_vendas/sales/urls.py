@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views, views_async
 
 app_name = 'sales'
 
+# Sob ASGI (SALES_ASYNC_VIEWS) as views de leitura mais pesadas usam o ORM assíncrono
+views_leitura = views_async if settings.SALES_ASYNC_VIEWS else views
+
 urlpatterns = [
     # =========================================================================
     # URLs DE AUTENTICAÇÃO
@@ -15,8 +19,8 @@ urlpatterns = [
     # =========================================================================
     # URLs PRINCIPAIS (DASHBOARD E RELATÓRIOS)
     # =========================================================================
-    path('dashboard/', views.dashboard_view, name='dashboard'),
-    path('relatorio-vendas/', views.relatorio_vendas, name='relatorio_vendas'),
+    path('dashboard/', views_leitura.dashboard_view, name='dashboard'),
+    path('relatorio-vendas/', views_leitura.relatorio_vendas, name='relatorio_vendas'),
     
     # =========================================================================
     # URLs DE VENDAS (STAFF REQUIRED)
@@ -24,7 +28,9 @@ urlpatterns = [
     path('vendas/cadastrar/', views.cadastrar_venda, name='cadastrar_venda'),
     path('vendas/lista/', views.lista_vendas, name='lista_vendas'),
     path('vendas/<int:venda_id>/baixar/', views.baixar_venda, name='baixar_venda'),
+    path('vendas/baixar-em-massa/', views.baixar_vendas_em_massa, name='baixar_vendas_em_massa'),
     path('vendas/exportar-csv/', views.exportar_vendas_csv, name='exportar_vendas_csv'),
+    path('vendas/importar-csv/', views.importar_vendas_csv, name='importar_vendas_csv'),
     
     # =========================================================================
     # URLs DE PERFIL DO USUÁRIO
@@ -50,7 +56,13 @@ urlpatterns = [
     # =========================================================================
     path('check_venda_session/', views.check_venda_session, name='check_venda_session'),
     path('clear_venda_session/', views.clear_venda_session, name='clear_venda_session'),
-    path('api/cliente-compras/', views.cliente_compras_api, name='cliente_compras_api'),
+    path('api/cliente-compras/', views_leitura.cliente_compras_api, name='cliente_compras_api'),
+    path('api/clientes/autocomplete/', views.clientes_autocomplete_api, name='clientes_autocomplete_api'),
+    path('api/relatorio-grafico/', views.relatorio_grafico_api, name='relatorio_grafico_api'),
     path('api/exportar-relatorio-csv/', views.exportar_relatorio_csv, name='exportar_relatorio_csv'),
+    path('api/exportar-relatorio-pdf/', views.exportar_relatorio_pdf, name='exportar_relatorio_pdf'),
     path('api/enviar-relatorio-email/', views.enviar_relatorio_email, name='enviar_relatorio_email'),
+    path('api/v1/vendas/', api.VendasApiView.as_view(), name='api_vendas'),
+    path('metrics', api.MetricasView.as_view(), name='metricas'),
+    path('api/tarefas/<int:tarefa_id>/', views.status_tarefa, name='status_tarefa'),
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 import logging
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_protect
@@ -8,19 +9,71 @@ from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from .forms import VendaForm
-from .models import Venda, UsuarioCustomizado
-from django.db.models import Sum, Count, Max, Q, Avg
-from django.http import HttpResponse
-import csv
+from .models import Cliente, Tarefa, Venda, UsuarioCustomizado, VendaResumoDiario
+from .aggregations import serie_por_periodo, serie_em_blocos, nome_dia_semana
+from .resumo import metricas_periodo
+from .busca import sugestoes_cliente
+from .clientes import normalizar_nome
+from .autocomplete import LIMITE_PADRAO, sugerir
+from .filtros import (
+    STATUS_RESUMO, campos_ordenacao, data_filtro, filtrar_vendas, filtro_textual, parametros_lista
+)
+from .paginacao import paginar_por_cursor
+from .cache_metricas import obter_ou_calcular, versao_usuario
+from .decorators import condicional_vendas
+from .executor import executor_banco
+from .fila import enfileirar, status_tarefa as status_tarefa_json
+from .baixas import ACOES_BAIXA, definir_baixa
+from .pdf import obter_pdf
+from .importacao import BATCH_SIZE_PADRAO, ErroImportacao, importar_vendas
+from .exports import (
+    CABECALHO_VENDA, formatar_linha_venda, linhas_venda, quer_compactado, resposta_csv, valores_venda
+)
+from django.db.models import Sum, Count, Max, Q, Avg, F, DecimalField
+from django.db.models.functions import Coalesce
+from django.core.paginator import Paginator
+from django.db import DatabaseError, transaction
+from django.http import FileResponse, HttpResponseBadRequest
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from datetime import datetime, date, timedelta
 from django.utils import timezone
 from decimal import Decimal
+import io
 import json
+import re
 from django.http import JsonResponse
 
 
 logger = logging.getLogger(__name__)
 
+VENDAS_POR_PAGINA = 50
+USUARIOS_POR_PAGINA = 25
+
+# Períodos do gráfico do relatório (abas da página)
+PERIODOS_GRAFICO = ('7_dias', '45_dias', 'este_mes', 'ano')
+
+# Validade no navegador da série de um período; a URL leva a versão dos dados,
+# então uma venda nova já muda a URL pedida pela página
+RELATORIO_GRAFICO_MAX_AGE = 300
+
+# Linhas com erro devolvidas pela importação (o total vem sempre no relatório)
+MAX_ERROS_IMPORTACAO = 1000
+
+# Ordenações aceitas em gerenciar_usuarios (id como desempate estável)
+ORDENACAO_USUARIOS = {
+    '-date_joined': ['-date_joined', '-id'],
+    'date_joined': ['date_joined', 'id'],
+    'username': ['username'],
+    '-username': ['-username'],
+    '-total_vendas': ['-total_vendas', '-id'],
+    'total_vendas': ['total_vendas', 'id'],
+    '-valor_total': ['-valor_total', '-id'],
+    'valor_total': ['valor_total', 'id'],
+    '-ultima_venda': [F('ultima_venda').desc(nulls_last=True), '-id'],
+    'ultima_venda': [F('ultima_venda').asc(nulls_last=True), 'id'],
+}
+
 # =============================================================================
 # DECORATORS PERSONALIZADOS (APENAS PARA ADMIN)
 # =============================================================================
@@ -500,189 +553,155 @@ def desativar_modo_staff(request):
 # VIEWS DO DASHBOARD E RELATÓRIOS
 # =============================================================================
 
+def _intervalo_mes_filtro(mes_filtro, hoje):
+    """
+    Primeiro e último dia do mês escolhido no filtro do dashboard.
+
+    Devolve None sem filtro e levanta ValueError/TypeError para mês inválido.
+    """
+    if not mes_filtro or mes_filtro == 'all':
+        return None
+    mes = int(mes_filtro)
+    ano = hoje.year
+    primeiro_dia_mes = date(ano, mes, 1)
+    if mes == 12:
+        ultimo_dia_mes = date(ano, mes, 31)
+    else:
+        ultimo_dia_mes = date(ano, mes + 1, 1) - timedelta(days=1)
+    return primeiro_dia_mes, ultimo_dia_mes
+
+
+def _intervalo_ou_padrao(mes_filtro, hoje, padrao):
+    try:
+        return _intervalo_mes_filtro(mes_filtro, hoje) or padrao
+    except (ValueError, TypeError):
+        return padrao
+
+
+def _intervalo_vendas_mes(mes_filtro, hoje):
+    return _intervalo_ou_padrao(mes_filtro, hoje, (hoje.replace(day=1), hoje))
+
+
+def _intervalo_top_clientes(mes_filtro, hoje):
+    return _intervalo_ou_padrao(mes_filtro, hoje, (hoje - timedelta(days=30), hoje))
+
+
+def _top_clientes(usuario, data_inicio, data_fim):
+    """Consulta dos 10 clientes que mais compraram no intervalo"""
+    # Agrupa pelo cadastro do cliente: grafias diferentes do mesmo nome somam juntas
+    return Venda.objects.filter(
+        data_venda__gte=data_inicio,
+        data_venda__lte=data_fim,
+        usuario=usuario
+    ).values('cliente_cadastro').annotate(
+        nome=F('cliente_cadastro__nome'),
+        total=Sum('valor'),
+        quantidade=Count('id'),
+        ultima_compra=Max('data_venda')
+    ).order_by('-total')[:10]
+
+
+def _intervalo_grafico_dashboard(mes_filtro, hoje):
+    """(início, fim, granularidade, tipo) do gráfico: semanas do mês filtrado ou últimos 7 dias"""
+    try:
+        intervalo = _intervalo_mes_filtro(mes_filtro, hoje)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Erro ao processar filtro de mês: {str(e)}")
+        intervalo = None
+
+    if intervalo:
+        return intervalo[0], intervalo[1], 'semana', 'mes'
+    return hoje - timedelta(days=6), hoje, 'dia', 'semana'
+
+
+def _formatar_grafico_dashboard(serie, tipo):
+    dados = {
+        'labels': [], 
+        'quantidade': [],
+        'lucro': [],
+        'tipo': tipo
+    }
+    for numero, bucket in enumerate(serie, start=1):
+        if tipo == 'mes':
+            dados['labels'].append(f"{numero}ª Semana")
+        else:
+            dados['labels'].append(nome_dia_semana(bucket['inicio']))
+        dados['quantidade'].append(bucket['quantidade'])
+        dados['lucro'].append(float(bucket['total']))
+    return dados
+
+
+def _contexto_dashboard(usuario, metricas, mes_filtro):
+    chart_data = metricas['chart_data']
+    return {
+        'user': usuario,
+        'vendas_hoje': metricas['vendas_hoje'],
+        'vendas_mes': metricas['vendas_mes'],
+        'top_clientes': metricas['top_clientes'],
+        'chart_data': {
+            'labels': chart_data['labels'],
+            'quantidade': chart_data['quantidade'],
+            'lucro': chart_data['lucro'],
+            'tipo': chart_data['tipo']
+        },
+        'mes_filtro': mes_filtro
+    }
+
+
 @login_required
+@condicional_vendas
 def dashboard_view(request):
     hoje = timezone.now().date()
     usuario = request.user
     
     mes_filtro = request.GET.get('mes')
     
-    from concurrent.futures import ThreadPoolExecutor
-    
     def get_vendas_hoje():
-        return Venda.objects.filter(
-            data_venda=hoje,
-            usuario=usuario
-        ).aggregate(total=Sum('valor'))
+        return {'total': metricas_periodo(usuario, hoje, hoje)['valor_total']}
     
     def get_vendas_mes():
-        if mes_filtro and mes_filtro != 'all':
-            try:
-                mes = int(mes_filtro)
-                ano = hoje.year
-                primeiro_dia_mes = date(ano, mes, 1)
-                if mes == 12:
-                    ultimo_dia_mes = date(ano, mes, 31)
-                else:
-                    ultimo_dia_mes = date(ano, mes + 1, 1) - timedelta(days=1)
-            except (ValueError, TypeError):
-                primeiro_dia_mes = hoje.replace(day=1)
-                ultimo_dia_mes = hoje
-        else:
-            primeiro_dia_mes = hoje.replace(day=1)
-            ultimo_dia_mes = hoje
-        
-        return Venda.objects.filter(
-            data_venda__gte=primeiro_dia_mes,
-            data_venda__lte=ultimo_dia_mes,
-            usuario=usuario
-        ).aggregate(total=Sum('valor'))
+        primeiro_dia_mes, ultimo_dia_mes = _intervalo_vendas_mes(mes_filtro, hoje)
+        return {'total': metricas_periodo(usuario, primeiro_dia_mes, ultimo_dia_mes)['valor_total']}
     
     def get_top_clientes():
-        if mes_filtro and mes_filtro != 'all':
-            try:
-                mes = int(mes_filtro)
-                ano = hoje.year
-                primeiro_dia_mes = date(ano, mes, 1)
-                if mes == 12:
-                    ultimo_dia_mes = date(ano, mes, 31)
-                else:
-                    ultimo_dia_mes = date(ano, mes + 1, 1) - timedelta(days=1)
-            except (ValueError, TypeError):
-                trinta_dias_atras = hoje - timedelta(days=30)
-                primeiro_dia_mes = trinta_dias_atras
-                ultimo_dia_mes = hoje
-        else:
-            trinta_dias_atras = hoje - timedelta(days=30)
-            primeiro_dia_mes = trinta_dias_atras
-            ultimo_dia_mes = hoje
-            
-        return list(Venda.objects.filter(
-            data_venda__gte=primeiro_dia_mes,
-            data_venda__lte=ultimo_dia_mes,
-            usuario=usuario
-        ).values('cliente').annotate(
-            total=Sum('valor'),
-            quantidade=Count('id'),
-            ultima_compra=Max('data_venda')
-        ).order_by('-total')[:10])
+        return list(_top_clientes(usuario, *_intervalo_top_clientes(mes_filtro, hoje)))
     
     def get_dados_grafico():
-        dados = {
-            'labels': [], 
-            'quantidade': [],
-            'lucro': [],
-            'tipo': 'semana'
-        }
-        
-        if mes_filtro and mes_filtro != 'all':
-            try:
-                mes = int(mes_filtro)
-                ano = hoje.year
-                primeiro_dia_mes = date(ano, mes, 1)
-                if mes == 12:
-                    ultimo_dia_mes = date(ano, mes, 31)
-                else:
-                    ultimo_dia_mes = date(ano, mes + 1, 1) - timedelta(days=1)
-                
-                data_atual = primeiro_dia_mes
-                semana_numero = 1
-                
-                while data_atual <= ultimo_dia_mes:
-                    fim_semana = data_atual + timedelta(days=(6 - data_atual.weekday()))
-                    fim_semana = min(fim_semana, ultimo_dia_mes)
-                    
-                    vendas_semana = Venda.objects.filter(
-                        data_venda__gte=data_atual,
-                        data_venda__lte=fim_semana,
-                        usuario=usuario
-                    ).aggregate(
-                        total=Sum('valor'),
-                        quantidade=Count('id')
-                    )
-                    
-                    dados['labels'].append(f"{semana_numero}ª Semana")
-                    dados['quantidade'].append(vendas_semana['quantidade'] or 0)
-                    dados['lucro'].append(float(vendas_semana['total'] or Decimal('0.00')))
-                    
-                    data_atual = fim_semana + timedelta(days=1)
-                    semana_numero += 1
-                
-                dados['tipo'] = 'mes'
-                
-            except (ValueError, TypeError) as e:
-                logger.error(f"Erro ao processar filtro de mês: {str(e)}")
-                pass
-        
-        if not dados['labels']:
-            dados['tipo'] = 'semana'
-            dias_semana_pt = {
-                'Mon': 'Seg', 'Tue': 'Ter', 'Wed': 'Qua', 'Thu': 'Qui', 
-                'Fri': 'Sex', 'Sat': 'Sáb', 'Sun': 'Dom'
-            }
-            
-            for i in range(6, -1, -1):
-                data = hoje - timedelta(days=i)
-                dia_semana_en = data.strftime('%a')
-                dia_semana_pt = dias_semana_pt.get(dia_semana_en, dia_semana_en)
-                
-                vendas_dia = Venda.objects.filter(
-                    data_venda=data,
-                    usuario=usuario
-                ).aggregate(
-                    total=Sum('valor'),
-                    quantidade=Count('id')
-                )
-                
-                dados['labels'].append(dia_semana_pt)
-                dados['quantidade'].append(vendas_dia['quantidade'] or 0)
-                dados['lucro'].append(float(vendas_dia['total'] or Decimal('0.00')))
-        
-        return dados
+        data_inicio, data_fim, granularidade, tipo = _intervalo_grafico_dashboard(mes_filtro, hoje)
+        serie = serie_por_periodo(Venda.objects.filter(usuario=usuario), data_inicio, data_fim, granularidade)
+        return _formatar_grafico_dashboard(serie, tipo)
     
-    with ThreadPoolExecutor() as executor:
+    def calcular_metricas():
+        # Pool compartilhado e limitado; no SQLite as consultas rodam em sequência
+        executor = executor_banco()
         futuro_vendas_hoje = executor.submit(get_vendas_hoje)
         futuro_vendas_mes = executor.submit(get_vendas_mes)
         futuro_top_clientes = executor.submit(get_top_clientes)
         futuro_dados_grafico = executor.submit(get_dados_grafico)
         
-        vendas_hoje = futuro_vendas_hoje.result()
-        vendas_mes = futuro_vendas_mes.result()
-        top_clientes = futuro_top_clientes.result()
-        chart_data = futuro_dados_grafico.result()
-    
-    chart_data_json = {
-        'labels': chart_data['labels'],
-        'quantidade': chart_data['quantidade'],
-        'lucro': chart_data['lucro'],
-        'tipo': chart_data['tipo']
-    }
+        return {
+            'vendas_hoje': futuro_vendas_hoje.result(),
+            'vendas_mes': futuro_vendas_mes.result(),
+            'top_clientes': futuro_top_clientes.result(),
+            'chart_data': futuro_dados_grafico.result(),
+        }
     
-    context = {
-        'user': usuario,
-        'vendas_hoje': vendas_hoje,
-        'vendas_mes': vendas_mes,
-        'top_clientes': top_clientes,
-        'chart_data': chart_data_json,
-        'mes_filtro': mes_filtro
-    }
+    # Métricas só mudam quando as vendas do usuário mudam: cache por versão
+    metricas = obter_ou_calcular(
+        usuario.id, 'dashboard', {'mes': mes_filtro, 'hoje': hoje}, calcular_metricas
+    )
     
+    context = _contexto_dashboard(usuario, metricas, mes_filtro)
     return render(request, 'subPage/Home/dashboard.html', context)
 
-@login_required
-def relatorio_vendas(request):
-    usuario = request.user
-    hoje = timezone.now().date()
 
-    # Filtros
-    periodo = request.GET.get('periodo', '7_dias')
-    status_filter = request.GET.get('status', 'todos')
-    data_inicio_filtro = request.GET.get('data_inicio', '')
-    data_fim_filtro = request.GET.get('data_fim', '')
-    status_listagem = request.GET.get('status_listagem', 'todos')
-
-    # Verificar se é uma requisição AJAX
-    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+def _filtros_relatorio(dados, usuario, hoje):
+    """Lê os filtros do relatório e monta as consultas (ainda não executadas)"""
+    periodo = dados.get('periodo', '7_dias')
+    status_filter = dados.get('status', 'todos')
+    data_inicio_filtro = dados.get('data_inicio', '')
+    data_fim_filtro = dados.get('data_fim', '')
+    status_listagem = dados.get('status_listagem', 'todos')
 
     # Base de consulta - TODAS as vendas do usuário para listagem
     vendas_listagem = Venda.objects.filter(usuario=usuario)
@@ -733,123 +752,152 @@ def relatorio_vendas(request):
         # Padrão: semana atual começando na segunda
         data_inicio_metrica = hoje - timedelta(days=hoje.weekday())
 
-    # Dados para métricas (usando o período selecionado SEM filtros específicos)
-    vendas_periodo_metrica = vendas_grafico.filter(
-        data_venda__gte=data_inicio_metrica, 
-        data_venda__lte=hoje
-    )
-    
-    total_vendas = vendas_periodo_metrica.count()
-    valor_total = vendas_periodo_metrica.aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-    dias_ativos = vendas_periodo_metrica.dates('data_venda', 'day').distinct().count()
+    return {
+        'periodo': periodo,
+        'status': status_filter,
+        'data_inicio': data_inicio_filtro,
+        'data_fim': data_fim_filtro,
+        'status_listagem': status_listagem,
+        'data_inicio_metrica': data_inicio_metrica,
+        # TODAS AS VENDAS FILTRADAS (sem limite de 10)
+        'vendas_listagem': vendas_listagem.order_by('-data_venda', '-data_criacao'),
+        'vendas_grafico': vendas_grafico,
+    }
 
-    # ---- Função para gerar dados de gráfico por intervalo ----
-    def montar_dados(data_inicio, data_fim, periodo_tipo="7_dias"):
-        qs = vendas_grafico.filter(data_venda__gte=data_inicio, data_venda__lte=data_fim)
-        labels, valores = [], []
 
+def _intervalos_graficos_relatorio(hoje):
+    """Intervalo de cada período do relatório; todos são montados de uma vez"""
+    inicio_7_dias = hoje - timedelta(days=hoje.weekday())
+    return {
+        "7_dias": (inicio_7_dias, inicio_7_dias + timedelta(days=6)),
+        "45_dias": (hoje - timedelta(days=44), hoje),
+        "este_mes": (hoje.replace(day=1), hoje),
+        "ano": (hoje.replace(month=1, day=1), hoje),
+    }
+
+
+def _formatar_grafico_relatorio(periodo_tipo, serie):
+    labels, valores = [], []
+
+    for numero, bucket in enumerate(serie, start=1):
         if periodo_tipo == "7_dias":
             # Para 7 dias: apenas dias da semana (Seg a Dom)
-            dias_map = {'Mon': 'Seg', 'Tue': 'Ter', 'Wed': 'Qua', 'Thu': 'Qui', 'Fri': 'Sex', 'Sat': 'Sáb', 'Sun': 'Dom'}
-            
-            datas = [data_inicio + timedelta(days=i) for i in range(7)]
-            for data in datas:
-                dia_semana = dias_map.get(data.strftime('%a'), data.strftime('%a'))
-                total = qs.filter(data_venda=data).aggregate(total=Sum('valor'))['total'] or 0
-                labels.append(dia_semana)
-                valores.append(float(total))
-                
+            labels.append(nome_dia_semana(bucket['inicio']))
         elif periodo_tipo in ["45_dias", "este_mes"]:
-            # Para 45 dias e este mês: agrupar por semanas
-            semana_atual = 1
-            data_semana_inicio = data_inicio
-            
-            while data_semana_inicio <= data_fim:
-                data_semana_fim = min(data_semana_inicio + timedelta(days=6), data_fim)
-                
-                total_semana = qs.filter(
-                    data_venda__gte=data_semana_inicio,
-                    data_venda__lte=data_semana_fim
-                ).aggregate(total=Sum('valor'))['total'] or 0
-                
-                labels.append(f"{semana_atual}ª semana")
-                valores.append(float(total_semana))
-                
-                semana_atual += 1
-                data_semana_inicio = data_semana_fim + timedelta(days=1)
-                
+            # Para 45 dias e este mês: blocos de 7 dias
+            labels.append(f"{numero}ª semana")
         elif periodo_tipo == "ano":
             # Para ano: meses
-            for m in range(1, 13):
-                inicio_mes = date(data_inicio.year, m, 1)
-                if inicio_mes > data_fim:
-                    break
-                    
-                fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-                fim_mes = min(fim_mes, data_fim)
-                
-                total_mes = qs.filter(
-                    data_venda__gte=inicio_mes,
-                    data_venda__lte=fim_mes
-                ).aggregate(total=Sum('valor'))['total'] or 0
-                
-                labels.append(inicio_mes.strftime("%b"))
-                valores.append(float(total_mes))
+            labels.append(bucket['inicio'].strftime("%b"))
+        valores.append(float(bucket['total']))
 
-        return {"labels": labels, "valores": valores}
+    return {"labels": labels, "valores": valores}
 
-    # ---- Montar todos os períodos de uma vez ----
-    inicio_7_dias = hoje - timedelta(days=hoje.weekday())
-    
-    dados_grafico = {
-        "7_dias": montar_dados(inicio_7_dias, inicio_7_dias + timedelta(days=6), "7_dias"),
-        "45_dias": montar_dados(hoje - timedelta(days=44), hoje, "45_dias"),
-        "este_mes": montar_dados(hoje.replace(day=1), hoje, "este_mes"),
-        "ano": montar_dados(hoje.replace(month=1, day=1), hoje, "ano"),
+
+def _serie_grafico_relatorio(vendas_grafico, periodo_tipo, data_inicio, data_fim):
+    """Uma única consulta agrupada por gráfico, independente do intervalo"""
+    if periodo_tipo in ["45_dias", "este_mes"]:
+        return serie_em_blocos(vendas_grafico, data_inicio, data_fim, dias=7)
+    granularidade = 'mes' if periodo_tipo == "ano" else 'dia'
+    return serie_por_periodo(vendas_grafico, data_inicio, data_fim, granularidade)
+
+
+def _venda_relatorio_json(venda):
+    return {
+        'cliente': venda.cliente,
+        'data_venda': venda.data_venda.strftime('%d/%m/%Y') if venda.data_venda else '',
+        'quantidade': venda.quantidade,
+        'valor': float(venda.valor),
+        'baixada': venda.baixada,
+        'id': venda.id
     }
 
-    # Dados para o período atual
-    dados_atual = dados_grafico.get(periodo, dados_grafico["7_dias"])
 
-    # TODAS AS VENDAS FILTRADAS (sem limite de 10)
-    vendas_filtradas = vendas_listagem.order_by('-data_venda', '-data_criacao')
+def _periodo_grafico(periodo):
+    """Período do gráfico do relatório; valores desconhecidos caem na semana atual"""
+    return periodo if periodo in PERIODOS_GRAFICO else '7_dias'
 
-    context = {
-        "total_vendas": total_vendas,
-        "valor_total": valor_total,
-        "dias_ativos": dias_ativos,
-        "vendas_recentes": vendas_filtradas,
-        "dados_grafico": dados_atual,
-        "dados_grafico_json": json.dumps(dados_grafico),
-        "periodo_selecionado": periodo,
-        "status_selecionado": status_filter,
-        "data_inicio_filtro": data_inicio_filtro,
-        "data_fim_filtro": data_fim_filtro,
-        "status_listagem_selecionado": status_listagem,
+
+def _parametros_grafico_relatorio(periodo_tipo, status_filter, hoje):
+    """Chave de cache da série de um período (cada período é guardado separadamente)"""
+    return {'periodo': periodo_tipo, 'status': status_filter, 'hoje': hoje}
+
+
+def _metricas_relatorio(usuario, filtros, hoje):
+    """Métricas do período selecionado, pelo cache de métricas"""
+    status_filter = filtros['status']
+
+    # Dados para métricas (usando o período selecionado SEM filtros específicos)
+    # Lidos do resumo diário: custo proporcional aos dias do período, não às vendas
+    parametros_cache = {'periodo': filtros['periodo'], 'status': status_filter, 'hoje': hoje}
+    return obter_ou_calcular(
+        usuario.id, 'relatorio_metricas', parametros_cache,
+        lambda: metricas_periodo(usuario, filtros['data_inicio_metrica'], hoje, status_filter)
+    )
+
+
+def _grafico_relatorio(usuario, filtros, periodo_tipo, hoje):
+    """Série de um único período do gráfico; os outros só são calculados quando pedidos"""
+    data_inicio, data_fim = _intervalos_graficos_relatorio(hoje)[periodo_tipo]
+    return obter_ou_calcular(
+        usuario.id, 'relatorio_grafico', _parametros_grafico_relatorio(periodo_tipo, filtros['status'], hoje),
+        lambda: _formatar_grafico_relatorio(
+            periodo_tipo,
+            _serie_grafico_relatorio(filtros['vendas_grafico'], periodo_tipo, data_inicio, data_fim)
+        )
+    )
+
+
+def _contexto_relatorio(filtros, metricas, dados_grafico, versao_dados):
+    return {
+        "total_vendas": metricas['total_vendas'],
+        "valor_total": metricas['valor_total'],
+        "dias_ativos": metricas['dias_ativos'],
+        "vendas_recentes": filtros['vendas_listagem'],
+        # Só o período exibido; os demais vêm de relatorio_grafico_api ao trocar de aba
+        "dados_grafico": dados_grafico,
+        "periodo_grafico": _periodo_grafico(filtros['periodo']),
+        "versao_dados": versao_dados,
+        "periodo_selecionado": filtros['periodo'],
+        "status_selecionado": filtros['status'],
+        "data_inicio_filtro": filtros['data_inicio'],
+        "data_fim_filtro": filtros['data_fim'],
+        "status_listagem_selecionado": filtros['status_listagem'],
     }
 
+
+def _resposta_relatorio_ajax(context, vendas_data):
+    return JsonResponse({
+        'success': True,
+        'total_vendas': context['total_vendas'],
+        'valor_total': float(context['valor_total']),
+        'dias_ativos': context['dias_ativos'],
+        'dados_grafico': context['dados_grafico'],
+        'vendas_recentes': vendas_data,
+        'vendas_count': len(vendas_data)
+    })
+
+
+@login_required
+@condicional_vendas
+def relatorio_vendas(request):
+    usuario = request.user
+    hoje = timezone.now().date()
+
+    # Filtros
+    filtros = _filtros_relatorio(request.GET, usuario, hoje)
+
+    # Verificar se é uma requisição AJAX
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    metricas = _metricas_relatorio(usuario, filtros, hoje)
+    dados_grafico = _grafico_relatorio(usuario, filtros, _periodo_grafico(filtros['periodo']), hoje)
+    context = _contexto_relatorio(filtros, metricas, dados_grafico, versao_usuario(usuario.id))
+
     # Se for requisição AJAX, retornar JSON
     if is_ajax:
-        vendas_data = []
-        for venda in vendas_filtradas:
-            vendas_data.append({
-                'cliente': venda.cliente,
-                'data_venda': venda.data_venda.strftime('%d/%m/%Y') if venda.data_venda else '',
-                'quantidade': venda.quantidade,
-                'valor': float(venda.valor),
-                'baixada': venda.baixada,
-                'id': venda.id
-            })
-
-        return JsonResponse({
-            'success': True,
-            'total_vendas': total_vendas,
-            'valor_total': float(valor_total),
-            'dias_ativos': dias_ativos,
-            'dados_grafico': dados_atual,
-            'vendas_recentes': vendas_data,
-            'vendas_count': vendas_filtradas.count()
-        })
+        vendas_data = [_venda_relatorio_json(venda) for venda in filtros['vendas_listagem']]
+        return _resposta_relatorio_ajax(context, vendas_data)
     
     return render(request, "subPage/Home/relatorio_vendas.html", context)
 
@@ -864,7 +912,9 @@ def cadastrar_venda(request):
         if form.is_valid():
             venda = form.save(commit=False)
             venda.usuario = request.user
-            venda.save()
+            # Sinais mantêm cliente e resumo diário na transação do save
+            with transaction.atomic():
+                venda.save()
             
             # Armazenar dados da venda para exibir na notificação
             request.session['venda_sucesso'] = {
@@ -890,84 +940,74 @@ def lista_vendas(request):
     venda_sucesso = request.session.pop('venda_sucesso', None)
     
     # Obter todos os parâmetros de filtro da URL
-    busca = request.GET.get('busca', '')
-    status = request.GET.get('status', 'ativas')
-    cliente = request.GET.get('cliente', '')
-    data_inicio = request.GET.get('data_inicio', '')
-    data_fim = request.GET.get('data_fim', '')
-    ordenar_por = request.GET.get('ordenar_por', '-data_venda')
-    
-    # Iniciar com todas as vendas do usuário
-    vendas = Venda.objects.filter(usuario=request.user)
-    
-    # Aplicar filtros
-    if busca:
-        vendas = vendas.filter(Q(cliente__icontains=busca))
-    
-    if status == 'baixadas':
-        vendas = vendas.filter(baixada=True)
-    elif status == 'ativas':
-        vendas = vendas.filter(baixada=False)
-    
-    if cliente:
-        vendas = vendas.filter(cliente__icontains=cliente)
-    
-    if data_inicio:
-        try:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-            vendas = vendas.filter(data_venda__gte=data_inicio_obj)
-        except ValueError:
-            pass
-    
-    if data_fim:
-        try:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-            vendas = vendas.filter(data_venda__lte=data_fim_obj)
-        except ValueError:
-            pass
-    
-    # ORDENAÇÃO
-    ordenacao_map = {
-        'data_venda': ['data_venda', '-id'],
-        '-data_venda': ['-data_venda', '-id'],
-        'cliente': ['cliente', '-data_venda'],
-        '-cliente': ['-cliente', '-data_venda'],
-        'valor': ['valor', '-data_venda'],
-        '-valor': ['-valor', '-data_venda'],
-    }
+    parametros = parametros_lista(request.GET)
+    vendas = filtrar_vendas(request.user, parametros)
+    
+    # ORDENAÇÃO + PAGINAÇÃO POR CURSOR (chave da última linha + id)
+    pagina = paginar_por_cursor(
+        vendas,
+        campos_ordenacao(parametros['ordenar_por']),
+        cursor=request.GET.get('cursor'),
+        tamanho=VENDAS_POR_PAGINA
+    )
     
-    campos_ordenacao = ordenacao_map.get(ordenar_por, ['-data_venda', '-id'])
-    vendas = vendas.order_by(*campos_ordenacao)
+    # Calcular totais em uma única consulta; sem filtro por cliente o resumo diário basta
+    if filtro_textual(parametros):
+        totais = vendas.aggregate(total_vendas=Count('id'), total_valor=Sum('valor'))
+    else:
+        totais = metricas_periodo(
+            request.user,
+            data_filtro(parametros['data_inicio']),
+            data_filtro(parametros['data_fim']),
+            STATUS_RESUMO.get(parametros['status'], 'todos')
+        )
+        totais = {'total_vendas': totais['total_vendas'], 'total_valor': totais['valor_total']}
     
-    # Calcular totais
-    total_vendas = vendas.count()
-    total_valor = vendas.aggregate(Sum('valor'))['valor__sum'] or 0
+    # Links de navegação preservam os filtros atuais
+    def link_pagina(cursor):
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        return f'?{query.urlencode()}'
     
     context = {
-        'vendas': vendas,
-        'total_vendas': total_vendas,
-        'total_valor': total_valor,
-        'busca': busca,
-        'status': status,
-        'cliente_filtro': cliente,
-        'data_inicio': data_inicio,
-        'data_fim': data_fim,
-        'ordenar_por': ordenar_por,
+        'vendas': pagina.itens,
+        'pagina': pagina,
+        'url_proxima': link_pagina(pagina.cursor_proximo) if pagina.tem_proximo else None,
+        'url_anterior': link_pagina(pagina.cursor_anterior) if pagina.tem_anterior else None,
+        'total_vendas': totais['total_vendas'] or 0,
+        'total_valor': totais['total_valor'] or 0,
+        'busca': parametros['busca'],
+        'status': parametros['status'],
+        'cliente_filtro': parametros['cliente'],
+        'data_inicio': parametros['data_inicio'],
+        'data_fim': parametros['data_fim'],
+        'ordenar_por': parametros['ordenar_por'],
         'venda_sucesso': venda_sucesso,  # ENVIAR DIRETAMENTE PARA O TEMPLATE
+        'sugestoes_cliente': [],
     }
     
+    # Nenhum nome contém o termo: nomes parecidos viram links, nunca filtro implícito
+    if not context['total_vendas'] and filtro_textual(parametros):
+        termo = parametros['cliente'] or parametros['busca']
+        context['sugestoes_cliente'] = sugestoes_cliente(request.user.id, termo)
+    
     return render(request, 'subPage/vendas/lista_vendas.html', context)
 
 @login_required
 def baixar_venda(request, venda_id):
-    try:
-        venda = Venda.objects.get(id=venda_id, usuario=request.user)
-        venda.baixada = not venda.baixada
-        venda.data_baixa = timezone.now().date() if venda.baixada else None
-        venda.save()
-        
-        messages.success(request, f'Venda {"baixada" if venda.baixada else "reativada"} com sucesso!')
-    except Venda.DoesNotExist:
+    # Ação explícita: um toggle deixaria dois cliques (ou abas) desfazerem um ao outro
+    acao = request.GET.get('acao')
+    if acao not in ACOES_BAIXA:
+        return HttpResponseBadRequest('Ação inválida (use baixar ou reativar)')
+    
+    # UPDATE condicional: só altera se a venda ainda estiver no estado que o usuário viu
+    baixada = ACOES_BAIXA[acao]
+    atualizadas = definir_baixa(request.user, Venda.objects.filter(id=venda_id), baixada)
+    if atualizadas:
+        messages.success(request, f'Venda {"baixada" if baixada else "reativada"} com sucesso!')
+    elif Venda.objects.filter(id=venda_id, usuario=request.user).exists():
+        messages.info(request, f'A venda já estava {"baixada" if baixada else "ativa"}.')
+    else:
         messages.error(request, 'Venda não encontrada.')
     
     # Redirecionar de volta para a página de lista mantendo os filtros
@@ -975,61 +1015,80 @@ def baixar_venda(request, venda_id):
     return redirect(redirect_url)
 
 @login_required
-def exportar_vendas_csv(request):
-    """Exportar lista de vendas como CSV"""
-    # Obter os mesmos filtros da lista
-    busca = request.GET.get('busca', '')
-    status = request.GET.get('status', 'ativas')
-    cliente = request.GET.get('cliente', '')
-    data_inicio = request.GET.get('data_inicio', '')
-    data_fim = request.GET.get('data_fim', '')
+@require_http_methods(["POST"])
+def baixar_vendas_em_massa(request):
+    """
+    Baixa ou reativa várias vendas em um UPDATE: as dos `ids` enviados ou,
+    sem ids, todas as que atendem aos filtros atuais da lista.
+    """
+    acao = request.POST.get('acao')
+    if acao not in ACOES_BAIXA:
+        return JsonResponse({'error': 'Ação inválida (use baixar ou reativar)'}, status=400)
+    
+    ids = [valor for valor in request.POST.getlist('ids') if valor]
+    if ids:
+        try:
+            vendas = Venda.objects.filter(id__in=[int(valor) for valor in ids])
+        except ValueError:
+            return JsonResponse({'error': 'Lista de ids inválida'}, status=400)
+    else:
+        vendas = filtrar_vendas(request.user, parametros_lista(request.POST))
     
-    # Aplicar os mesmos filtros
-    vendas = Venda.objects.filter(usuario=request.user)
+    atualizadas = definir_baixa(request.user, vendas, ACOES_BAIXA[acao])
+    logger.info(f'Baixa em massa - Usuário: {request.user.username}, ação: {acao}, {atualizadas} venda(s)')
     
-    if busca:
-        vendas = vendas.filter(Q(cliente__icontains=busca))
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'success': True, 'acao': acao, 'atualizadas': atualizadas})
     
-    if status == 'baixadas':
-        vendas = vendas.filter(baixada=True)
-    elif status == 'ativas':
-        vendas = vendas.filter(baixada=False)
+    messages.success(
+        request,
+        f'{atualizadas} venda(s) {"baixada(s)" if acao == "baixar" else "reativada(s)"}.'
+    )
+    return redirect(request.META.get('HTTP_REFERER', '/vendas/lista/'))
+
+@login_required
+def exportar_vendas_csv(request):
+    """Exportar lista de vendas como CSV"""
+    # Obter e aplicar os mesmos filtros da lista
+    vendas = filtrar_vendas(request.user, parametros_lista(request.GET))
     
-    if cliente:
-        vendas = vendas.filter(cliente__icontains=cliente)
+    # Resposta em streaming: as linhas saem do banco em blocos, sem montar o arquivo em memória
+    valores = valores_venda(vendas)
     
-    if data_inicio:
-        try:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-            vendas = vendas.filter(data_venda__gte=data_inicio_obj)
-        except ValueError:
-            pass
+    def linhas():
+        yield CABECALHO_VENDA
+        for campos in valores:
+            yield formatar_linha_venda(*campos)
     
-    if data_fim:
-        try:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-            vendas = vendas.filter(data_venda__lte=data_fim_obj)
-        except ValueError:
-            pass
+    return resposta_csv(linhas(), 'vendas_exportadas.csv', compactar=quer_compactado(request))
+
+@login_required
+@require_http_methods(["POST"])
+def importar_vendas_csv(request):
+    """Importa vendas de um CSV no formato da exportação e devolve o relatório por linha"""
+    arquivo = request.FILES.get('arquivo')
+    if not arquivo:
+        return JsonResponse({'error': 'Nenhum arquivo enviado'}, status=400)
     
-    # Criar resposta HTTP com arquivo CSV
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="vendas_exportadas.csv"'
+    try:
+        batch_size = max(1, int(request.POST.get('batch_size', BATCH_SIZE_PADRAO)))
+    except ValueError:
+        batch_size = BATCH_SIZE_PADRAO
+    apenas_validar = request.POST.get('validar', '').lower() in ('1', 'true', 'sim')
     
-    writer = csv.writer(response, delimiter=';')
-    writer.writerow(['Data Venda', 'Cliente', 'Quantidade', 'Valor', 'Status', 'Data Baixa'])
+    # O upload fica em disco (ou memória, se pequeno) e é lido em streaming
+    texto = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+    try:
+        resultado = importar_vendas(request.user, texto, batch_size=batch_size, apenas_validar=apenas_validar)
+    except (ErroImportacao, UnicodeDecodeError) as erro:
+        return JsonResponse({'error': f'Arquivo inválido: {erro}'}, status=400)
     
-    for venda in vendas:
-        writer.writerow([
-            venda.data_venda.strftime('%d/%m/%Y') if venda.data_venda else '',
-            venda.cliente,
-            venda.quantidade,
-            str(venda.valor).replace('.', ','),
-            'Baixada' if venda.baixada else 'Ativa',
-            venda.data_baixa.strftime('%d/%m/%Y') if venda.data_baixa else ''
-        ])
+    logger.info(
+        f'Importação CSV - Usuário: {request.user.username}, '
+        f'{resultado.importadas} importadas, {len(resultado.erros)} com erro'
+    )
     
-    return response
+    return JsonResponse({'success': True, **resultado.como_dict(limite_erros=MAX_ERROS_IMPORTACAO)})
 
 # =============================================================================
 # VIEWS DE PERFIL DO USUÁRIO
@@ -1084,12 +1143,19 @@ def user_profile(request):
 @login_required
 def user_settings(request):
     """Configurações da conta do usuário"""
-    total_vendas = Venda.objects.filter(usuario=request.user).count()
-    vendas_este_mes = Venda.objects.filter(
-        usuario=request.user,
-        data_venda__month=timezone.now().month,
-        data_venda__year=timezone.now().year
-    ).count()
+    inicio_mes = timezone.now().date().replace(day=1)
+    contagens = obter_ou_calcular(
+        request.user.id, 'user_settings', {'mes': inicio_mes},
+        lambda: VendaResumoDiario.objects.filter(usuario=request.user).aggregate(
+            total=Sum('quantidade_vendas'),
+            este_mes=Sum(
+                'quantidade_vendas',
+                filter=Q(data__gte=inicio_mes, data__lt=(inicio_mes + timedelta(days=32)).replace(day=1))
+            )
+        )
+    )
+    total_vendas = contagens['total'] or 0
+    vendas_este_mes = contagens['este_mes'] or 0
     
     dias_conta = (timezone.now().date() - request.user.date_joined.date()).days
     
@@ -1216,37 +1282,46 @@ def gerenciar_usuarios(request):
     elif tipo_usuario == 'inativos':
         usuarios = usuarios.filter(is_active=False)
     
-    # Ordenação
+    # Estatísticas anotadas em uma única consulta (lidas do resumo diário)
+    usuarios = usuarios.annotate(
+        total_vendas=Coalesce(Sum('resumos_diarios__quantidade_vendas'), 0),
+        valor_total=Coalesce(Sum('resumos_diarios__valor_total'), Decimal('0.00'), output_field=DecimalField()),
+        ultima_venda=Max('resumos_diarios__data'),
+    )
+    
+    # Ordenação: apenas campos da allow-list, sempre resolvida no banco
     ordenar_por = request.GET.get('ordenar_por', '-date_joined')
-    usuarios = usuarios.order_by(ordenar_por)
-    
-    # Adicionar estatísticas para cada usuário - CORRIGIDO
-    usuarios_com_stats = []
-    for usuario in usuarios:
-        # Usar o related_name correto 'vendas' em vez de 'venda'
-        total_vendas = Venda.objects.filter(usuario=usuario).count()
-        valor_total = Venda.objects.filter(usuario=usuario).aggregate(
-            total=Sum('valor')
-        )['total'] or Decimal('0.00')
-        ultima_venda = Venda.objects.filter(usuario=usuario).aggregate(
-            ultima=Max('data_venda')
-        )['ultima']
-        
-        usuarios_com_stats.append({
+    if ordenar_por not in ORDENACAO_USUARIOS:
+        ordenar_por = '-date_joined'
+    usuarios = usuarios.order_by(*ORDENACAO_USUARIOS[ordenar_por])
+    
+    paginator = Paginator(usuarios, USUARIOS_POR_PAGINA)
+    pagina = paginator.get_page(request.GET.get('pagina'))
+    
+    usuarios_com_stats = [
+        {
             'usuario': usuario,
             'stats': {
-                'total_vendas': total_vendas,
-                'valor_total': valor_total,
-                'ultima_venda': ultima_venda
+                'total_vendas': usuario.total_vendas,
+                'valor_total': usuario.valor_total,
+                'ultima_venda': usuario.ultima_venda
             }
-        })
+        }
+        for usuario in pagina
+    ]
+    
+    # Links de página preservam busca, tipo e ordenação
+    filtros_query = request.GET.copy()
+    filtros_query.pop('pagina', None)
     
     context = {
         'usuarios_com_stats': usuarios_com_stats,
+        'pagina': pagina,
+        'filtros_query': filtros_query.urlencode(),
         'busca': busca,
         'tipo_usuario': tipo_usuario,
         'ordenar_por': ordenar_por,
-        'total_usuarios': usuarios.count(),
+        'total_usuarios': paginator.count,
     }
     
     return render(request, 'subPage/Admin/gerenciar_usuarios.html', context)
@@ -1281,6 +1356,7 @@ def clear_venda_session(request):
     return JsonResponse({'status': 'success'})
 
 @login_required
+@condicional_vendas
 def cliente_compras_api(request):
     """API para obter dados das compras de um cliente específico"""
     cliente_nome = request.GET.get('cliente', '')
@@ -1288,235 +1364,269 @@ def cliente_compras_api(request):
     if not cliente_nome:
         return JsonResponse({'error': 'Nome do cliente não fornecido'})
     
-    # Buscar todas as vendas do cliente para o usuário atual
-    vendas = Venda.objects.filter(
-        usuario=request.user,
-        cliente__iexact=cliente_nome
-    ).order_by('-data_venda')
-    
-    if not vendas.exists():
-        return JsonResponse({'error': 'Nenhuma compra encontrada para este cliente'})
-    
-    # Calcular métricas
-    total_gasto = vendas.aggregate(total=Sum('valor'))['total'] or 0
-    quantidade_compras = vendas.count()
+    dados = obter_ou_calcular(
+        request.user.id, 'cliente_compras', {'cliente': cliente_nome},
+        lambda: _dados_compras_cliente(request.user, cliente_nome)
+    )
+    return JsonResponse(dados)
+
+@login_required
+def clientes_autocomplete_api(request):
+    """Nomes de clientes do usuário que começam com `q` (índice em memória, sem consulta ao banco)"""
+    try:
+        limite = max(int(request.GET.get('limite', LIMITE_PADRAO)), 1)
+    except ValueError:
+        limite = LIMITE_PADRAO
+
+    sugestoes = sugerir(request.user.id, request.GET.get('q', ''), limite)
+    return JsonResponse({
+        'clientes': [
+            {
+                'nome': nome,
+                'quantidade_compras': quantidade,
+                'ultima_compra': ultima.isoformat() if ultima else None,
+            }
+            for nome, quantidade, ultima in sugestoes
+        ]
+    })
+
+def _cliente(usuario, cliente_nome):
+    """Cliente do usuário pelo nome normalizado (busca no índice único)"""
+    return Cliente.objects.filter(usuario=usuario, chave=normalizar_nome(cliente_nome))
+
+
+def _ultimas_compras(cliente):
+    return cliente.vendas.order_by('-data_venda')[:10]
+
+
+def _formatar_compras_cliente(cliente_nome, total_gasto, quantidade_compras, ultimas_vendas):
     ticket_medio = total_gasto / quantidade_compras if quantidade_compras > 0 else 0
     
     # Formatar última compra
-    ultima_venda = vendas.first()
+    ultima_venda = ultimas_vendas[0]
     ultima_compra = ultima_venda.data_venda.strftime('%d/%m/%Y') if ultima_venda.data_venda else 'N/A'
     
     # Preparar lista das últimas compras
     compras = []
-    for venda in vendas[:10]:
+    for venda in ultimas_vendas:
         compras.append({
             'data': venda.data_venda.strftime('%d/%m/%Y') if venda.data_venda else 'N/A',
             'valor': float(venda.valor)
         })
     
-    return JsonResponse({
+    return {
         'cliente': cliente_nome,
         'total_gasto': float(total_gasto),
         'quantidade_compras': quantidade_compras,
         'ticket_medio': float(ticket_medio),
         'ultima_compra': ultima_compra,
         'compras': compras
-    })
+    }
+
+def _dados_compras_cliente(usuario, cliente_nome):
+    """Monta o payload de cliente_compras_api (resultado vai para o cache de métricas)"""
+    # Totais já acumulados no cadastro: só as 10 últimas vendas são lidas
+    cliente = _cliente(usuario, cliente_nome).first()
+    ultimas_vendas = list(_ultimas_compras(cliente)) if cliente is not None else []
+
+    # Pelas vendas lidas, não pelos totais: totais divergentes (resumo_vendas --verificar) não quebram a API
+    if not ultimas_vendas:
+        return {'error': 'Nenhuma compra encontrada para este cliente'}
+    
+    return _formatar_compras_cliente(
+        cliente_nome, cliente.total_gasto, cliente.quantidade_compras, ultimas_vendas
+    )
+
+@login_required
+@condicional_vendas
+def relatorio_grafico_api(request):
+    """Série de um período do gráfico do relatório, pedida pela página ao trocar de aba"""
+    periodo = request.GET.get('periodo', '')
+    if periodo not in PERIODOS_GRAFICO:
+        return JsonResponse({'error': 'Período inválido'}, status=400)
+
+    hoje = timezone.now().date()
+    filtros = _filtros_relatorio(request.GET, request.user, hoje)
+    dados = _grafico_relatorio(request.user, filtros, periodo, hoje)
+
+    response = JsonResponse({'periodo': periodo, **dados})
+    patch_cache_control(response, private=True, max_age=RELATORIO_GRAFICO_MAX_AGE)
+    patch_vary_headers(response, ['Cookie'])
+    return response
 
 @login_required
 def exportar_relatorio_csv(request):
     """Exportar relatório de vendas como CSV"""
-    try:
-        # Obter os mesmos parâmetros de filtro do relatório
-        periodo = request.GET.get('periodo', '7_dias')
-        status_filter = request.GET.get('status', 'todos')
-        data_inicio_filtro = request.GET.get('data_inicio', '')
-        data_fim_filtro = request.GET.get('data_fim', '')
-        status_listagem = request.GET.get('status_listagem', 'todos')
+    # Obter os mesmos parâmetros de filtro do relatório
+    periodo = request.GET.get('periodo', '7_dias')
+    status_filter = request.GET.get('status', 'todos')
+    data_inicio_filtro = request.GET.get('data_inicio', '')
+    data_fim_filtro = request.GET.get('data_fim', '')
+    status_listagem = request.GET.get('status_listagem', 'todos')
+    
+    # Aplicar os mesmos filtros da view relatorio_vendas
+    vendas = Venda.objects.filter(usuario=request.user)
+    
+    if status_filter == 'concluidas':
+        vendas = vendas.filter(baixada=True)
+    elif status_filter == 'pendentes':
+        vendas = vendas.filter(baixada=False)
         
-        # Aplicar os mesmos filtros da view relatorio_vendas
-        vendas = Venda.objects.filter(usuario=request.user)
+    if status_listagem == 'concluidas':
+        vendas = vendas.filter(baixada=True)
+    elif status_listagem == 'pendentes':
+        vendas = vendas.filter(baixada=False)
         
-        if status_filter == 'concluidas':
-            vendas = vendas.filter(baixada=True)
-        elif status_filter == 'pendentes':
-            vendas = vendas.filter(baixada=False)
-            
-        if status_listagem == 'concluidas':
-            vendas = vendas.filter(baixada=True)
-        elif status_listagem == 'pendentes':
-            vendas = vendas.filter(baixada=False)
+    if data_inicio_filtro:
+        try:
+            data_inicio_obj = datetime.strptime(data_inicio_filtro, '%Y-%m-%d').date()
+            vendas = vendas.filter(data_venda__gte=data_inicio_obj)
+        except ValueError:
+            pass
             
-        if data_inicio_filtro:
-            try:
-                data_inicio_obj = datetime.strptime(data_inicio_filtro, '%Y-%m-%d').date()
-                vendas = vendas.filter(data_venda__gte=data_inicio_obj)
-            except ValueError:
-                pass
-                
-        if data_fim_filtro:
-            try:
-                data_fim_obj = datetime.strptime(data_fim_filtro, '%Y-%m-%d').date()
-                vendas = vendas.filter(data_venda__lte=data_fim_obj)
-            except ValueError:
-                pass
-        
-        # Ordenar por data mais recente
-        vendas = vendas.order_by('-data_venda')
-        
-        # Criar resposta HTTP com arquivo CSV
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="relatorio_vendas_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        
-        writer = csv.writer(response, delimiter=';')
-        writer.writerow(['Relatório de Vendas - SalesManager'])
-        writer.writerow(['Data de exportação', timezone.now().strftime('%d/%m/%Y %H:%M:%S')])
-        writer.writerow(['Período', periodo])
-        writer.writerow(['Status', status_filter])
-        writer.writerow(['Data início', data_inicio_filtro or 'Não informado'])
-        writer.writerow(['Data fim', data_fim_filtro or 'Não informado'])
-        writer.writerow([])
-        writer.writerow(['Data Venda', 'Cliente', 'Quantidade', 'Valor', 'Status', 'Data Baixa'])
-        
-        for venda in vendas:
-            writer.writerow([
-                venda.data_venda.strftime('%d/%m/%Y') if venda.data_venda else '',
-                venda.cliente,
-                venda.quantidade,
-                str(venda.valor).replace('.', ','),
-                'Baixada' if venda.baixada else 'Ativa',
-                venda.data_baixa.strftime('%d/%m/%Y') if venda.data_baixa else ''
-            ])
-        
-        # Adicionar totais
-        total_vendas = vendas.count()
-        valor_total = vendas.aggregate(total=Sum('valor'))['total'] or 0
-        
-        writer.writerow([])
-        writer.writerow(['TOTAL DE VENDAS', total_vendas])
-        writer.writerow(['VALOR TOTAL', str(valor_total).replace('.', ',')])
+    if data_fim_filtro:
+        try:
+            data_fim_obj = datetime.strptime(data_fim_filtro, '%Y-%m-%d').date()
+            vendas = vendas.filter(data_venda__lte=data_fim_obj)
+        except ValueError:
+            pass
+    
+    # Ordenar por data mais recente
+    vendas = vendas.order_by('-data_venda')
+    
+    # A consulta começa aqui: depois do início do streaming o status já não muda
+    try:
+        valores = valores_venda(vendas)
+    except DatabaseError as e:
+        logger.error(f"Erro ao exportar CSV: {str(e)}", exc_info=True)
+        messages.error(request, 'Erro ao exportar relatório CSV')
+        return redirect('sales:relatorio_vendas')
+    
+    agora = timezone.now()
+    
+    def linhas():
+        yield ['Relatório de Vendas - SalesManager']
+        yield ['Data de exportação', agora.strftime('%d/%m/%Y %H:%M:%S')]
+        yield ['Período', periodo]
+        yield ['Status', status_filter]
+        yield ['Data início', data_inicio_filtro or 'Não informado']
+        yield ['Data fim', data_fim_filtro or 'Não informado']
+        yield []
+        yield CABECALHO_VENDA
         
-        return response
+        # Totais acumulados durante o streaming, sem consultas extras no final
+        total_vendas = 0
+        valor_total = Decimal('0')
+        for campos in valores:
+            total_vendas += 1
+            valor_total += campos[3]
+            yield formatar_linha_venda(*campos)
         
+        yield []
+        yield ['TOTAL DE VENDAS', total_vendas]
+        yield ['VALOR TOTAL', str(valor_total).replace('.', ',')]
+    
+    nome_arquivo = f'relatorio_vendas_{agora.strftime("%Y%m%d_%H%M%S")}.csv'
+    return resposta_csv(linhas(), nome_arquivo, compactar=quer_compactado(request))
+
+# Títulos das tabelas de gráfico no PDF, na ordem em que aparecem
+TITULOS_GRAFICO_PDF = {
+    '7_dias': 'Semana atual',
+    '45_dias': 'Últimos 45 dias',
+    'este_mes': 'Este mês',
+    'ano': 'Este ano',
+}
+
+
+@login_required
+def exportar_relatorio_pdf(request):
+    """Exportar relatório de vendas como PDF (gerado uma vez por versão dos dados e filtros)"""
+    usuario = request.user
+    hoje = timezone.now().date()
+    filtros = _filtros_relatorio(request.GET, usuario, hoje)
+    parametros = {
+        chave: filtros[chave] for chave in ('periodo', 'status', 'data_inicio', 'data_fim', 'status_listagem')
+    }
+
+    def montar_html():
+        # No PDF entram as séries de todos os períodos
+        graficos = {periodo: _grafico_relatorio(usuario, filtros, periodo, hoje) for periodo in PERIODOS_GRAFICO}
+        metricas = _metricas_relatorio(usuario, filtros, hoje)
+        context = _contexto_relatorio(filtros, metricas, graficos[_periodo_grafico(filtros['periodo'])], versao)
+        context.update({
+            'usuario': usuario,
+            'gerado_em': timezone.localtime(),
+            'titulo_periodo': TITULOS_GRAFICO_PDF.get(filtros['periodo'], TITULOS_GRAFICO_PDF['7_dias']),
+            'graficos': [
+                (titulo, list(zip(graficos[periodo]['labels'], graficos[periodo]['valores'])))
+                for periodo, titulo in TITULOS_GRAFICO_PDF.items()
+            ],
+            'cabecalho': CABECALHO_VENDA,
+            'linhas': linhas_venda(filtros['vendas_listagem']),
+        })
+        return render_to_string('subPage/Home/relatorio_vendas_pdf.html', context)
+
+    try:
+        versao = Venda.objects.filter(usuario=usuario).versao()
+        # Os gráficos dependem do dia: ele entra na versão (não nos filtros), e a
+        # primeira gravação do dia seguinte apaga os PDFs dos dias anteriores
+        caminho = obter_pdf(usuario.id, parametros, [versao, hoje], montar_html)
+    except (ImportError, OSError) as e:
+        # WeasyPrint ausente ou sem as bibliotecas do sistema (Pango, Cairo)
+        logger.error(f"PDF indisponível, WeasyPrint não pôde ser carregado: {str(e)}", exc_info=True)
+        messages.error(request, 'Exportação em PDF indisponível no servidor')
+        return redirect('sales:relatorio_vendas')
     except Exception as e:
-        logger.error(f"Erro ao exportar CSV: {str(e)}")
-        messages.error(request, 'Erro ao exportar relatório CSV')
+        logger.error(f"Erro ao exportar PDF: {str(e)}", exc_info=True)
+        messages.error(request, 'Erro ao exportar relatório PDF')
         return redirect('sales:relatorio_vendas')
 
+    return FileResponse(
+        open(caminho, 'rb'),
+        as_attachment=True,
+        filename=f'relatorio_vendas_{hoje.strftime("%Y%m%d")}.pdf',
+        content_type='application/pdf',
+    )
+
 @login_required
 def enviar_relatorio_email(request):
-    """Enviar relatório de vendas por e-mail"""
+    """Enfileira o envio do relatório por e-mail; o runworker calcula e envia"""
     if request.method == 'POST':
-        try:
-            from django.core.mail import send_mail
-            from django.conf import settings
-            
-            email_destino = request.POST.get('email')
-            
-            if not email_destino:
-                return JsonResponse({'success': False, 'error': 'E-mail não informado'})
-            
-            # Validar formato do email
-            import re
-            if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email_destino):
-                return JsonResponse({'success': False, 'error': 'Formato de e-mail inválido'})
-            
-            # Obter parâmetros
-            periodo = request.POST.get('periodo', '7_dias')
-            status_filter = request.POST.get('status', 'todos')
-            data_inicio_filtro = request.POST.get('data_inicio', '')
-            data_fim_filtro = request.POST.get('data_fim', '')
-            
-            # Buscar dados
-            vendas = Venda.objects.filter(usuario=request.user)
-            
-            if status_filter == 'concluidas':
-                vendas = vendas.filter(baixada=True)
-            elif status_filter == 'pendentes':
-                vendas = vendas.filter(baixada=False)
-                
-            if data_inicio_filtro:
-                try:
-                    data_inicio_obj = datetime.strptime(data_inicio_filtro, '%Y-%m-%d').date()
-                    vendas = vendas.filter(data_venda__gte=data_inicio_obj)
-                except ValueError:
-                    pass
-                    
-            if data_fim_filtro:
-                try:
-                    data_fim_obj = datetime.strptime(data_fim_filtro, '%Y-%m-%d').date()
-                    vendas = vendas.filter(data_venda__lte=data_fim_obj)
-                except ValueError:
-                    pass
-            
-            total_vendas = vendas.count()
-            valor_total = vendas.aggregate(total=Sum('valor'))['total'] or 0
-            
-            # Mapear nomes
-            periodo_nome = {
-                '7_dias': 'Últimos 7 dias',
-                '45_dias': 'Últimos 45 dias', 
-                'este_mes': 'Este mês',
-                'ano': 'Ano'
-            }.get(periodo, periodo)
-            
-            status_nome = {
-                'todos': 'Todos',
-                'concluidas': 'Concluídas',
-                'pendentes': 'Pendentes'
-            }.get(status_filter, status_filter)
-            
-            # Criar mensagem
-            assunto = f"Relatório de Vendas - {timezone.now().strftime('%d/%m/%Y')}"
-            
-            mensagem = f"""
-RELATÓRIO DE VENDAS - SALESMANAGER
-
-Data do relatório: {timezone.now().strftime('%d/%m/%Y %H:%M')}
-Período: {periodo_nome}
-Status: {status_nome}
-Data início: {data_inicio_filtro or 'Não informado'}
-Data fim: {data_fim_filtro or 'Não informado'}
-
-RESUMO:
-• Total de vendas: {total_vendas}
-• Valor total: R$ {valor_total:.2f}
-
-Para visualizar o relatório completo com gráficos e todos os dados,
-acesse o sistema SalesManager.
-
---
-Este é um e-mail automático. Não responda.
-SalesManager System
-            """
-            
-            # Tentar enviar e-mail
-            try:
-                send_mail(
-                    assunto,
-                    mensagem,
-                    getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@salesmanager.com'),
-                    [email_destino],
-                    fail_silently=False,
-                )
-                
-                return JsonResponse({
-                    'success': True, 
-                    'message': f'Relatório enviado com sucesso para {email_destino}'
-                })
-                
-            except Exception as e:
-                logger.error(f"Erro SMTP: {str(e)}")
-                return JsonResponse({
-                    'success': False, 
-                    'error': 'Servidor de e-mail não disponível. O relatório foi salvo no sistema.'
-                })
-            
-        except Exception as e:
-            logger.error(f"Erro ao enviar e-mail: {str(e)}")
-            return JsonResponse({
-                'success': False, 
-                'error': f'Erro interno: {str(e)}'
-            })
+        email_destino = request.POST.get('email')
+        
+        if not email_destino:
+            return JsonResponse({'success': False, 'error': 'E-mail não informado'})
+        
+        # Validar formato do email
+        if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email_destino):
+            return JsonResponse({'success': False, 'error': 'Formato de e-mail inválido'})
+        
+        tarefa = enfileirar(
+            'relatorio_email',
+            {
+                'usuario_id': request.user.id,
+                'email': email_destino,
+                'periodo': request.POST.get('periodo', '7_dias'),
+                'status': request.POST.get('status', 'todos'),
+                'data_inicio': request.POST.get('data_inicio', ''),
+                'data_fim': request.POST.get('data_fim', ''),
+            },
+            usuario=request.user,
+        )
+        
+        return JsonResponse({
+            'success': True, 
+            'message': f'Relatório será enviado para {email_destino} em instantes',
+            'tarefa_id': tarefa.id,
+            'status_url': reverse('sales:status_tarefa', args=[tarefa.id]),
+        })
     
-    return JsonResponse({'success': False, 'error': 'Método não permitido'})
\ No newline at end of file
+    return JsonResponse({'success': False, 'error': 'Método não permitido'})
+
+@login_required
+def status_tarefa(request, tarefa_id):
+    """Status de uma tarefa em segundo plano do próprio usuário"""
+    tarefa = Tarefa.objects.filter(id=tarefa_id, usuario=request.user).first()
+    if tarefa is None:
+        return JsonResponse({'error': 'Tarefa não encontrada'}, status=404)
+    return JsonResponse(status_tarefa_json(tarefa))
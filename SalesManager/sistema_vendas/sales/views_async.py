@@ -0,0 +1,166 @@
+"""
+Versões assíncronas (ASGI) do dashboard, do relatório e da API de compras.
+
+Reaproveitam os filtros, intervalos e formatações de views.py e trocam só o
+acesso ao banco: ORM assíncrono e agregados independentes em asyncio.gather.
+São ligadas às URLs quando SALES_ASYNC_VIEWS está ativo (o asgi.py ativa);
+sob WSGI continuam valendo as views síncronas.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import views
+from .aggregations import aserie_em_blocos, aserie_por_periodo
+from .cache_metricas import aobter_ou_calcular, aversao_usuario
+from .decorators import condicional_vendas, login_required_async
+from .models import Venda
+from .resumo import ametricas_periodo
+
+
+# A renderização acessa sessão e mensagens (consultas síncronas): roda fora do event loop
+render_async = sync_to_async(render)
+
+
+# =============================================================================
+# DASHBOARD
+# =============================================================================
+
+@login_required_async
+@condicional_vendas
+async def dashboard_view(request):
+    hoje = timezone.now().date()
+    usuario = request.user
+
+    mes_filtro = request.GET.get('mes')
+
+    async def get_vendas_hoje():
+        return {'total': (await ametricas_periodo(usuario, hoje, hoje))['valor_total']}
+
+    async def get_vendas_mes():
+        primeiro_dia_mes, ultimo_dia_mes = views._intervalo_vendas_mes(mes_filtro, hoje)
+        return {'total': (await ametricas_periodo(usuario, primeiro_dia_mes, ultimo_dia_mes))['valor_total']}
+
+    async def get_top_clientes():
+        consulta = views._top_clientes(usuario, *views._intervalo_top_clientes(mes_filtro, hoje))
+        return [cliente async for cliente in consulta]
+
+    async def get_dados_grafico():
+        data_inicio, data_fim, granularidade, tipo = views._intervalo_grafico_dashboard(mes_filtro, hoje)
+        serie = await aserie_por_periodo(Venda.objects.filter(usuario=usuario), data_inicio, data_fim, granularidade)
+        return views._formatar_grafico_dashboard(serie, tipo)
+
+    async def calcular_metricas():
+        vendas_hoje, vendas_mes, top_clientes, chart_data = await asyncio.gather(
+            get_vendas_hoje(), get_vendas_mes(), get_top_clientes(), get_dados_grafico()
+        )
+        return {
+            'vendas_hoje': vendas_hoje,
+            'vendas_mes': vendas_mes,
+            'top_clientes': top_clientes,
+            'chart_data': chart_data,
+        }
+
+    metricas = await aobter_ou_calcular(
+        usuario.id, 'dashboard', {'mes': mes_filtro, 'hoje': hoje}, calcular_metricas
+    )
+
+    context = views._contexto_dashboard(usuario, metricas, mes_filtro)
+    return await render_async(request, 'subPage/Home/dashboard.html', context)
+
+
+# =============================================================================
+# RELATÓRIO
+# =============================================================================
+
+async def _agrafico_relatorio(vendas_grafico, periodo_tipo, data_inicio, data_fim):
+    if periodo_tipo in ["45_dias", "este_mes"]:
+        serie = await aserie_em_blocos(vendas_grafico, data_inicio, data_fim, dias=7)
+    else:
+        granularidade = 'mes' if periodo_tipo == "ano" else 'dia'
+        serie = await aserie_por_periodo(vendas_grafico, data_inicio, data_fim, granularidade)
+    return views._formatar_grafico_relatorio(periodo_tipo, serie)
+
+
+@login_required_async
+@condicional_vendas
+async def relatorio_vendas(request):
+    usuario = request.user
+    hoje = timezone.now().date()
+
+    filtros = views._filtros_relatorio(request.GET, usuario, hoje)
+    status_filter = filtros['status']
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    # Só o período exibido; os demais vêm de relatorio_grafico_api ao trocar de aba
+    periodo_grafico = views._periodo_grafico(filtros['periodo'])
+    data_inicio, data_fim = views._intervalos_graficos_relatorio(hoje)[periodo_grafico]
+
+    async def listar_vendas():
+        if not is_ajax:
+            # A página itera a listagem no template
+            return None
+        return [views._venda_relatorio_json(venda) async for venda in filtros['vendas_listagem']]
+
+    parametros_cache = {'periodo': filtros['periodo'], 'status': status_filter, 'hoje': hoje}
+    metricas, dados_grafico, vendas_data, versao_dados = await asyncio.gather(
+        aobter_ou_calcular(
+            usuario.id, 'relatorio_metricas', parametros_cache,
+            lambda: ametricas_periodo(usuario, filtros['data_inicio_metrica'], hoje, status_filter)
+        ),
+        aobter_ou_calcular(
+            usuario.id, 'relatorio_grafico',
+            views._parametros_grafico_relatorio(periodo_grafico, status_filter, hoje),
+            lambda: _agrafico_relatorio(filtros['vendas_grafico'], periodo_grafico, data_inicio, data_fim)
+        ),
+        listar_vendas(),
+        aversao_usuario(usuario.id),
+    )
+
+    context = views._contexto_relatorio(filtros, metricas, dados_grafico, versao_dados)
+
+    if is_ajax:
+        return views._resposta_relatorio_ajax(context, vendas_data)
+
+    return await render_async(request, "subPage/Home/relatorio_vendas.html", context)
+
+
+# =============================================================================
+# APIS
+# =============================================================================
+
+async def _alistar(queryset):
+    return [item async for item in queryset]
+
+
+async def _adados_compras_cliente(usuario, cliente_nome):
+    """Versão assíncrona de views._dados_compras_cliente"""
+    cliente = await views._cliente(usuario, cliente_nome).afirst()
+    ultimas_vendas = await _alistar(views._ultimas_compras(cliente)) if cliente is not None else []
+
+    if not ultimas_vendas:
+        return {'error': 'Nenhuma compra encontrada para este cliente'}
+
+    return views._formatar_compras_cliente(
+        cliente_nome, cliente.total_gasto, cliente.quantidade_compras, ultimas_vendas
+    )
+
+
+@login_required_async
+@condicional_vendas
+async def cliente_compras_api(request):
+    """API para obter dados das compras de um cliente específico"""
+    cliente_nome = request.GET.get('cliente', '')
+
+    if not cliente_nome:
+        return JsonResponse({'error': 'Nome do cliente não fornecido'})
+
+    usuario = request.user
+    dados = await aobter_ou_calcular(
+        usuario.id, 'cliente_compras', {'cliente': cliente_nome},
+        lambda: _adados_compras_cliente(usuario, cliente_nome)
+    )
+    return JsonResponse(dados)
@@ -3,5 +3,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_vendas.settings')
+os.environ.setdefault('SALES_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
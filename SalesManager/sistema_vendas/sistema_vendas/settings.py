@@ -1,6 +1,7 @@
 from pathlib import Path
 from decouple import config, Csv  
 import os
+import tempfile
 import dj_database_url  
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -20,13 +21,19 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize', 
-    'sales', 
+    'rest_framework',
+    'sales.app.SalesConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Métricas por view (/metrics); antes da compressão para medir os bytes enviados
+    'sales.middleware.MetricasMiddleware',
+    # Depois do WhiteNoise: os estáticos já saem pré-comprimidos por ele
+    'sales.middleware.CompressaoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'sales.middleware.RenovacaoSessaoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -131,7 +138,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SESSION_COOKIE_AGE = 2409600
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessão lida do cache (banco só na falta); a validade é renovada pelo
+# RenovacaoSessaoMiddleware no máximo a cada SESSION_RENOVACAO_INTERVALO segundos,
+# em vez de uma gravação por requisição. Linhas expiradas: manage.py limpar_sessoes
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_RENOVACAO_INTERVALO = config('SESSION_RENOVACAO_INTERVALO', default=3600, cast=int)
 
 # Configurações CSRF para produção
 CSRF_TRUSTED_ORIGINS = [
@@ -148,3 +160,77 @@ CSRF_USE_SESSIONS = False
 # Configurações de sessão
 SESSION_COOKIE_SECURE = not DEBUG  # True em produção
 SESSION_COOKIE_HTTPONLY = True
+
+# API REST (sales/api.py): integrações autenticam por Basic Auth, o navegador pela sessão
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.BasicAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+# Métricas por requisição (sales/metricas.py): pasta compartilhada pelos processos e intervalo de gravação
+SALES_METRICAS_DIR = config('SALES_METRICAS_DIR', default='')
+SALES_METRICAS_INTERVALO = config('SALES_METRICAS_INTERVALO', default=5, cast=float)
+
+# Entra no ETag das páginas: um deploy novo invalida o que os navegadores guardaram
+SALES_VERSAO_APLICACAO = config('SALES_VERSAO_APLICACAO', default=config('RENDER_GIT_COMMIT', default=''))
+
+# Pool compartilhado para consultas concorrentes das views (sales/executor.py)
+SALES_DB_EXECUTOR_WORKERS = config('SALES_DB_EXECUTOR_WORKERS', default=4, cast=int)
+SALES_DB_EXECUTOR_FILA = config('SALES_DB_EXECUTOR_FILA', default=32, cast=int)
+
+# Views assíncronas do dashboard/relatório (sales/views_async.py); o asgi.py liga por padrão
+SALES_ASYNC_VIEWS = config('SALES_ASYNC_VIEWS', default=False, cast=bool)
+
+# Cache em duas camadas (sales/cache_camadas.py): LRU em cada processo (L1) na frente de um cache
+# compartilhado (L2). O L2 é o Redis de REDIS_URL; sem ele, arquivos em CACHE_DIR (CACHE_L2=arquivo)
+# ou a tabela sales_cache do banco (CACHE_L2=banco, depois de `manage.py createcachetable`).
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_L2 = config('CACHE_L2', default='arquivo')
+if REDIS_URL:
+    CACHE_L2_CONFIG = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+elif CACHE_L2 == 'banco':
+    CACHE_L2_CONFIG = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'sales_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+else:
+    CACHE_L2_CONFIG = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'salesmanager_cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'sales.cache_camadas.CacheDuasCamadas',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'L2': CACHE_L2_CONFIG,
+            'L1_MAX_ENTRADAS': config('CACHE_L1_MAX_ENTRADAS', default=1000, cast=int),
+            'L1_TIMEOUT': config('CACHE_L1_TIMEOUT', default=30, cast=int),
+            'INTERVALO_SINCRONIZACAO': config('CACHE_INTERVALO_SINCRONIZACAO', default=1.0, cast=float),
+        },
+    },
+    # O L2 sem o L1; também é por ele que o createcachetable acha a tabela do CACHE_L2=banco
+    'compartilhado': CACHE_L2_CONFIG,
+}
+
+# Validade das métricas em cache por usuário (sales/cache_metricas.py)
+METRICAS_CACHE_TIMEOUT = config('METRICAS_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Autocompletar clientes (sales/autocomplete.py): usuários com índice em memória por processo e validade do índice
+SALES_AUTOCOMPLETE_USUARIOS = config('SALES_AUTOCOMPLETE_USUARIOS', default=128, cast=int)
+SALES_AUTOCOMPLETE_TTL = config('SALES_AUTOCOMPLETE_TTL', default=300, cast=int)
+
+# Exportação em PDF (sales/pdf.py): processos do WeasyPrint, espera máxima e pasta dos PDFs gerados
+SALES_PDF_WORKERS = config('SALES_PDF_WORKERS', default=2, cast=int)
+SALES_PDF_TIMEOUT = config('SALES_PDF_TIMEOUT', default=60, cast=int)
+SALES_PDF_CACHE_DIR = config('SALES_PDF_CACHE_DIR', default='')
+# Limites do cache de PDFs: arquivos por usuário e idade máxima sem acesso (segundos)
+SALES_PDF_CACHE_MAX_ARQUIVOS = config('SALES_PDF_CACHE_MAX_ARQUIVOS', default=20, cast=int)
+SALES_PDF_CACHE_MAX_IDADE = config('SALES_PDF_CACHE_MAX_IDADE', default=86400, cast=int)